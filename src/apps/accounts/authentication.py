@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from dj_rest_auth.jwt_auth import JWTCookieAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from src.apps.accounts.services import TokenRevocationService
+
+User = get_user_model()
+
+# user fields carried in the tokens, enough for the permission checks
+TOKEN_CLAIM_FIELDS = ("username", "is_staff", "is_superuser")
+
+
+class StatelessJWTCookieAuthentication(JWTCookieAuthentication):
+    """
+    JWT authentication, which builds request.user from the claims of the
+    token (see TokenClaimsSerializer) instead of loading the user row. The
+    user is a User instance with only the claimed fields loaded: other
+    fields are loaded from the database on first access, and it compares
+    equal to the User with the same id, so it can be used in querysets and
+    relations as usual.
+
+    Tokens issued before the user's tokens were revoked are rejected.
+    Tokens without the claims, issued before they were added, are checked
+    against the database.
+    """
+
+    def get_user(self, validated_token):
+        auth_time = validated_token.get("auth_time")
+        if auth_time is None or any(
+            field not in validated_token for field in TOKEN_CLAIM_FIELDS
+        ):
+            return super().get_user(validated_token)
+
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        if TokenRevocationService.is_revoked(user_id, issued_at=auth_time):
+            raise AuthenticationFailed(
+                _("Token has been revoked"), code="token_revoked"
+            )
+        # only active users hold tokens which are not revoked
+        return User.from_db(
+            DEFAULT_DB_ALIAS,
+            [api_settings.USER_ID_FIELD, *TOKEN_CLAIM_FIELDS, "is_active"],
+            [
+                user_id,
+                *(validated_token[field] for field in TOKEN_CLAIM_FIELDS),
+                True,
+            ],
+        )
@@ -49,3 +49,21 @@ class UserProfile(models.Model):
 
     def __str__(self) -> str:
         return f"Profile of the user: {self.user.username}"
+
+
+class TokenRevocation(models.Model):
+    """
+    JWTs of the user issued before `revoked_at` are rejected by
+    StatelessJWTCookieAuthentication.
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="token_revocation",
+    )
+    revoked_at = models.DateTimeField()
+
+    def __str__(self) -> str:
+        return f"Tokens of {self.user_id} revoked at {self.revoked_at}"
@@ -1,9 +1,13 @@
+import time
+
 from django.contrib.auth import get_user_model
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django_countries.serializers import CountryFieldMixin
 from django_countries.serializer_fields import CountryField
+from src.apps.accounts.authentication import TOKEN_CLAIM_FIELDS
 from src.apps.accounts.models import UserAddress, UserProfile
 
 
@@ -163,3 +167,19 @@ class UserOrderOutputSerializer(serializers.ModelSerializer):
         model = UserProfile
         fields = ("id", "user", "phone_number")
         read_only_fields = fields
+
+
+class TokenClaimsSerializer(TokenObtainPairSerializer):
+    """
+    Issues tokens carrying the user fields StatelessJWTCookieAuthentication
+    needs, and the time of the login, which access tokens obtained by
+    refreshing keep.
+    """
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for field in TOKEN_CLAIM_FIELDS:
+            token[field] = getattr(user, field)
+        token["auth_time"] = time.time()
+        return token
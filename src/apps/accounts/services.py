@@ -1,8 +1,11 @@
 from typing import Any
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import caches
 from django.db import transaction
 from django.db.models import Q
-from src.apps.accounts.models import UserProfile, UserAddress
+from django.utils import timezone
+from src.apps.accounts.models import TokenRevocation, UserProfile, UserAddress
 
 User = get_user_model()
 
@@ -87,3 +90,53 @@ class UserProfileService:
         UserAddress.objects.filter(~Q(id__in=addresses)).delete()
 
         return instance
+
+
+class TokenRevocationService:
+    """
+    Revokes all JWTs of a user issued before a point in time, on logout,
+    deactivation or a change of the fields carried in the tokens (see
+    TokenClaimsSerializer). The revocation time of every user is cached
+    for JWT_REVOCATION_CACHE_TIMEOUT seconds, so authenticating a request
+    costs a cache lookup instead of a query.
+    """
+
+    @classmethod
+    def _cache_key(cls, user_id: Any) -> str:
+        return f"token-revoked-at:{user_id}"
+
+    @classmethod
+    def get_revoked_at(cls, user_id: Any) -> float:
+        cache = caches[settings.JWT_REVOCATION_CACHE_ALIAS]
+        key = cls._cache_key(user_id)
+        revoked_at = cache.get(key)
+        if revoked_at is None:
+            revocation = (
+                TokenRevocation.objects.filter(user_id=user_id)
+                .values_list("revoked_at", flat=True)
+                .first()
+            )
+            revoked_at = revocation.timestamp() if revocation else 0.0
+            cache.set(key, revoked_at, timeout=settings.JWT_REVOCATION_CACHE_TIMEOUT)
+        return revoked_at
+
+    @classmethod
+    def is_revoked(cls, user_id: Any, issued_at: float) -> bool:
+        return issued_at < cls.get_revoked_at(user_id)
+
+    @classmethod
+    @transaction.atomic
+    def revoke(cls, user_id: Any) -> None:
+        revoked_at = timezone.now()
+        TokenRevocation.objects.update_or_create(
+            user_id=user_id, defaults={"revoked_at": revoked_at}
+        )
+        cache = caches[settings.JWT_REVOCATION_CACHE_ALIAS]
+        key = cls._cache_key(user_id)
+        timeout = settings.JWT_REVOCATION_CACHE_TIMEOUT
+        # cached now and once more after the commit, over values cached by
+        # concurrent requests before it
+        cache.set(key, revoked_at.timestamp(), timeout=timeout)
+        transaction.on_commit(
+            lambda: cache.set(key, revoked_at.timestamp(), timeout=timeout)
+        )
@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from src.apps.accounts.authentication import TOKEN_CLAIM_FIELDS
+from src.apps.accounts.services import TokenRevocationService
+
+User = get_user_model()
+
+REVOKING_FIELDS = (*TOKEN_CLAIM_FIELDS, "is_active")
+
+
+@receiver(user_logged_out)
+def revoke_tokens_on_logout(sender, request, user, **kwargs):
+    if user is not None:
+        TokenRevocationService.revoke(user.pk)
+
+
+@receiver(pre_save, sender=User)
+def revoke_tokens_on_claims_change(sender, instance, update_fields=None, **kwargs):
+    """
+    Revokes the tokens of a user who is deactivated or whose fields carried
+    in the tokens change, so their stale claims are not trusted any more.
+    Changes made with QuerySet.update() are not seen.
+    """
+    if instance._state.adding or instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & set(REVOKING_FIELDS):
+        return
+    current = User.objects.filter(pk=instance.pk).values(*REVOKING_FIELDS).first()
+    if current is None:
+        return
+    if any(current[field] != getattr(instance, field) for field in REVOKING_FIELDS):
+        TokenRevocationService.revoke(instance.pk)
@@ -1,6 +1,7 @@
 from django.urls import include, path
 from django.conf import settings
 from src.apps.payments.views import StripeWebhookView
+from src.core.db.views import DatabaseStatsView
 
 
 urlpatterns = [
@@ -8,6 +9,7 @@ urlpatterns = [
     path("products/", include("src.apps.products.urls", namespace="products")),
     path("", include("src.apps.orders.urls", namespace="orders")),
     path("stripe/webhook/", StripeWebhookView.as_view()),
+    path("db/stats/", DatabaseStatsView.as_view(), name="db-stats"),
 ]
 
 if settings.DEBUG:
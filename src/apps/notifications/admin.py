@@ -0,0 +1,5 @@
+from django.contrib import admin
+from src.apps.notifications.models import OutgoingEmail
+
+# Register your models here.
+admin.site.register(OutgoingEmail)
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from src.apps.notifications.services import EmailOutboxService
+
+
+class Command(BaseCommand):
+    help = "Sends emails queued in the outbox table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--max-attempts", type=int, default=None)
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep draining the outbox instead of exiting once it is empty.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5.0,
+            help="Seconds to sleep between polls of an empty outbox in --loop mode.",
+        )
+
+    def handle(self, *args, **options):
+        total_sent, total_failed = 0, 0
+        while True:
+            sent, failed = EmailOutboxService.send_pending(
+                batch_size=options["batch_size"],
+                max_attempts=options["max_attempts"],
+            )
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f"Sent {sent} emails, {failed} failed.")
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Outbox drained. Sent: {total_sent}, failed: {total_failed}."
+            )
+        )
@@ -0,0 +1,68 @@
+from django.core.mail import EmailMessage
+from django.db import models
+from django.utils import timezone
+import uuid
+
+
+class OutgoingEmail(models.Model):
+    """
+    Transactional outbox of emails. Rows are written in the same transaction as
+    the change they notify about and sent later by the `send_queued_emails`
+    management command, so SMTP latency never holds a database transaction open.
+    """
+
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (SENDING, "Sending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+    )
+
+    id = models.UUIDField(
+        primary_key=True, default=uuid.uuid4, editable=False, unique=True
+    )
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # when a pending email is due, or when the claim of a sending one expires
+    send_after = models.DateTimeField(default=timezone.now)
+    sent = models.DateTimeField(null=True, blank=True)
+
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Outgoing email"
+        verbose_name_plural = "Outgoing emails"
+        indexes = [
+            models.Index(
+                fields=["send_after"],
+                condition=models.Q(status="pending"),
+                name="outgoing_email_pending_idx",
+            ),
+            models.Index(
+                fields=["send_after"],
+                condition=models.Q(status="sending"),
+                name="outgoing_email_sending_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.subject} to {', '.join(self.recipients)} ({self.status})"
+
+    def to_message(self, connection=None) -> EmailMessage:
+        return EmailMessage(
+            subject=self.subject,
+            body=self.body,
+            from_email=self.from_email,
+            to=self.recipients,
+            connection=connection,
+        )
@@ -0,0 +1,141 @@
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from src.apps.notifications.models import OutgoingEmail
+
+
+class EmailOutboxService:
+    """
+    Service for queueing emails in the outbox table and delivering them.
+
+    .enqueue() only inserts a row, so it is cheap to call inside the atomic
+    blocks of other services. .send_pending() claims a batch of due emails
+    with SELECT ... FOR UPDATE SKIP LOCKED and commits the claim before
+    sending, so several workers can drain the outbox concurrently and no
+    transaction is open while talking to the mail server. The batch is sent
+    over a single backend connection and the outcome of every email is saved
+    as soon as it is known, so a worker crashing mid-batch re-sends at most
+    the email it was sending, once its claim expires.
+    Failed emails are retried with exponential backoff until max_attempts.
+    """
+
+    update_fields = [
+        "status",
+        "attempts",
+        "last_error",
+        "send_after",
+        "sent",
+        "updated",
+    ]
+
+    @classmethod
+    def enqueue(
+        cls,
+        subject: str,
+        body: str,
+        recipients: list[str],
+        from_email: Optional[str] = None,
+    ) -> OutgoingEmail:
+        return OutgoingEmail.objects.create(
+            subject=subject,
+            body=body,
+            from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+            recipients=recipients,
+        )
+
+    @classmethod
+    def _retry_delay(cls, attempts: int) -> timedelta:
+        return timedelta(
+            seconds=settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+        )
+
+    @classmethod
+    @transaction.atomic
+    def _claim(cls, batch_size: int) -> list[OutgoingEmail]:
+        """
+        Marks a batch of due emails, and emails whose claim expired, as
+        sending for as long as sending the batch may take: EMAIL_TIMEOUT
+        for connecting and for every email, plus EMAIL_OUTBOX_CLAIM_TIMEOUT.
+        """
+        now = timezone.now()
+        emails = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=OutgoingEmail.PENDING) | Q(status=OutgoingEmail.SENDING),
+                send_after__lte=now,
+            )
+            .order_by("send_after")[:batch_size]
+        )
+        claimed_until = now + timedelta(
+            seconds=(len(emails) + 1) * settings.EMAIL_TIMEOUT
+            + settings.EMAIL_OUTBOX_CLAIM_TIMEOUT
+        )
+        for email in emails:
+            email.status = OutgoingEmail.SENDING
+            email.send_after = claimed_until
+            email.updated = now
+        OutgoingEmail.objects.bulk_update(emails, ["status", "send_after", "updated"])
+        return emails
+
+    @classmethod
+    def _record_failure(
+        cls, email: OutgoingEmail, error: Exception, max_attempts: int
+    ) -> None:
+        now = timezone.now()
+        email.attempts += 1
+        email.last_error = str(error)
+        if email.attempts >= max_attempts:
+            email.status = OutgoingEmail.FAILED
+        else:
+            email.status = OutgoingEmail.PENDING
+            email.send_after = now + cls._retry_delay(email.attempts)
+        email.updated = now
+
+    @classmethod
+    def send_pending(
+        cls, batch_size: int = 100, max_attempts: Optional[int] = None
+    ) -> tuple[int, int]:
+        """
+        Sends one batch of due emails. Returns a tuple of the number of sent
+        emails and the number of emails that failed in this batch. When the
+        connection to the mail server cannot be opened, the whole batch
+        fails and is retried later.
+        """
+        max_attempts = max_attempts or settings.EMAIL_OUTBOX_MAX_ATTEMPTS
+        emails = cls._claim(batch_size)
+        if not emails:
+            return 0, 0
+
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+        except Exception as err:
+            for email in emails:
+                cls._record_failure(email, err, max_attempts)
+            OutgoingEmail.objects.bulk_update(emails, cls.update_fields)
+            return 0, len(emails)
+
+        sent, failed = 0, 0
+        try:
+            for email in emails:
+                try:
+                    connection.send_messages([email.to_message(connection)])
+                except Exception as err:
+                    failed += 1
+                    cls._record_failure(email, err, max_attempts)
+                else:
+                    sent += 1
+                    email.attempts += 1
+                    email.status = OutgoingEmail.SENT
+                    email.sent = timezone.now()
+                    email.updated = email.sent
+                email.save(update_fields=cls.update_fields)
+        finally:
+            connection.close()
+        return sent, failed
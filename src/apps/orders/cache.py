@@ -0,0 +1,59 @@
+from typing import Optional
+
+from django.conf import settings
+from django.db import transaction
+
+from src.apps.orders.models import Coupon
+
+
+class ActiveCouponCache:
+    """
+    In-process cache of active coupons by code, so checkouts using a hot
+    promotion code do not query it on every order.
+
+    Entries are never trusted for the redemption itself: CouponService
+    redeems a coupon with an UPDATE matching the cached `updated` value,
+    so a coupon changed, deactivated or deleted by another process (or the
+    admin) fails the redemption and is reloaded with .reload(). Codes of
+    missing or inactive coupons are not cached. The cache is cleared when
+    it reaches COUPON_CACHE_MAX_ENTRIES codes.
+    """
+
+    _entries: dict[str, Coupon] = {}
+
+    @classmethod
+    def _store(cls, code: str, coupon: Optional[Coupon]) -> Optional[Coupon]:
+        if coupon is None:
+            cls._entries.pop(code, None)
+            return None
+        if len(cls._entries) >= settings.COUPON_CACHE_MAX_ENTRIES:
+            cls._entries = {}
+        cls._entries[code] = coupon
+        return coupon
+
+    @classmethod
+    def reload(cls, code: str) -> Optional[Coupon]:
+        return cls._store(
+            code, Coupon.objects.filter(code=code, is_active=True).first()
+        )
+
+    @classmethod
+    def get(cls, code: str) -> Optional[Coupon]:
+        try:
+            return cls._entries[code]
+        except KeyError:
+            return cls.reload(code)
+
+    @classmethod
+    def clear(cls) -> None:
+        cls._entries = {}
+
+    @classmethod
+    def invalidate(cls) -> None:
+        """
+        Clears the cache now and once more after the surrounding
+        transaction commits, so coupons cached by concurrent requests from
+        data read before the commit are dropped as well.
+        """
+        cls.clear()
+        transaction.on_commit(cls.clear)
@@ -0,0 +1,49 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from src.apps.orders.services import OrderExportService
+from src.core.streaming import CSV, FORMATS, write_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes orders with their items and payments as flat CSV or JSON lines "
+        "rows, one per order item."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--from",
+            dest="date_from",
+            type=date.fromisoformat,
+            help="First day of the range (YYYY-MM-DD), inclusive.",
+        )
+        parser.add_argument(
+            "--to",
+            dest="date_to",
+            type=date.fromisoformat,
+            help="Last day of the range (YYYY-MM-DD), inclusive.",
+        )
+        parser.add_argument("--file-format", choices=FORMATS, default=CSV)
+        parser.add_argument(
+            "--output", help="Path of the file to write, stdout by default."
+        )
+
+    def handle(self, *args, **options):
+        date_from, date_to = options["date_from"], options["date_to"]
+        if date_from and date_to and date_from > date_to:
+            raise CommandError("--to cannot be earlier than --from.")
+
+        lines = write_rows(
+            OrderExportService.iter_rows(date_from=date_from, date_to=date_to),
+            options["file_format"],
+            fieldnames=OrderExportService.fieldnames,
+        )
+        if not options["output"]:
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+
+        with open(options["output"], "w", encoding="utf-8", newline="") as output:
+            output.writelines(lines)
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from src.apps.orders.services import OrderReaperService
+
+
+class Command(BaseCommand):
+    help = (
+        "Cancels orders left unpaid for longer than ORDER_PAYMENT_TTL, returns "
+        "their items to the inventory and purges carts idle for CART_TTL. "
+        "Cancelled orders are kept, marked as cancelled."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep reaping every --interval seconds instead of exiting.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=300.0,
+            help="Seconds to sleep between runs in --loop mode.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            results = OrderReaperService.reap(batch_size=options["batch_size"])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    "Cancelled orders: {cancelled_orders}, released units: "
+                    "{released_units}, purged carts: {purged_carts}.".format(**results)
+                )
+            )
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,60 @@
+# Generated by Django 4.0 on 2026-10-18 03:07
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, NullIf
+
+
+def backfill_order_totals(apps, schema_editor):
+    Order = apps.get_model("orders", "Order")
+    OrderItem = apps.get_model("orders", "OrderItem")
+    Coupon = apps.get_model("orders", "Coupon")
+
+    amount_field = DecimalField(max_digits=12, decimal_places=2)
+    line_total = ExpressionWrapper(
+        Coalesce(NullIf(F("product__discount_price"), Value(0)), F("product__price"))
+        * F("quantity"),
+        output_field=amount_field,
+    )
+    items_total = (
+        OrderItem.objects.filter(order=OuterRef("pk"))
+        .values("order")
+        .annotate(total=Sum(line_total))
+        .values("total")
+    )
+    coupon_amount = Coupon.objects.filter(pk=OuterRef("coupon_id")).values("amount")
+
+    Order.objects.update(
+        before_coupon_amount=Coalesce(
+            Subquery(items_total), Value(Decimal("0.00")), output_field=amount_field
+        )
+    )
+    Order.objects.update(
+        total_amount=ExpressionWrapper(
+            F("before_coupon_amount") - Coalesce(Subquery(coupon_amount), Value(0)),
+            output_field=amount_field,
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_alter_order_payment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='before_coupon_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.RunPython(backfill_order_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def deduplicate_coupon_codes(apps, schema_editor):
+    """
+    Keeps the code of the newest coupon of every duplicated code and
+    suffixes the others with their id, so the code can be made unique.
+    """
+    Coupon = apps.get_model("orders", "Coupon")
+    seen = set()
+    for coupon in Coupon.objects.order_by("-created", "-id"):
+        if coupon.code in seen:
+            coupon.code = f"{coupon.code[:41]}-{str(coupon.id)[:8]}"
+            coupon.save(update_fields=["code"])
+        seen.add(coupon.code)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0006_reaper_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_coupon_codes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.0 on 2026-10-18 04:23
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, NullIf
+
+
+def backfill_unit_prices(apps, schema_editor):
+    # the price the existing items were placed for is not known any more,
+    # the current price is the closest there is
+    OrderItem = apps.get_model("orders", "OrderItem")
+    Product = apps.get_model("products", "Product")
+
+    current_price = Product.objects.filter(pk=OuterRef("product_id")).values(
+        current_price=Coalesce(
+            NullIf(F("discount_price"), Value(0)),
+            F("price"),
+            output_field=models.DecimalField(max_digits=7, decimal_places=2),
+        )
+    )
+    OrderItem.objects.update(unit_price=Subquery(current_price))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_catalog_indexes'),
+        ('orders', '0009_order_stripe_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=7, null=True),
+        ),
+        migrations.RunPython(backfill_unit_prices, migrations.RunPython.noop),
+    ]
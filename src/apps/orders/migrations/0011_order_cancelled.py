@@ -0,0 +1,26 @@
+# Generated by Django 4.0 on 2026-10-18 04:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_order_item_unit_price'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_unpaid_created_idx',
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='cancelled',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('cancelled', False), ('payment_accepted', False)), fields=['created'], name='order_unpaid_created_idx'),
+        ),
+    ]
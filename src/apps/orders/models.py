@@ -1,4 +1,8 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import DecimalField, ExpressionWrapper, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, NullIf
 from django.contrib.auth import get_user_model
 import uuid
 
@@ -10,6 +14,71 @@ from src.apps.payments.models import PaymentDetails
 User = get_user_model()
 
 
+def unit_price(prefix: str = ""):
+    """
+    SQL expression of the current unit price of a cart/order line product:
+    the discounted price, when the product has one.
+    """
+    return Coalesce(
+        NullIf(F(f"{prefix}product__discount_price"), Value(0)),
+        F(f"{prefix}product__price"),
+        output_field=DecimalField(max_digits=7, decimal_places=2),
+    )
+
+
+def line_total(prefix: str = ""):
+    """
+    SQL expression of a cart/order line price: the current unit price
+    multiplied by the quantity.
+    """
+    return ExpressionWrapper(
+        unit_price(prefix) * F(f"{prefix}quantity"),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def order_line_total(prefix: str = ""):
+    """
+    SQL expression of the price an order line was placed for: the unit price
+    stored at checkout multiplied by the quantity. Lines without a stored
+    unit price (created outside of checkout) use the current unit price.
+    """
+    return ExpressionWrapper(
+        Coalesce(F(f"{prefix}unit_price"), unit_price(prefix)) * F(f"{prefix}quantity"),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def items_total(prefix: str = ""):
+    return Coalesce(
+        Sum(line_total(prefix)),
+        Value(Decimal("0.00")),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def order_items_total(prefix: str = ""):
+    """
+    SQL aggregate of the prices the order lines were placed for, see
+    order_line_total().
+    """
+    return Coalesce(
+        Sum(order_line_total(prefix)),
+        Value(Decimal("0.00")),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+class CartQuerySet(models.QuerySet):
+    def with_totals(self):
+        return self.annotate(items_total=items_total("cart_items__"))
+
+
+class OrderQuerySet(models.QuerySet):
+    def with_totals(self):
+        return self.annotate(items_total=order_items_total("order_items__"))
+
+
 class Cart(models.Model):
     id = models.UUIDField(
         primary_key=True, default=uuid.uuid4, editable=False, unique=True
@@ -18,14 +87,19 @@ class Cart(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    objects = CartQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=["updated"], name="cart_updated_idx")]
+
     def __str__(self) -> str:
         return f"Cart {self.pk} of user {self.user.username}. Total: ${self.total}"
 
     @property
     def total(self):
-        cartitems = self.cart_items.all()
-        total = sum(item.final_price for item in cartitems)
-        return total
+        if hasattr(self, "items_total"):
+            return self.items_total
+        return self.cart_items.aggregate(total=items_total())["total"]
 
 
 class CartItem(models.Model):
@@ -68,10 +142,14 @@ class Coupon(models.Model):
     id = models.UUIDField(
         primary_key=True, default=uuid.uuid4, editable=False, unique=True
     )
-    code = models.CharField(max_length=50)
+    code = models.CharField(max_length=50, unique=True)
     amount = models.IntegerField()
     min_order_total = models.IntegerField(default=0)
     is_active = models.BooleanField(default=False)
+    # usage limits, None means unlimited
+    max_uses = models.PositiveIntegerField(null=True, blank=True)
+    max_uses_per_user = models.PositiveIntegerField(null=True, blank=True)
+    times_used = models.PositiveIntegerField(default=0)
 
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
@@ -80,6 +158,36 @@ class Coupon(models.Model):
         return f"{self.code} coupon for ${self.amount}"
 
 
+class CouponRedemption(models.Model):
+    """
+    Number of orders of a user placed with a coupon.
+    """
+
+    id = models.UUIDField(
+        primary_key=True, default=uuid.uuid4, editable=False, unique=True
+    )
+    coupon = models.ForeignKey(
+        Coupon, on_delete=models.CASCADE, related_name="redemptions"
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="coupon_redemptions"
+    )
+    count = models.PositiveIntegerField(default=0)
+
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["coupon", "user"], name="coupon_redemption_user_unique"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.coupon.code} coupon used {self.count} times by user {self.user.username}"
+
+
 class Order(models.Model):
     id = models.UUIDField(
         primary_key=True, default=uuid.uuid4, editable=False, unique=True
@@ -96,22 +204,64 @@ class Order(models.Model):
     payment_accepted = models.BooleanField(default=False)
     being_delivered = models.BooleanField(default=False)
     received = models.BooleanField(default=False)
+    # set by `manage.py reap_orders` instead of deleting an unpaid order, so a
+    # payment arriving late can still be matched to it
+    cancelled = models.BooleanField(default=False)
+    # snapshot of the totals taken when the order is placed, so listing orders
+    # does not recompute them from the order items
+    before_coupon_amount = models.DecimalField(
+        max_digits=12, decimal_places=2, null=True, blank=True
+    )
+    total_amount = models.DecimalField(
+        max_digits=12, decimal_places=2, null=True, blank=True
+    )
+    # last Stripe Checkout session, reused while it is payable for the total
+    stripe_session_id = models.CharField(max_length=255, blank=True, default="")
+    stripe_session_url = models.TextField(blank=True, default="")
+    stripe_session_amount = models.IntegerField(null=True, blank=True)
+    stripe_session_expires = models.DateTimeField(null=True, blank=True)
 
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created", "id"], name="order_created_id_idx"),
+            models.Index(
+                fields=["user", "created", "id"], name="order_user_created_id_idx"
+            ),
+            models.Index(
+                fields=["created"],
+                name="order_unpaid_created_idx",
+                condition=Q(payment_accepted=False, cancelled=False),
+            ),
+        ]
+
     def __str__(self) -> str:
         return f"Order #{self.pk} by user {self.user.username}."
 
     @property
     def before_coupon(self):
-        orderitems = self.order_items.all()
-        total = sum(item.final_price for item in orderitems)
-        return total
+        if self.before_coupon_amount is not None:
+            return self.before_coupon_amount
+        if hasattr(self, "items_total"):
+            return self.items_total
+        if "order_items" in getattr(self, "_prefetched_objects_cache", {}):
+            return sum(
+                (item.placed_total for item in self.order_items.all()), Decimal("0.00")
+            )
+        return self.order_items.aggregate(total=order_items_total())["total"]
 
     @property
     def total(self):
-        total = self.before_coupon
+        if self.total_amount is not None:
+            return self.total_amount
+        return self.apply_coupon(self.before_coupon)
+
+    def apply_coupon(self, before_coupon):
+        total = before_coupon
         if self.coupon:
             if discount := self.coupon.amount:
                 total = total - discount
@@ -127,6 +277,11 @@ class OrderItem(models.Model):
     )
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField(default=1)
+    # price of one unit when the order was placed, later changes of the
+    # product price do not change what the order was placed for
+    unit_price = models.DecimalField(
+        max_digits=7, decimal_places=2, null=True, blank=True
+    )
 
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
@@ -134,6 +289,16 @@ class OrderItem(models.Model):
     def __str__(self) -> str:
         return f"Item of {self.order.pk} order. Quantity: {self.quantity}"
 
+    @property
+    def placed_total(self):
+        """
+        Price the line was placed for, the Python side of order_line_total().
+        """
+        price = self.unit_price
+        if price is None:
+            price = self.product.discount_price or self.product.price
+        return price * self.quantity
+
     @property
     def total_item_price(self) -> float:
         return self.quantity * self.product.price
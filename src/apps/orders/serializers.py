@@ -7,11 +7,13 @@ from src.apps.accounts.serializers import (
 )
 from src.apps.orders.models import (
     Order,
+    OrderItem,
     Cart,
     CartItem,
     Coupon,
 )
 from src.apps.payments.serializers import PaymentDetailsOutputSerializer
+from src.core.streaming import CSV, FORMATS
 
 
 class CouponInputSerializer(serializers.Serializer):
@@ -19,6 +21,12 @@ class CouponInputSerializer(serializers.Serializer):
     amount = serializers.IntegerField(validators=[MinValueValidator(0)])
     is_active = serializers.BooleanField()
     min_order_total = serializers.IntegerField(validators=[MinValueValidator(10)])
+    max_uses = serializers.IntegerField(
+        required=False, allow_null=True, validators=[MinValueValidator(1)]
+    )
+    max_uses_per_user = serializers.IntegerField(
+        required=False, allow_null=True, validators=[MinValueValidator(1)]
+    )
 
 
 class CouponOutputSerializers(serializers.ModelSerializer):
@@ -33,6 +41,9 @@ class CouponOutputSerializers(serializers.ModelSerializer):
             "amount",
             "min_order_total",
             "is_active",
+            "max_uses",
+            "max_uses_per_user",
+            "times_used",
             "created",
             "updated",
         )
@@ -58,6 +69,43 @@ class CartItemQuantityInputSerializer(serializers.Serializer):
     quantity = serializers.IntegerField(default=1, validators=[MinValueValidator(0)])
 
 
+class CartItemOperationInputSerializer(serializers.Serializer):
+    ADD = "add"
+    SET = "set"
+    REMOVE = "remove"
+
+    op = serializers.ChoiceField(choices=(ADD, SET, REMOVE))
+    product_id = serializers.UUIDField()
+    quantity = serializers.IntegerField(
+        required=False, validators=[MinValueValidator(0)]
+    )
+
+    def validate(self, data):
+        quantity = data.get("quantity")
+        if data["op"] == self.ADD:
+            if quantity == 0:
+                raise serializers.ValidationError(
+                    {"quantity": "Ensure this value is greater than or equal to 1."}
+                )
+            data["quantity"] = quantity or 1
+        elif data["op"] == self.SET and quantity is None:
+            raise serializers.ValidationError({"quantity": "This field is required."})
+        return data
+
+
+class CartItemBatchInputSerializer(serializers.Serializer):
+    max_operations = 100
+
+    operations = CartItemOperationInputSerializer(many=True, allow_empty=False)
+
+    def validate_operations(self, operations):
+        if len(operations) > self.max_operations:
+            raise serializers.ValidationError(
+                f"Ensure this field has no more than {self.max_operations} elements."
+            )
+        return operations
+
+
 class CouponOrderInputSerializer(serializers.Serializer):
     code = serializers.CharField()
 
@@ -79,6 +127,8 @@ class CartItemOutputSerializer(serializers.ModelSerializer):
             "final_price",
         )
         read_only_fields = fields
+        values_dependencies = ("product__price", "product__discount_price")
+        values_ordering = ("created", "id")
 
 
 class CartOutputSerializer(serializers.ModelSerializer):
@@ -94,6 +144,7 @@ class CartOutputSerializer(serializers.ModelSerializer):
             "total",
         )
         read_only_fields = fields
+        values_dependencies = ("items_total",)
 
 
 class OrderInputSerializer(serializers.Serializer):
@@ -101,12 +152,26 @@ class OrderInputSerializer(serializers.Serializer):
     address_id = serializers.CharField()
 
 
+class OrderExportInputSerializer(serializers.Serializer):
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    file_format = serializers.ChoiceField(choices=FORMATS, default=CSV)
+
+    def validate(self, data):
+        date_from, date_to = data.get("date_from"), data.get("date_to")
+        if date_from and date_to and date_from > date_to:
+            raise serializers.ValidationError(
+                {"date_to": "date_to cannot be earlier than date_from"}
+            )
+        return data
+
+
 class OrderItemOutputSerializer(serializers.ModelSerializer):
     product_id = serializers.CharField(source="product.id", read_only=True)
     product_name = serializers.CharField(source="product.name", read_only=True)
 
     class Meta:
-        model = CartItem
+        model = OrderItem
         fields = (
             "id",
             "product_id",
@@ -118,6 +183,13 @@ class OrderItemOutputSerializer(serializers.ModelSerializer):
             "final_price",
         )
         read_only_fields = fields
+        # OrderOutputSerializer sums placed_total of the items
+        values_dependencies = (
+            "product__price",
+            "product__discount_price",
+            "unit_price",
+        )
+        values_ordering = ("created", "id")
 
 
 class OrderOutputSerializer(serializers.ModelSerializer):
@@ -143,9 +215,11 @@ class OrderOutputSerializer(serializers.ModelSerializer):
             "order_accepted",
             "being_delivered",
             "received",
+            "cancelled",
             "order_items",
             "payment",
             "created",
             "updated",
         )
         read_only_fields = fields
+        values_dependencies = ("before_coupon_amount", "total_amount", "coupon__amount")
@@ -1,42 +1,88 @@
-from typing import Any
+import logging
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Iterator, Optional
+from django.conf import settings
 from django.db import transaction
+from django.db.models import (
+    CharField,
+    Count,
+    Exists,
+    F,
+    OuterRef,
+    Q,
+    QuerySet,
+    Sum,
+    Value,
+)
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast, Coalesce, Greatest
 from django.contrib.auth import get_user_model
+from django.http import Http404
 from django.shortcuts import get_object_or_404
-from django.core.mail import send_mail
+from django.utils import timezone
 from rest_framework.serializers import ValidationError
 
 from src.apps.accounts.models import UserAddress
 from src.apps.orders.models import (
     Order,
     OrderItem,
-    Cart,
     CartItem,
     Coupon,
+    CouponRedemption,
+    order_line_total,
+    unit_price,
 )
-from src.apps.payments.models import PaymentDetails
+from src.apps.orders.cache import ActiveCouponCache
+from src.apps.notifications.services import EmailOutboxService
+from src.apps.payments.models import PaymentDetails, StripeEvent
 from src.apps.products.models import Product
+from src.apps.products.services import InventoryService, ProductRankingService
+from src.apps.orders.storage import CartStorage, get_cart_storage
 from src.apps.orders.validators import (
     validate_item_quantity,
     validate_coupon_total,
     validate_coupon,
+    validate_coupon_usage,
 )
 
 User = get_user_model()
 
+logger = logging.getLogger(__name__)
+
 
 class CouponService:
     """
-    Service for creating and updating coupons.
+    Service for creating, updating and redeeming coupons.
+
+    Active coupons are looked up by code in ActiveCouponCache, which every
+    change made here invalidates. A redemption is counted with conditional
+    UPDATEs of Coupon.times_used and of the per-user CouponRedemption row,
+    so usage limits hold under concurrent checkouts and the coupon row is
+    only locked from the increment until the order transaction commits.
     """
 
+    optional_fields = ["max_uses", "max_uses_per_user"]
+
+    @classmethod
+    def _validate_code(cls, code: str, instance: Optional[Coupon] = None) -> None:
+        coupons = Coupon.objects.filter(code=code)
+        if instance is not None:
+            coupons = coupons.exclude(id=instance.id)
+        if coupons.exists():
+            raise ValidationError({"code": "Coupon with this code already exists."})
+
     @classmethod
     @transaction.atomic
     def create_coupon(cls, data: dict[str, Any]) -> Coupon:
         min_total = data["min_order_total"]
         amount = data["amount"]
         validate_coupon(amount=amount, min_total=min_total)
+        cls._validate_code(data["code"])
 
         coupon = Coupon.objects.create(**data)
+        ActiveCouponCache.invalidate()
         return coupon
 
     @classmethod
@@ -45,6 +91,7 @@ class CouponService:
         min_total = data["min_order_total"]
         amount = data["amount"]
         validate_coupon(amount=amount, min_total=min_total)
+        cls._validate_code(data["code"], instance=instance)
 
         fields = [
             "code",
@@ -57,48 +104,169 @@ class CouponService:
                 setattr(instance, field, data[field])
             except KeyError as err:
                 raise err("Missing or invalid data.")
+        for field in cls.optional_fields:
+            if field in data:
+                setattr(instance, field, data[field])
         instance.save()
+        ActiveCouponCache.invalidate()
         return instance
 
+    @classmethod
+    @transaction.atomic
+    def delete_coupon(cls, instance: Coupon) -> None:
+        instance.delete()
+        ActiveCouponCache.invalidate()
+
+    @classmethod
+    def get_active_coupon(cls, code: str) -> Coupon:
+        coupon = ActiveCouponCache.get(code)
+        if coupon is None:
+            raise Http404("No Coupon matches the given query.")
+        return coupon
+
+    @classmethod
+    def _count_use(cls, coupon: Coupon) -> int:
+        # matches only if the coupon is unchanged since it was cached
+        return Coupon.objects.filter(
+            Q(max_uses__isnull=True) | Q(times_used__lt=F("max_uses")),
+            id=coupon.id,
+            updated=coupon.updated,
+            is_active=True,
+        ).update(times_used=F("times_used") + 1)
+
+    @classmethod
+    def _count_user_use(cls, coupon: Coupon, user: User) -> int:
+        CouponRedemption.objects.bulk_create(
+            [CouponRedemption(coupon_id=coupon.id, user=user)], ignore_conflicts=True
+        )
+        redemptions = CouponRedemption.objects.filter(coupon_id=coupon.id, user=user)
+        if coupon.max_uses_per_user is not None:
+            redemptions = redemptions.filter(count__lt=coupon.max_uses_per_user)
+        return redemptions.update(count=F("count") + 1, updated=timezone.now())
+
+    @classmethod
+    @transaction.atomic
+    def redeem_coupon(cls, code: str, user: User, total: Decimal) -> Coupon:
+        """
+        Validates the active coupon against the order total and counts its
+        use by the user. Called as late as possible in the order
+        transaction, as the coupon row stays locked until it ends.
+        """
+        coupon = cls.get_active_coupon(code)
+        while True:
+            validate_coupon_total(total=total, min_total=coupon.min_order_total)
+            if cls._count_use(coupon):
+                break
+            current = ActiveCouponCache.reload(code)
+            if current is None:
+                raise Http404("No Coupon matches the given query.")
+            if (current.id, current.updated) == (coupon.id, coupon.updated):
+                validate_coupon_usage(used=False)
+            coupon = current
+        validate_coupon_usage(used=cls._count_user_use(coupon, user), per_user=True)
+        return coupon
+
+    @classmethod
+    def release_coupons(cls, orders: QuerySet) -> None:
+        """
+        Reverts the coupon redemptions of orders about to be cancelled.
+        Orders placed before redemptions were counted can not push the
+        counters below zero.
+        """
+        orders = orders.filter(coupon__isnull=False).order_by()
+        per_coupon = orders.values("coupon_id").annotate(uses=Count("id"))
+        for row in sorted(per_coupon, key=lambda row: row["coupon_id"]):
+            Coupon.objects.filter(id=row["coupon_id"]).update(
+                times_used=Greatest(F("times_used") - row["uses"], Value(0))
+            )
+        for row in orders.values("coupon_id", "user_id").annotate(uses=Count("id")):
+            CouponRedemption.objects.filter(
+                coupon_id=row["coupon_id"], user_id=row["user_id"]
+            ).update(
+                count=Greatest(F("count") - row["uses"], Value(0)),
+                updated=timezone.now(),
+            )
+
 
 class CartService:
     """
     Service for managing carts. Creating and updating cart items checks quantity
     available in product's inventory and in case of deficiency, raises ValidationError.
     When updating, if the quantity is equal to 0, it removes the item from the cart.
+
+    Carts are kept by the backend configured with CART_STORAGE_BACKEND (see
+    src.apps.orders.storage), so callers should go through this service
+    instead of querying Cart and CartItem directly.
     """
 
+    @classmethod
+    def get_storage(cls) -> CartStorage:
+        return get_cart_storage()
+
+    @classmethod
+    def create_cart(cls, user: User):
+        return cls.get_storage().create_cart(user)
+
+    @classmethod
+    def list_carts(cls, user: User):
+        return cls.get_storage().list_carts(user)
+
+    @classmethod
+    def get_cart(cls, cart_id: Any, user: Optional[User] = None):
+        if cart := cls.get_storage().get_cart(cart_id, user=user):
+            return cart
+        raise Http404("No Cart matches the given query.")
+
+    @classmethod
+    def load_cart(cls, cart):
+        return cls.get_storage().load_cart(cart)
+
+    @classmethod
+    def delete_cart(cls, cart) -> None:
+        cls.get_storage().delete_cart(cart)
+
+    @classmethod
+    def list_cart_items(cls, cart_id: Any, user: User) -> list[CartItem]:
+        storage = cls.get_storage()
+        if cart := storage.get_cart(cart_id, user=user):
+            return storage.get_items(cart)
+        return []
+
+    @classmethod
+    def get_cart_item(cls, cart_id: Any, item_id: Any, user: User) -> CartItem:
+        storage = cls.get_storage()
+        if cart := storage.get_cart(cart_id, user=user):
+            if item := storage.get_item(cart, item_id):
+                return item
+        raise Http404("No CartItem matches the given query.")
+
+    @classmethod
+    def _set_quantity(
+        cls, cart_id: Any, product: Product, update
+    ) -> Optional[CartItem]:
+        storage = cls.get_storage()
+        items = storage.update_quantities(
+            cls.get_cart(cart_id),
+            [product.id],
+            lambda quantities: {product.id: update(quantities.get(product.id, 0))},
+        )
+        if item := items.get(product.id):
+            item.product = product
+        return item
+
     @classmethod
     @transaction.atomic
     def create_cart_item(cls, cart_id: int, data: dict[str, Any]) -> CartItem:
         product_id = data.pop("product_id")
         quantity = data.pop("quantity")
 
-        product = get_object_or_404(Product, id=product_id)
+        product = get_object_or_404(
+            Product.objects.select_related("inventory"), id=product_id
+        )
         max_quantity = product.inventory.quantity
         validate_item_quantity(quantity, max_quantity)
 
-        try:
-            cartitem = CartItem.objects.get(product_id=product_id, cart_id=cart_id)
-            cartitem.quantity += quantity
-            cartitem.save()
-        except CartItem.DoesNotExist:
-            product = get_object_or_404(Product, id=product_id)
-            cart = get_object_or_404(Cart, id=cart_id)
-            cartitem = CartItem.objects.create(
-                cart=cart,
-                product=product,
-                quantity=quantity,
-            )
-            cartitem.save()
-        return cartitem
-
-    @classmethod
-    def _check_quantity(cls, instance: CartItem, quantity: int):
-        if quantity == 0:
-            instance.delete()
-            return False
-        return True
+        return cls._set_quantity(cart_id, product, lambda current: current + quantity)
 
     @classmethod
     @transaction.atomic
@@ -106,14 +274,70 @@ class CartService:
         quantity = data["quantity"]
         max_quantity = instance.product.inventory.quantity
         validate_item_quantity(quantity, max_quantity)
-        if cls._check_quantity(instance=instance, quantity=quantity):
-            try:
-                setattr(instance, "quantity", quantity)
-            except KeyError as err:
-                raise err("Missing or invalid data.")
-            instance.save()
-            return instance
-        return
+        cls._set_quantity(instance.cart_id, instance.product, lambda current: quantity)
+        if quantity == 0:
+            return
+        instance.quantity = quantity
+        return instance
+
+    @classmethod
+    @transaction.atomic
+    def delete_cart_item(cls, instance: CartItem) -> None:
+        cls._set_quantity(instance.cart_id, instance.product, lambda current: 0)
+
+    @classmethod
+    def _apply_operation(cls, quantity: int, operation: dict[str, Any]) -> int:
+        if operation["op"] == "add":
+            return quantity + operation["quantity"]
+        if operation["op"] == "set":
+            return operation["quantity"]
+        return 0
+
+    @classmethod
+    @transaction.atomic
+    def update_cart_items(cls, cart, data: dict[str, Any]):
+        """
+        Applies a list of add/set/remove operations to the cart atomically.
+        Operations run in order and the resulting quantity of every product
+        is validated against its inventory once. Operations on products
+        missing from the cart (or from the catalog, for removals) are
+        no-ops. The number of queries does not depend on the number of
+        operations.
+        """
+        operations = data["operations"]
+        product_ids = {operation["product_id"] for operation in operations}
+        products = Product.objects.select_related("inventory").in_bulk(product_ids)
+
+        def apply(quantities: dict[Any, int]) -> dict[Any, int]:
+            last_operation = {}
+            errors = [{} for _ in operations]
+            for index, operation in enumerate(operations):
+                product_id = operation["product_id"]
+                if product_id not in products and operation["op"] != "remove":
+                    errors[index] = {
+                        "product_id": f"Product {product_id} does not exist."
+                    }
+                    continue
+                quantities[product_id] = cls._apply_operation(
+                    quantities.get(product_id, 0), operation
+                )
+                last_operation[product_id] = index
+
+            for product_id, quantity in quantities.items():
+                if product_id in products and quantity:
+                    try:
+                        validate_item_quantity(
+                            quantity, products[product_id].inventory.quantity
+                        )
+                    except ValidationError as err:
+                        errors[last_operation[product_id]] = err.detail
+            if any(errors):
+                raise ValidationError({"operations": errors})
+            return quantities
+
+        storage = cls.get_storage()
+        storage.update_quantities(cart, product_ids, apply)
+        return storage.load_cart(cart)
 
 
 class OrderService:
@@ -124,85 +348,104 @@ class OrderService:
 
     Optional coupons are checked if they exist, are active and
     the minimal total requirement is fulfilled. After an order is created,
-    email is sent out to the buyer.
-
-    After a payment is confirmed by Stripe, StripeWebhookView calls .fullfill_order()
-    method which updates quantity sold of each item and change .payment_accepted
-    attribute of an order to `True`. It also sends out an email to the buyer with
-    payment confirmation message and creates PaymentDetails object.
+    email to the buyer is queued in the outbox within the same transaction.
+    Totals before and after the coupon are stored on the order when it is placed.
+
+    After a payment is confirmed by Stripe, StripeEventService calls
+    .fullfill_order() method which updates quantity sold of each item and
+    change .payment_accepted attribute of an order to `True`. Repeated calls
+    for a paid order are no-ops. It also queues an email to the buyer with
+    payment confirmation message and creates PaymentDetails object. Payments
+    of orders cancelled by OrderReaperService are recorded on the order and
+    logged for a refund, the order is not accepted.
     """
 
     @classmethod
-    def _create_order_items(cls, instance: Order, cart_items):
+    def _create_order_items(cls, instance: Order, cart_items) -> list[OrderItem]:
         if not cart_items:
             raise ValidationError({"Missing items": "The cart is empty"})
+        order_items = []
+        quantities = defaultdict(int)
         for cartitem in cart_items:
             product = cartitem.product
-            quantity = cartitem.quantity
-            max_quantity = product.inventory.quantity
+            order_items.append(
+                OrderItem(
+                    order=instance,
+                    product=product,
+                    quantity=cartitem.quantity,
+                    unit_price=product.discount_price or product.price,
+                )
+            )
+            quantities[product.inventory_id] += cartitem.quantity
 
-            validate_item_quantity(quantity=quantity, max_quantity=max_quantity)
+        InventoryService.reserve(quantities=quantities)
+        return OrderItem.objects.bulk_create(order_items)
 
-            OrderItem.objects.create(order=instance, product=product, quantity=quantity)
-            product_inventory = product.inventory
-            product_inventory.quantity = product_inventory.quantity - quantity
-            product_inventory.save()
-        return
+    @classmethod
+    def _get_inventory_quantities(cls, instance: Order) -> dict[Any, int]:
+        rows = (
+            instance.order_items.values("product__inventory_id")
+            .annotate(quantity=Sum("quantity"))
+            .order_by()
+        )
+        return {row["product__inventory_id"]: row["quantity"] for row in rows}
 
     @classmethod
     def _send_email_before_payment(cls, order_id: int, email: str):
-        send_mail(
+        EmailOutboxService.enqueue(
             "Order #{}".format(order_id),
             """
             Thank you for purchasing in our store.
             We received your order, awaiting payment.
             THIS IS NOT SHIPPING CONFIRMATION EMAIL.
             """,
-            "ecommapi@ecommapi.com",
             ["{}".format(email)],
-            fail_silently=False,
+            from_email="ecommapi@ecommapi.com",
         )
 
     @classmethod
     @transaction.atomic
     def create_order(cls, cart_id: int, user: User, data: dict[str, Any]) -> Order:
-        
-        print(get_object_or_404(
-            UserAddress, id=data["address_id"], userprofile__user=user
-        ), "wow1")
         address = get_object_or_404(
             UserAddress, id=data["address_id"], userprofile__user=user
         )
-        print(get_object_or_404(Cart, id=cart_id, user=user), "wow2")
-        cart = get_object_or_404(Cart, id=cart_id, user=user)
-        cart_items = cart.cart_items.select_related(
-            "product", "product__inventory"
-        ).all()
+        cart = CartService.get_cart(cart_id, user=user)
+        if cart.user_id != user.id:
+            raise Http404("No Cart matches the given query.")
+        cart_items = CartService.get_storage().get_items(cart)
 
         order = Order.objects.create(user=user, address=address)
 
-        cls._create_order_items(instance=order, cart_items=cart_items)
+        order_items = cls._create_order_items(instance=order, cart_items=cart_items)
+        order.before_coupon_amount = sum(item.placed_total for item in order_items)
 
         if "coupon_code" in data.keys():
-            coupon = get_object_or_404(Coupon, code=data["coupon_code"], is_active=True)
-            validate_coupon_total(
-                total=order.before_coupon, min_total=coupon.min_order_total
+            order.coupon = CouponService.redeem_coupon(
+                data["coupon_code"], user=user, total=order.before_coupon_amount
             )
-            order.coupon = coupon
-            order.save()
-        cart.delete()
-        cls._send_email_before_payment(order_id=order.id, email=order.user.email)
+        order.total_amount = order.apply_coupon(order.before_coupon_amount)
+        order.save()
+        CartService.delete_cart(cart)
+        cls._send_email_before_payment(order_id=order.id, email=user.email)
         return order
 
     @classmethod
     @transaction.atomic
     def update_order(cls, instance: Order, user: User, data: dict[str, Any]) -> Order:
         if "coupon_code" in data.keys():
-            coupon = get_object_or_404(Coupon, code=data["coupon_code"], is_active=True)
-            validate_coupon_total(
-                total=instance.before_coupon, min_total=coupon.min_order_total
-            )
+            code = data["coupon_code"]
+            if instance.coupon is not None and instance.coupon.code == code:
+                coupon = CouponService.get_active_coupon(code)
+                validate_coupon_total(
+                    total=instance.before_coupon, min_total=coupon.min_order_total
+                )
+            else:
+                CouponService.release_coupons(Order.objects.filter(id=instance.id))
+                coupon = CouponService.redeem_coupon(
+                    code, user=instance.user, total=instance.before_coupon
+                )
             instance.coupon = coupon
+            instance.total_amount = instance.apply_coupon(instance.before_coupon)
             instance.save()
 
         instance.address = get_object_or_404(
@@ -214,48 +457,65 @@ class OrderService:
     @classmethod
     @transaction.atomic
     def destroy_order(cls, instance: Order):
-        orderitems = instance.order_items.select_related(
-            "product", "product__inventory"
-        ).all()
-        for orderitem in orderitems:
-            product_inventory = orderitem.product.inventory
-            product_inventory.quantity += orderitem.quantity
-            product_inventory.save()
-        instance.delete()
+        """
+        Deletes an unpaid order and releases its stock and coupon. The order
+        is locked and checked again, since the reaper or another request may
+        have cancelled, paid or deleted it in the meantime. Nothing is
+        released twice: such orders raise ValidationError (or Http404).
+        """
+        order = get_object_or_404(Order.objects.select_for_update(), id=instance.id)
+        if order.payment_accepted or order.order_accepted:
+            raise ValidationError({"order_accepted": "Order already accepted and paid"})
+        if order.cancelled:
+            raise ValidationError({"cancelled": "Order was cancelled"})
+        InventoryService.release(quantities=cls._get_inventory_quantities(order))
+        CouponService.release_coupons(Order.objects.filter(id=order.id))
+        order.delete()
         return
 
     @classmethod
     def _update_product_inventory(cls, order_instance: Order):
-        order_items = order_instance.order_items.select_related(
-            "product", "product__inventory"
-        ).all()
-        for orderitem in order_items:
-            product_inventory = orderitem.product.inventory
-            product_inventory.sold += orderitem.quantity
-            product_inventory.save()
+        rows = list(
+            order_instance.order_items.values("product_id", "product__inventory_id")
+            .annotate(quantity=Sum("quantity"))
+            .order_by()
+        )
+        InventoryService.record_sale(
+            quantities={row["product__inventory_id"]: row["quantity"] for row in rows}
+        )
+        ProductRankingService.record_sales(
+            quantities={row["product_id"]: row["quantity"] for row in rows}
+        )
         return
 
     @classmethod
     def _send_email_after_payment(cls, order_id: int, email: str):
-        send_mail(
+        EmailOutboxService.enqueue(
             "Order #{} payment confirmation".format(order_id),
             """
             Thank you for purchasing in our store.
             We received your payment. Your products will be sent soon
             """,
-            "ecommapi@ecommapi.com",
             ["{}".format(email)],
-            fail_silently=False,
+            from_email="ecommapi@ecommapi.com",
         )
 
+    @classmethod
+    def _get_charge_id(cls, payment_intent) -> str:
+        if latest_charge := payment_intent.get("latest_charge"):
+            return latest_charge
+        return payment_intent["charges"]["data"][0]["id"]
+
     @classmethod
     @transaction.atomic
-    def fullfill_order(cls, session, payment_intent):
-        stripe_charge_id = payment_intent["charges"]["data"][0]["id"]
+    def fullfill_order(cls, payment_intent, session=None):
+        stripe_charge_id = cls._get_charge_id(payment_intent)
         amount = payment_intent["amount"] / 100
-        order_id = session["metadata"]["order_id"]
-        order = get_object_or_404(Order, id=order_id)
-        order.order_accepted = True
+        order_id = (session or payment_intent)["metadata"]["order_id"]
+        order = get_object_or_404(Order.objects.select_for_update(), id=order_id)
+        if order.payment_accepted:
+            return order
+        order.order_accepted = not order.cancelled
         order.payment_accepted = True
         order.save()
         payment_details = PaymentDetails.objects.create(
@@ -263,7 +523,174 @@ class OrderService:
         )
         order.payment = payment_details
         order.save()
+        if order.cancelled:
+            # its items are back in the inventory, the payment is refunded
+            logger.warning(
+                "payment for cancelled order",
+                extra={"order_id": str(order.id), "charge_id": stripe_charge_id},
+            )
+            return order
 
         cls._update_product_inventory(order)
         cls._send_email_after_payment(order_id=order_id, email=order.user.email)
-        return
+        return order
+
+
+class OrderReaperService:
+    """
+    Service for reclaiming what abandoned checkouts hold. Orders left unpaid
+    for longer than ORDER_PAYMENT_TTL are cancelled: their items go back to
+    the inventory, their coupon redemptions are reverted and the order is
+    marked as cancelled, so a payment arriving late can still be matched to
+    it. Orders with a Stripe Checkout session are kept until
+    ORDER_PAYMENT_GRACE after it expires, and orders with Stripe events
+    not processed yet are kept until they are. Carts not changed for
+    CART_TTL are purged by the cart storage backend.
+
+    Work is done in bounded batches, each in its own transaction. Rows are
+    claimed with SELECT ... FOR UPDATE SKIP LOCKED, so several reapers can
+    run concurrently and an order being paid at the same moment (locked by
+    .fullfill_order()) is skipped instead of waited for.
+    """
+
+    @classmethod
+    @transaction.atomic
+    def cancel_stale_orders(cls, batch_size: int = 100) -> tuple[int, int]:
+        """
+        Cancels one batch of stale unpaid orders. Returns a tuple of the
+        number of cancelled orders and the number of released units.
+        """
+        now = timezone.now()
+        cutoff = now - timedelta(seconds=settings.ORDER_PAYMENT_TTL)
+        session_cutoff = now - timedelta(seconds=settings.ORDER_PAYMENT_GRACE)
+        # payment intent and checkout session events carry the order id in
+        # the metadata of their object
+        unprocessed_events = StripeEvent.objects.filter(
+            status__in=[StripeEvent.PENDING, StripeEvent.FAILED]
+        ).annotate(
+            order_id=KeyTextTransform("order_id", "payload__data__object__metadata")
+        )
+        order_ids = list(
+            Order.objects.select_for_update(skip_locked=True)
+            .filter(payment_accepted=False, cancelled=False, created__lt=cutoff)
+            # the order may still be paid through its checkout session
+            .exclude(stripe_session_expires__gt=session_cutoff)
+            # the order may already be paid, the worker has not seen it yet
+            .exclude(
+                Exists(
+                    unprocessed_events.filter(
+                        order_id=Cast(OuterRef("id"), output_field=CharField())
+                    )
+                )
+            )
+            .order_by("created")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not order_ids:
+            return 0, 0
+
+        rows = (
+            OrderItem.objects.filter(order_id__in=order_ids)
+            .values("product__inventory_id")
+            .annotate(quantity=Sum("quantity"))
+            .order_by()
+        )
+        quantities = {row["product__inventory_id"]: row["quantity"] for row in rows}
+        InventoryService.release(quantities=quantities)
+        CouponService.release_coupons(Order.objects.filter(id__in=order_ids))
+        Order.objects.filter(id__in=order_ids).update(cancelled=True, updated=now)
+        return len(order_ids), sum(quantities.values())
+
+    @classmethod
+    def purge_stale_carts(cls, batch_size: int = 100) -> int:
+        cutoff = timezone.now() - timedelta(seconds=settings.CART_TTL)
+        return CartService.get_storage().purge_stale(
+            cutoff=cutoff, batch_size=batch_size
+        )
+
+    @classmethod
+    def reap(cls, batch_size: int = 100) -> dict[str, int]:
+        """
+        Runs batches until nothing stale is left. Returns and logs the
+        number of cancelled orders, released units and purged carts.
+        """
+        results = {"cancelled_orders": 0, "released_units": 0, "purged_carts": 0}
+        while True:
+            orders, units = cls.cancel_stale_orders(batch_size=batch_size)
+            carts = cls.purge_stale_carts(batch_size=batch_size)
+            results["cancelled_orders"] += orders
+            results["released_units"] += units
+            results["purged_carts"] += carts
+            if orders < batch_size and carts < batch_size:
+                break
+        logger.info("orders reaped", extra=results)
+        return results
+
+
+class OrderExportService:
+    """
+    Service for the accounting export of orders. Every row is one order item
+    together with its order and payment, orders without items yield a single
+    row with empty item columns. Rows are flat dicts read with .values()
+    through a server-side cursor, so the export runs in constant memory.
+    """
+
+    columns = {
+        "order_id": "id",
+        "order_created": "created",
+        "username": "user__username",
+        "email": "user__email",
+        "order_accepted": "order_accepted",
+        "payment_accepted": "payment_accepted",
+        "cancelled": "cancelled",
+        "coupon_code": "coupon__code",
+        "coupon_amount": "coupon__amount",
+        "before_coupon_amount": "before_coupon_amount",
+        "total_amount": "total_amount",
+        "item_id": "order_items__id",
+        "product_id": "order_items__product_id",
+        "product_name": "order_items__product__name",
+        "quantity": "order_items__quantity",
+        "unit_price": "unit_price",
+        "line_total": "line_total",
+        "payment_id": "payment_id",
+        "stripe_charge_id": "payment__stripe_charge_id",
+        "payment_amount": "payment__amount",
+        "payment_created": "payment__created",
+    }
+    fieldnames = tuple(columns)
+
+    @classmethod
+    def _start_of_day(cls, day: date) -> datetime:
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    @classmethod
+    def iter_rows(
+        cls,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        chunk_size: int = 2000,
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Yields rows of orders created between date_from and date_to, both
+        inclusive, in the order they were created.
+        """
+        queryset = Order.objects.all()
+        if date_from:
+            queryset = queryset.filter(created__gte=cls._start_of_day(date_from))
+        if date_to:
+            queryset = queryset.filter(
+                created__lt=cls._start_of_day(date_to + timedelta(days=1))
+            )
+        queryset = (
+            queryset.annotate(
+                unit_price=Coalesce(
+                    "order_items__unit_price", unit_price("order_items__")
+                ),
+                line_total=order_line_total("order_items__"),
+            )
+            .order_by("created", "id", "order_items__created")
+            .values_list(*cls.columns.values())
+        )
+        for row in queryset.iterator(chunk_size=chunk_size):
+            yield dict(zip(cls.fieldnames, row))
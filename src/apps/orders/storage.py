@@ -0,0 +1,453 @@
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Callable, Iterable, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import Http404
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from src.apps.orders.models import Cart, CartItem
+from src.apps.products.models import Product
+
+User = get_user_model()
+
+
+class CartStorage:
+    """
+    Interface of the cart storage backends used by CartService.
+
+    Carts are returned as objects exposing `id` and `user_id`. Carts passed
+    through load_cart() also expose `user`, `cart_items` and `total`, which
+    is everything CartOutputSerializer and OrderService read. Quantities
+    are mappings of product id to the number of units, a quantity of 0
+    removes the product from the cart.
+    """
+
+    def create_cart(self, user: User) -> Any:
+        raise NotImplementedError
+
+    def list_carts(self, user: User) -> Iterable[Any]:
+        raise NotImplementedError
+
+    def get_cart(self, cart_id: Any, user: Optional[User] = None) -> Optional[Any]:
+        """
+        Returns None if the cart does not exist or, when a user is given,
+        does not belong to them. Superusers can get any cart.
+        """
+        raise NotImplementedError
+
+    def load_cart(self, cart: Any) -> Any:
+        raise NotImplementedError
+
+    def delete_cart(self, cart: Any) -> None:
+        raise NotImplementedError
+
+    def get_items(self, cart: Any) -> list[CartItem]:
+        """
+        Returns the items of the cart with their products loaded.
+        """
+        raise NotImplementedError
+
+    def get_item(self, cart: Any, item_id: Any) -> Optional[CartItem]:
+        raise NotImplementedError
+
+    def update_quantities(
+        self,
+        cart: Any,
+        product_ids: Iterable[Any],
+        update: Callable[[dict[Any, int]], dict[Any, int]],
+    ) -> dict[Any, CartItem]:
+        """
+        Reads the quantities of the given products in the cart, passes them
+        to `update` and writes the quantities it returns. Errors raised by
+        `update` leave the cart unchanged. Returns the items left in the
+        cart for the written products.
+        """
+        raise NotImplementedError
+
+    def purge_stale(self, cutoff: datetime, batch_size: int) -> int:
+        """
+        Deletes up to `batch_size` carts not changed since `cutoff`. Returns
+        the number of deleted carts.
+        """
+        raise NotImplementedError
+
+
+class DatabaseCartStorage(CartStorage):
+    """
+    Keeps carts as Cart and CartItem rows.
+    """
+
+    def _loaded(self, queryset):
+        return (
+            queryset.with_totals()
+            .select_related("user")
+            .prefetch_related(
+                Prefetch(
+                    "cart_items",
+                    queryset=CartItem.objects.select_related("product").order_by(
+                        "created", "id"
+                    ),
+                )
+            )
+        )
+
+    def create_cart(self, user: User) -> Cart:
+        return Cart.objects.create(user=user)
+
+    def list_carts(self, user: User):
+        queryset = Cart.objects.order_by("-created", "-id")
+        if not user.is_superuser:
+            queryset = queryset.filter(user=user)
+        return self._loaded(queryset)
+
+    def get_cart(self, cart_id: Any, user: Optional[User] = None) -> Optional[Cart]:
+        queryset = Cart.objects.filter(id=cart_id)
+        if user is not None and not user.is_superuser:
+            queryset = queryset.filter(user=user)
+        return queryset.first()
+
+    def load_cart(self, cart: Cart) -> Cart:
+        return self._loaded(Cart.objects.filter(id=cart.id)).get()
+
+    def delete_cart(self, cart: Cart) -> None:
+        cart.delete()
+
+    def get_items(self, cart: Cart) -> list[CartItem]:
+        return list(
+            CartItem.objects.filter(cart_id=cart.id)
+            .select_related("product")
+            .order_by("created", "id")
+        )
+
+    def get_item(self, cart: Cart, item_id: Any) -> Optional[CartItem]:
+        return (
+            CartItem.objects.filter(id=item_id, cart_id=cart.id)
+            .select_related("product")
+            .first()
+        )
+
+    @transaction.atomic
+    def update_quantities(
+        self,
+        cart: Cart,
+        product_ids: Iterable[Any],
+        update: Callable[[dict[Any, int]], dict[Any, int]],
+    ) -> dict[Any, CartItem]:
+        # serializes concurrent changes of the same cart
+        Cart.objects.select_for_update().filter(id=cart.id).exists()
+        existing = {
+            item.product_id: item
+            for item in CartItem.objects.filter(
+                cart_id=cart.id, product_id__in=list(product_ids)
+            )
+        }
+        quantities = update(
+            {product_id: item.quantity for product_id, item in existing.items()}
+        )
+
+        items, to_create, to_update, to_delete = {}, [], [], []
+        for product_id, quantity in quantities.items():
+            item = existing.get(product_id)
+            if item is None:
+                if quantity:
+                    item = CartItem(
+                        cart_id=cart.id, product_id=product_id, quantity=quantity
+                    )
+                    to_create.append(item)
+            elif not quantity:
+                to_delete.append(item.id)
+            elif quantity != item.quantity:
+                item.quantity = quantity
+                # bulk_update() does not apply auto_now
+                item.updated = timezone.now()
+                to_update.append(item)
+            if quantity:
+                items[product_id] = item
+
+        if to_delete:
+            CartItem.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            CartItem.objects.bulk_update(to_update, ["quantity", "updated"])
+        if to_create:
+            CartItem.objects.bulk_create(to_create)
+        return items
+
+    @transaction.atomic
+    def purge_stale(self, cutoff: datetime, batch_size: int) -> int:
+        # adding or changing items does not touch Cart.updated, so carts
+        # with recently changed items are kept. Carts locked by a
+        # concurrent checkout are skipped and picked up by a later run.
+        cart_ids = list(
+            Cart.objects.select_for_update(skip_locked=True)
+            .filter(updated__lt=cutoff)
+            .exclude(cart_items__updated__gte=cutoff)
+            .order_by("updated")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not cart_ids:
+            return 0
+        CartItem.objects.filter(cart_id__in=cart_ids).delete()
+        Cart.objects.filter(id__in=cart_ids).delete()
+        return len(cart_ids)
+
+
+class CachedCart:
+    """
+    Cart kept by CacheCartStorage. Never saved to the database, it only
+    mirrors the attributes of Cart read by the serializers and services.
+    """
+
+    def __init__(
+        self,
+        id: uuid.UUID,
+        user_id: Any,
+        quantities: dict[str, int],
+        created: Optional[str] = None,
+    ):
+        self.id = id
+        self.user_id = user_id
+        self.quantities = quantities
+        self.created = created or timezone.now().isoformat()
+        self.user = None
+        self.cart_items = []
+
+    @property
+    def total(self) -> Decimal:
+        return sum((item.final_price for item in self.cart_items), Decimal("0.00"))
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "user_id": self.user_id,
+            "quantities": self.quantities,
+            "created": self.created,
+        }
+
+
+class CacheCartStorage(CartStorage):
+    """
+    Keeps carts in the `CART_CACHE_ALIAS` cache, as a mapping of product id
+    to quantity under one key per cart, plus a per-user index of cart ids.
+    Every write renews the `CART_TTL` timeout, so idle carts expire on their
+    own and abandoned carts never reach the database. The contents of a
+    cart are only written to the database as the items of the order placed
+    from it.
+
+    Item ids are derived from the cart id and the product id, so they stay
+    stable while the product is in the cart. Every read-modify-write of a
+    cart or of a user's index runs under a lock taken with cache.add(), so
+    concurrent changes are serialized across the workers sharing the cache.
+    """
+
+    key_prefix = "cart"
+
+    def get_cache(self):
+        return caches[settings.CART_CACHE_ALIAS]
+
+    def _cart_key(self, cart_id: Any) -> str:
+        return f"{self.key_prefix}:{cart_id}"
+
+    def _user_key(self, user_id: Any) -> str:
+        return f"{self.key_prefix}:user:{user_id}"
+
+    @contextmanager
+    def _lock(self, key: str):
+        """
+        Holds `key` locked for the block. The lock expires after
+        CART_LOCK_TIMEOUT seconds, so a worker dying while holding it does
+        not block the key for longer.
+        """
+        cache = self.get_cache()
+        lock_key, token = f"{key}:lock", uuid.uuid4().hex
+        while not cache.add(lock_key, token, timeout=settings.CART_LOCK_TIMEOUT):
+            time.sleep(0.005)
+        try:
+            yield
+        finally:
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+
+    def _item_id(self, cart: CachedCart, product_id: Any) -> uuid.UUID:
+        return uuid.uuid5(cart.id, str(product_id))
+
+    def _save(self, cart: CachedCart) -> None:
+        cache = self.get_cache()
+        cache.set(self._cart_key(cart.id), cart.to_dict(), timeout=settings.CART_TTL)
+        cache.touch(self._user_key(cart.user_id), timeout=settings.CART_TTL)
+
+    def _set_user_carts(self, user_id: Any, cart_ids: list[str]) -> None:
+        cache = self.get_cache()
+        if cart_ids:
+            cache.set(self._user_key(user_id), cart_ids, timeout=settings.CART_TTL)
+        else:
+            cache.delete(self._user_key(user_id))
+
+    def _build_item(
+        self, cart: CachedCart, product: Product, quantity: int
+    ) -> CartItem:
+        return CartItem(
+            id=self._item_id(cart, product.id),
+            cart_id=cart.id,
+            product=product,
+            quantity=quantity,
+        )
+
+    def _build_items(
+        self, cart: CachedCart, products: dict[Any, Product]
+    ) -> list[CartItem]:
+        # products deleted from the catalog drop out of the cart
+        return [
+            self._build_item(cart, products[uuid.UUID(product_id)], quantity)
+            for product_id, quantity in cart.quantities.items()
+            if uuid.UUID(product_id) in products
+        ]
+
+    def create_cart(self, user: User) -> CachedCart:
+        cart = CachedCart(id=uuid.uuid4(), user_id=user.id, quantities={})
+        cart.user = user
+        self._save(cart)
+        with self._lock(self._user_key(user.id)):
+            cart_ids = self.get_cache().get(self._user_key(user.id), [])
+            self._set_user_carts(user.id, cart_ids + [str(cart.id)])
+        return cart
+
+    def list_carts(self, user: User) -> list[CachedCart]:
+        """
+        Returns the carts of the user, newest first. Cached carts cannot be
+        enumerated, so superusers also only get their own carts.
+        """
+        cache = self.get_cache()
+        cart_ids = cache.get(self._user_key(user.id), [])
+        stored = cache.get_many([self._cart_key(cart_id) for cart_id in cart_ids])
+        carts = [
+            CachedCart(id=uuid.UUID(cart_id), **stored[self._cart_key(cart_id)])
+            for cart_id in cart_ids
+            if self._cart_key(cart_id) in stored
+        ]
+        if len(carts) != len(cart_ids):
+            expired = {
+                cart_id for cart_id in cart_ids if self._cart_key(cart_id) not in stored
+            }
+            with self._lock(self._user_key(user.id)):
+                # re-read, carts may have been added meanwhile
+                cart_ids = cache.get(self._user_key(user.id), [])
+                self._set_user_carts(
+                    user.id, [cart_id for cart_id in cart_ids if cart_id not in expired]
+                )
+
+        products = Product.objects.in_bulk(
+            {product_id for cart in carts for product_id in cart.quantities}
+        )
+        for cart in carts:
+            cart.user = user
+            cart.cart_items = self._build_items(cart, products)
+        return carts[::-1]
+
+    def get_cart(
+        self, cart_id: Any, user: Optional[User] = None
+    ) -> Optional[CachedCart]:
+        try:
+            cart_id = uuid.UUID(str(cart_id))
+        except ValueError:
+            return None
+        stored = self.get_cache().get(self._cart_key(cart_id))
+        if stored is None:
+            return None
+        cart = CachedCart(id=cart_id, **stored)
+        if user is not None:
+            if cart.user_id == user.id:
+                cart.user = user
+            elif not user.is_superuser:
+                return None
+        return cart
+
+    def load_cart(self, cart: CachedCart) -> CachedCart:
+        if cart.user is None:
+            cart.user = User.objects.get(id=cart.user_id)
+        cart.cart_items = self._build_items(
+            cart, Product.objects.in_bulk(list(cart.quantities))
+        )
+        return cart
+
+    def delete_cart(self, cart: CachedCart) -> None:
+        def delete():
+            cache = self.get_cache()
+            cache.delete(self._cart_key(cart.id))
+            with self._lock(self._user_key(cart.user_id)):
+                cart_ids = cache.get(self._user_key(cart.user_id), [])
+                self._set_user_carts(
+                    cart.user_id,
+                    [cart_id for cart_id in cart_ids if cart_id != str(cart.id)],
+                )
+
+        # an order placed from the cart may still be rolled back
+        transaction.on_commit(delete)
+
+    def get_items(self, cart: CachedCart) -> list[CartItem]:
+        return self.load_cart(cart).cart_items
+
+    def get_item(self, cart: CachedCart, item_id: Any) -> Optional[CartItem]:
+        for product_id, quantity in cart.quantities.items():
+            if str(self._item_id(cart, product_id)) == str(item_id):
+                product = Product.objects.filter(id=product_id).first()
+                return product and self._build_item(cart, product, quantity)
+        return None
+
+    def update_quantities(
+        self,
+        cart: CachedCart,
+        product_ids: Iterable[Any],
+        update: Callable[[dict[Any, int]], dict[Any, int]],
+    ) -> dict[Any, CartItem]:
+        with self._lock(self._cart_key(cart.id)):
+            return self._update_quantities(cart.id, product_ids, update)
+
+    def _update_quantities(
+        self,
+        cart_id: uuid.UUID,
+        product_ids: Iterable[Any],
+        update: Callable[[dict[Any, int]], dict[Any, int]],
+    ) -> dict[Any, CartItem]:
+        # re-read, the cart may have changed since it was fetched
+        cart = self.get_cart(cart_id)
+        if cart is None:
+            raise Http404
+        product_ids = {uuid.UUID(str(product_id)) for product_id in product_ids}
+        quantities = update(
+            {
+                uuid.UUID(product_id): quantity
+                for product_id, quantity in cart.quantities.items()
+                if uuid.UUID(product_id) in product_ids
+            }
+        )
+
+        items = {}
+        for product_id, quantity in quantities.items():
+            if quantity:
+                cart.quantities[str(product_id)] = quantity
+                items[product_id] = CartItem(
+                    id=self._item_id(cart, product_id),
+                    cart_id=cart.id,
+                    product_id=product_id,
+                    quantity=quantity,
+                )
+            else:
+                cart.quantities.pop(str(product_id), None)
+        self._save(cart)
+        return items
+
+    def purge_stale(self, cutoff: datetime, batch_size: int) -> int:
+        # cached carts expire on their own after CART_TTL
+        return 0
+
+
+def get_cart_storage() -> CartStorage:
+    return import_string(settings.CART_STORAGE_BACKEND)()
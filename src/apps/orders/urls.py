@@ -1,5 +1,6 @@
 from django.urls import path
 from src.apps.orders.views import (
+    CartItemsBatchAPIView,
     CartItemsDetailAPIView,
     CartItemsListCreateAPIView,
     CartListCreateAPIView,
@@ -8,6 +9,7 @@ from src.apps.orders.views import (
     CouponDetailAPIView,
     OrderCreateAPIView,
     OrderDetailAPIView,
+    OrderExportAPIView,
     OrderListAPIView,
 )
 from src.apps.payments.views import (
@@ -27,6 +29,11 @@ urlpatterns = [
         CartItemsListCreateAPIView.as_view(),
         name="cart-item-list",
     ),
+    path(
+        "carts/<uuid:pk>/items/batch/",
+        CartItemsBatchAPIView.as_view(),
+        name="cart-item-batch",
+    ),
     path(
         "carts/<uuid:pk>/items/<uuid:cart_item_pk>/",
         CartItemsDetailAPIView.as_view(),
@@ -34,6 +41,7 @@ urlpatterns = [
     ),
     path("carts/<uuid:pk>/order/", OrderCreateAPIView.as_view(), name="create-order"),
     path("orders/", OrderListAPIView.as_view(), name="order-list"),
+    path("orders/export/", OrderExportAPIView.as_view(), name="order-export"),
     path("orders/<uuid:pk>/", OrderDetailAPIView.as_view(), name="order-detail"),
     path("orders/<uuid:pk>/session/", StripeSessionView.as_view(), name="stripe-setup"),
     path("orders/stripe/", StripeConfigView.as_view(), name="stripe-detail"),
@@ -20,3 +20,14 @@ def validate_coupon(amount: int, min_total: int):
                 "min_order_total": "Minimal order total must be bigger than the coupon amount"
             }
         )
+
+
+def validate_coupon_usage(used: bool, per_user: bool = False):
+    if not used:
+        raise ValidationError(
+            {
+                "coupon": "You have reached the usage limit of this coupon."
+                if per_user
+                else "This coupon has reached its usage limit."
+            }
+        )
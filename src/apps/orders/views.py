@@ -1,26 +1,57 @@
-from django.shortcuts import get_object_or_404
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
 
-from rest_framework import generics, status
+from rest_framework import generics, permissions, status, views
 from rest_framework.response import Response
 from drf_yasg.utils import swagger_auto_schema
 
 from src.apps.orders.models import (
     Order,
-    Cart,
-    CartItem,
     Coupon,
+    OrderItem,
 )
 from src.apps.orders.serializers import (
+    CartItemBatchInputSerializer,
     CartItemInputSerializer,
     CartItemOutputSerializer,
     CartItemQuantityInputSerializer,
     CartOutputSerializer,
     CouponInputSerializer,
     CouponOutputSerializers,
+    OrderExportInputSerializer,
     OrderInputSerializer,
     OrderOutputSerializer,
 )
-from src.apps.orders.services import CartService, CouponService, OrderService
+from src.apps.orders.services import (
+    CartService,
+    CouponService,
+    OrderExportService,
+    OrderService,
+)
+from src.core.mixins import QuerySetOptimizationMixin, ValuesSerializationMixin
+from src.core.pagination import CursorOrLimitOffsetPagination
+from src.core.streaming import CONTENT_TYPES, write_rows
+
+
+class OrderQuerySetOptimizationMixin(QuerySetOptimizationMixin):
+    """
+    Prefetch plan covering every relation nested in OrderOutputSerializer.
+    """
+
+    select_related_fields = (
+        "user__userprofile",
+        "coupon",
+        "address",
+        "payment__user__userprofile",
+    )
+    prefetch_related_fields = (
+        Prefetch(
+            "order_items",
+            queryset=OrderItem.objects.select_related("product").order_by(
+                "created", "id"
+            ),
+        ),
+    )
 
 
 class CouponListCreateAPIView(generics.ListAPIView):
@@ -69,21 +100,20 @@ class CouponDetailAPIView(generics.RetrieveDestroyAPIView):
             status=status.HTTP_200_OK,
         )
 
+    def perform_destroy(self, instance):
+        self.service_class.delete_coupon(instance)
+
 
-class CartListCreateAPIView(generics.ListCreateAPIView):
-    queryset = Cart.objects.all()
+class CartListCreateAPIView(ValuesSerializationMixin, generics.ListCreateAPIView):
     serializer_class = CartOutputSerializer
+    service_class = CartService
 
     def get_queryset(self):
-        qs = self.queryset
-        user = self.request.user
-        if user.is_superuser:
-            return qs
-        return qs.filter(user=user)
+        return self.service_class.list_carts(self.request.user)
 
     def create(self, request, *args, **kwargs):
         user = request.user
-        cart = Cart.objects.create(user=user)
+        cart = self.service_class.create_cart(user)
         return Response(
             self.get_serializer(cart).data,
             status=status.HTTP_201_CREATED,
@@ -91,37 +121,36 @@ class CartListCreateAPIView(generics.ListCreateAPIView):
 
 
 class CartDetailAPIView(generics.RetrieveDestroyAPIView):
-    queryset = Cart.objects.all()
     serializer_class = CartOutputSerializer
+    service_class = CartService
 
-    def get_queryset(self):
-        qs = self.queryset
-        user = self.request.user
-        if user.is_superuser:
-            return qs
-        return qs.filter(user=user)
+    def get_object(self):
+        cart = self.service_class.get_cart(
+            self.kwargs.get("pk"), user=self.request.user
+        )
+        self.check_object_permissions(self.request, cart)
+        return self.service_class.load_cart(cart)
+
+    def perform_destroy(self, instance):
+        self.service_class.delete_cart(instance)
 
 
 class CartItemsListCreateAPIView(generics.ListAPIView):
-    queryset = CartItem.objects.all()
     serializer_class = CartItemOutputSerializer
     service_class = CartService
 
     def get_queryset(self):
-        cart_pk = self.kwargs.get("pk")
-        qs = self.queryset
-        user = self.request.user
-        if user.is_superuser:
-            return qs
-        return qs.filter(cart_id=cart_pk, cart__user=user)
+        return self.service_class.list_cart_items(
+            self.kwargs.get("pk"), user=self.request.user
+        )
 
     @swagger_auto_schema(request_body=CartItemInputSerializer)
     def post(self, request, *args, **kwargs):
-        cart_id = self.kwargs.get("pk")
+        cart = self.service_class.get_cart(self.kwargs.get("pk"), user=request.user)
         serializer = CartItemInputSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         cartitem = self.service_class.create_cart_item(
-            cart_id=cart_id, data=serializer.validated_data
+            cart_id=cart.id, data=serializer.validated_data
         )
         return Response(
             self.get_serializer(cartitem).data,
@@ -129,16 +158,42 @@ class CartItemsListCreateAPIView(generics.ListAPIView):
         )
 
 
+class CartItemsBatchAPIView(generics.GenericAPIView):
+    """
+    Applies a list of add/set/remove operations to the cart in one request
+    and returns the updated cart.
+    """
+
+    serializer_class = CartOutputSerializer
+    service_class = CartService
+
+    @swagger_auto_schema(
+        request_body=CartItemBatchInputSerializer,
+        responses={200: CartOutputSerializer},
+    )
+    def post(self, request, *args, **kwargs):
+        cart = self.service_class.get_cart(self.kwargs.get("pk"), user=request.user)
+        serializer = CartItemBatchInputSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        updated_cart = self.service_class.update_cart_items(
+            cart=cart, data=serializer.validated_data
+        )
+        return Response(
+            self.get_serializer(updated_cart).data,
+            status=status.HTTP_200_OK,
+        )
+
+
 class CartItemsDetailAPIView(generics.RetrieveDestroyAPIView):
-    queryset = CartItem.objects.all()
     serializer_class = CartItemOutputSerializer
     service_class = CartService
 
     def get_object(self):
-        id = self.kwargs.get("cart_item_pk")
-        cart_id = self.kwargs.get("pk")
-        user = self.request.user
-        obj = get_object_or_404(CartItem, id=id, cart_id=cart_id, cart__user=user)
+        obj = self.service_class.get_cart_item(
+            self.kwargs.get("pk"),
+            self.kwargs.get("cart_item_pk"),
+            user=self.request.user,
+        )
         self.check_object_permissions(self.request, obj)
         return obj
 
@@ -148,13 +203,16 @@ class CartItemsDetailAPIView(generics.RetrieveDestroyAPIView):
         serializer = CartItemQuantityInputSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         cartitem = self.service_class.update_cart_item(
-            istance=instance, data=serializer.validated_data
+            instance=instance, data=serializer.validated_data
         )
         return Response(
             self.get_serializer(cartitem).data,
             status=status.HTTP_200_OK,
         )
 
+    def perform_destroy(self, instance):
+        self.service_class.delete_cart_item(instance)
+
 
 class OrderCreateAPIView(generics.GenericAPIView):
     queryset = Order.objects.all()
@@ -177,25 +235,60 @@ class OrderCreateAPIView(generics.GenericAPIView):
         )
 
 
-class OrderListAPIView(generics.ListAPIView):
+class OrderListAPIView(
+    ValuesSerializationMixin, OrderQuerySetOptimizationMixin, generics.ListAPIView
+):
     queryset = Order.objects.all()
     serializer_class = OrderOutputSerializer
+    pagination_class = CursorOrLimitOffsetPagination
+    values_extra_fields = ("created",)
 
     def get_queryset(self):
-        qs = self.queryset
+        qs = super().get_queryset()
         user = self.request.user
         if user.is_superuser:
             return qs
         return qs.filter(user=user)
 
 
-class OrderDetailAPIView(generics.RetrieveDestroyAPIView):
+class OrderExportAPIView(views.APIView):
+    """
+    Streams orders created in a date range as flat CSV or JSON lines rows,
+    one per order item, for accounting.
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+    service_class = OrderExportService
+
+    @swagger_auto_schema(query_serializer=OrderExportInputSerializer)
+    def get(self, request, *args, **kwargs):
+        serializer = OrderExportInputSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        file_format = serializer.validated_data["file_format"]
+        response = StreamingHttpResponse(
+            write_rows(
+                self.service_class.iter_rows(
+                    date_from=serializer.validated_data.get("date_from"),
+                    date_to=serializer.validated_data.get("date_to"),
+                ),
+                file_format,
+                fieldnames=self.service_class.fieldnames,
+            ),
+            content_type=CONTENT_TYPES[file_format],
+        )
+        response["Content-Disposition"] = f'attachment; filename="orders.{file_format}"'
+        return response
+
+
+class OrderDetailAPIView(
+    OrderQuerySetOptimizationMixin, generics.RetrieveDestroyAPIView
+):
     queryset = Order.objects.all()
     serializer_class = OrderOutputSerializer
     service_class = OrderService
 
     def get_queryset(self):
-        qs = self.queryset
+        qs = super().get_queryset()
         user = self.request.user
         if user.is_superuser:
             return qs
@@ -209,6 +302,11 @@ class OrderDetailAPIView(generics.RetrieveDestroyAPIView):
                 {"order_accepted": "Order already accepted and paid"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        if instance.cancelled:
+            return Response(
+                {"cancelled": "Order was cancelled"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         serializer = OrderInputSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         updated_product = self.service_class.update_order(
@@ -221,10 +319,6 @@ class OrderDetailAPIView(generics.RetrieveDestroyAPIView):
 
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
-        if instance.order_accepted:
-            return Response(
-                {"order_accepted": "Order already accepted and paid"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+        # paid and cancelled orders are refused under the lock of the order
         self.service_class.destroy_order(instance)
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from src.apps.payments.models import PaymentDetails
+from src.apps.payments.models import PaymentDetails, StripeEvent
 
 # Register your models here.
 admin.site.register(PaymentDetails)
+admin.site.register(StripeEvent)
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class PaymentsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "src.apps.payments"
+
+    def ready(self):
+        from src.apps.payments import stripe_client
+
+        stripe_client.configure()
@@ -0,0 +1,74 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from statistics import quantiles
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from src.apps.payments import stripe_client
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates checkout sessions concurrently through the pooled Stripe "
+        "client and circuit breaker, and reports latencies and outcomes. "
+        "Meant to run against `manage.py run_fake_stripe`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=8)
+
+    def _create_session(self, index: int) -> tuple[str, float]:
+        start = time.perf_counter()
+        try:
+            stripe_client.create_checkout_session(
+                success_url=settings.PAYMENT_SUCCESS_URL,
+                cancel_url=settings.PAYMENT_CANCEL_URL,
+                payment_method_types=["card"],
+                mode="payment",
+                line_items=[
+                    {
+                        "price_data": {
+                            "currency": "usd",
+                            "product_data": {"name": f"Benchmark #{index}"},
+                            "unit_amount": 1000,
+                        },
+                        "quantity": 1,
+                    }
+                ],
+            )
+            outcome = "created"
+        except stripe_client.StripeUnavailable:
+            outcome = "rejected" if stripe_client.breaker.state == "open" else "failed"
+        return outcome, time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Stripe API base: {settings.STRIPE_API_BASE}")
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            results = list(
+                executor.map(self._create_session, range(options["requests"]))
+            )
+        elapsed = time.perf_counter() - start
+
+        for outcome in ("created", "failed", "rejected"):
+            latencies = sorted(
+                duration for result, duration in results if result == outcome
+            )
+            if not latencies:
+                continue
+            if len(latencies) > 1:
+                cuts = quantiles(latencies, n=100, method="inclusive")
+                p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+            else:
+                p50 = p95 = p99 = latencies[0]
+            self.stdout.write(
+                f"{outcome}: {len(latencies)} p50={p50 * 1000:.1f}ms "
+                f"p95={p95 * 1000:.1f}ms p99={p99 * 1000:.1f}ms"
+            )
+        self.stdout.write(
+            f"{len(results)} requests in {elapsed:.2f}s "
+            f"({len(results) / elapsed:.1f} req/s), "
+            f"circuit {stripe_client.breaker.state}."
+        )
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from src.apps.payments.models import StripeEvent
+from src.apps.payments.services import StripeEventService
+
+
+class Command(BaseCommand):
+    help = "Applies Stripe webhook events stored by StripeWebhookView."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling for new events instead of exiting once none are left.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to sleep between polls in --loop mode.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            results = StripeEventService.process_pending(
+                batch_size=options["batch_size"]
+            )
+            if any(results.values()):
+                self.stdout.write(
+                    ", ".join(f"{status}: {count}" for status, count in results.items())
+                )
+            claimed = sum(results.values())
+            # a batch in which every event failed waits like an empty one
+            if (
+                claimed < options["batch_size"]
+                or claimed == results[StripeEvent.PENDING]
+            ):
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS("No pending Stripe events left."))
@@ -0,0 +1,119 @@
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from django.core.management.base import BaseCommand
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    """
+    Answers POST /v1/checkout/sessions like the Stripe API, after the
+    configured latency, and fails the configured share of requests with a
+    500 error or by never answering within the client read timeout.
+    Responses are replayed for repeated idempotency keys.
+    """
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, data: dict) -> None:
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path != "/v1/checkout/sessions":
+            return self._send(404, {"error": {"type": "invalid_request_error"}})
+
+        server = self.server
+        time.sleep(max(0.0, random.gauss(server.latency, server.jitter)))
+        roll = random.random()
+        if roll < server.hang_rate:
+            time.sleep(server.hang)
+        elif roll < server.hang_rate + server.failure_rate:
+            return self._send(
+                500, {"error": {"type": "api_error", "message": "Injected failure"}}
+            )
+
+        key = self.headers.get("Idempotency-Key")
+        with server.lock:
+            if key in server.sessions:
+                return self._send(200, server.sessions[key])
+            params = parse_qs(body.decode("utf-8"))
+            session_id = f"cs_test_{uuid.uuid4().hex}"
+            session = {
+                "id": session_id,
+                "object": "checkout.session",
+                "url": f"http://{self.headers.get('Host')}/pay/{session_id}",
+                "expires_at": int(
+                    params.get("expires_at", [time.time() + 24 * 60 * 60])[0]
+                ),
+                "payment_status": "unpaid",
+            }
+            if key:
+                server.sessions[key] = session
+        self._send(200, session)
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs a local fake of the Stripe Checkout API with latency and failure "
+        "injection. Point STRIPE_API_BASE at it, e.g. http://127.0.0.1:12111."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=12111)
+        parser.add_argument(
+            "--latency", type=float, default=0.3, help="Mean latency in seconds."
+        )
+        parser.add_argument(
+            "--jitter", type=float, default=0.1, help="Latency std deviation."
+        )
+        parser.add_argument(
+            "--failure-rate",
+            type=float,
+            default=0.0,
+            help="Share of requests answered with a 500 error.",
+        )
+        parser.add_argument(
+            "--hang-rate",
+            type=float,
+            default=0.0,
+            help="Share of requests answered only after --hang seconds.",
+        )
+        parser.add_argument("--hang", type=float, default=60.0)
+        parser.add_argument("--verbose", action="store_true")
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer(
+            (options["host"], options["port"]), FakeStripeHandler
+        )
+        server.daemon_threads = True
+        server.lock = threading.Lock()
+        server.sessions = {}
+        for option in ("latency", "jitter", "failure_rate", "hang_rate", "hang"):
+            setattr(server, option, options[option])
+        server.verbose = options["verbose"]
+
+        self.stdout.write(
+            f"Fake Stripe listening on http://{options['host']}:{options['port']}"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
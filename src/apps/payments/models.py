@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 import uuid
 
 
@@ -18,3 +19,51 @@ class PaymentDetails(models.Model):
     class Meta:
         verbose_name = "Payment Details"
         verbose_name_plural = "Payment Details"
+
+
+class StripeEvent(models.Model):
+    """
+    Stripe webhook event stored on receipt and applied later by the
+    `process_stripe_events` management command. The unique stripe_event_id
+    makes redelivered events no-ops.
+    """
+
+    PENDING = "pending"
+    PROCESSED = "processed"
+    IGNORED = "ignored"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (PROCESSED, "Processed"),
+        (IGNORED, "Ignored"),
+        (FAILED, "Failed"),
+    )
+
+    id = models.UUIDField(
+        primary_key=True, default=uuid.uuid4, editable=False, unique=True
+    )
+    stripe_event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    stripe_created = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # failed events are retried with exponential backoff
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    received = models.DateTimeField(auto_now_add=True)
+    processed = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Stripe Event"
+        verbose_name_plural = "Stripe Events"
+        indexes = [
+            models.Index(
+                fields=["stripe_created", "received"],
+                condition=models.Q(status="pending"),
+                name="stripe_event_pending_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.type} {self.stripe_event_id} ({self.status})"
@@ -0,0 +1,247 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from src.apps.orders.models import Order
+from src.apps.orders.services import OrderService
+from src.apps.payments import stripe_client
+from src.apps.payments.models import StripeEvent
+
+
+class StripeEventService:
+    """
+    Service for the Stripe webhook pipeline. .record_event() only persists a
+    verified event, so the webhook can acknowledge it immediately, and the
+    unique event id drops redeliveries of the same event. .process_pending()
+    claims a batch of due events in a short transaction and then applies
+    them in the order Stripe created them, each in its own transaction, using
+    the objects embedded in the events instead of fetching them again from
+    the Stripe API. What still has to be fetched is fetched before the
+    transaction of the event is opened, so no lock is held while waiting on
+    Stripe. Failed events are retried with exponential backoff until
+    STRIPE_EVENT_MAX_ATTEMPTS.
+    """
+
+    handlers = {
+        "payment_intent.succeeded": "_handle_payment_intent_succeeded",
+        "checkout.session.completed": "_handle_checkout_session_completed",
+    }
+    # called outside of any transaction, their result is passed to the handler
+    fetchers = {
+        "checkout.session.completed": "_fetch_checkout_session_payment_intent",
+    }
+    # added to the longest a batch may wait on Stripe to get its claim
+    claim_margin = timedelta(minutes=1)
+
+    @classmethod
+    def record_event(cls, event: dict[str, Any]) -> bool:
+        """
+        Returns False if an event with the same id was already recorded.
+        """
+        _, created = StripeEvent.objects.get_or_create(
+            stripe_event_id=event["id"],
+            defaults={
+                "type": event["type"],
+                "payload": event,
+                "stripe_created": datetime.fromtimestamp(
+                    event["created"], tz=dt_timezone.utc
+                ),
+            },
+        )
+        return created
+
+    @classmethod
+    def _handle_payment_intent_succeeded(cls, event: StripeEvent, fetched) -> bool:
+        payment_intent = event.payload["data"]["object"]
+        if not payment_intent.get("metadata", {}).get("order_id"):
+            return False
+        OrderService.fullfill_order(payment_intent=payment_intent)
+        return True
+
+    @classmethod
+    def _fetch_checkout_session_payment_intent(
+        cls, event: StripeEvent
+    ) -> Optional[dict[str, Any]]:
+        """
+        Returns the payment intent of a paid session whose order is not paid
+        yet. The session does not embed the charge, so it is fetched from
+        Stripe. Stripe sends payment_intent.succeeded first, so orders of
+        newer sessions are already paid and Stripe is not called.
+        """
+        session = event.payload["data"]["object"]
+        order_id = session.get("metadata", {}).get("order_id")
+        if not order_id or session.get("payment_status") != "paid":
+            return None
+        if Order.objects.filter(id=order_id, payment_accepted=True).exists():
+            return None
+        return stripe_client.retrieve_payment_intent(session["payment_intent"])
+
+    @classmethod
+    def _handle_checkout_session_completed(
+        cls, event: StripeEvent, payment_intent: Optional[dict[str, Any]]
+    ) -> bool:
+        """
+        Fallback for sessions created before the order id was put into the
+        payment intent metadata, whose payment_intent.succeeded events are
+        ignored. Can be removed once sessions older than the metadata have
+        expired.
+        """
+        if payment_intent is None:
+            return False
+        session = event.payload["data"]["object"]
+        OrderService.fullfill_order(payment_intent=payment_intent, session=session)
+        return True
+
+    @classmethod
+    def _retry_delay(cls, attempts: int) -> timedelta:
+        return timedelta(
+            seconds=settings.STRIPE_EVENT_RETRY_DELAY * 2 ** (attempts - 1)
+        )
+
+    @classmethod
+    @transaction.atomic
+    def _claim(cls, batch_size: int) -> list[StripeEvent]:
+        """
+        Postpones a batch of due pending events until the batch has surely
+        been processed, so other workers skip them meanwhile. Events of a
+        worker which died are due again once the claim expires.
+        """
+        now = timezone.now()
+        events = list(
+            StripeEvent.objects.select_for_update(skip_locked=True)
+            .filter(status=StripeEvent.PENDING, next_attempt_at__lte=now)
+            .order_by("stripe_created", "received")[:batch_size]
+        )
+        stripe_timeout = settings.STRIPE_CONNECT_TIMEOUT + settings.STRIPE_READ_TIMEOUT
+        claimed_until = (
+            now + timedelta(seconds=len(events) * stripe_timeout) + cls.claim_margin
+        )
+        for event in events:
+            event.next_attempt_at = claimed_until
+        StripeEvent.objects.bulk_update(events, ["next_attempt_at"])
+        return events
+
+    @classmethod
+    def _process_event(cls, event: StripeEvent) -> None:
+        """
+        Applies the event and saves its outcome in one transaction, holding
+        the lock of the event and of its order only for the database work.
+        Events another worker processed meanwhile are left as they are.
+        """
+        handler_name = cls.handlers.get(event.type)
+        fetcher_name = cls.fetchers.get(event.type)
+        event.attempts += 1
+        try:
+            fetched = fetcher_name and getattr(cls, fetcher_name)(event)
+            with transaction.atomic():
+                current = StripeEvent.objects.select_for_update().get(id=event.id)
+                if current.status != StripeEvent.PENDING:
+                    event.status = current.status
+                    return
+                handled = handler_name and getattr(cls, handler_name)(event, fetched)
+                event.status = StripeEvent.PROCESSED if handled else StripeEvent.IGNORED
+                event.processed = timezone.now()
+                event.save(update_fields=["status", "attempts", "processed"])
+        except Exception as err:
+            event.last_error = str(err)
+            if event.attempts >= settings.STRIPE_EVENT_MAX_ATTEMPTS:
+                event.status = StripeEvent.FAILED
+            else:
+                event.next_attempt_at = timezone.now() + cls._retry_delay(
+                    event.attempts
+                )
+            StripeEvent.objects.filter(id=event.id, status=StripeEvent.PENDING).update(
+                status=event.status,
+                attempts=event.attempts,
+                last_error=event.last_error,
+                next_attempt_at=event.next_attempt_at,
+            )
+
+    @classmethod
+    def process_pending(cls, batch_size: int = 100) -> dict[str, int]:
+        """
+        Processes one batch of due pending events. Returns the number of
+        events per resulting status, events to be retried are counted as
+        pending.
+        """
+        results = {status: 0 for status, _ in StripeEvent.STATUS_CHOICES}
+        for event in cls._claim(batch_size):
+            cls._process_event(event)
+            results[event.status] += 1
+        return results
+
+
+class StripeCheckoutService:
+    """
+    Service for the Stripe Checkout sessions of orders. The last session is
+    stored on the order and returned again while it stays payable for the
+    current order total, so repeated requests do not call Stripe.
+
+    New sessions are created through the pooled client and circuit breaker
+    of stripe_client, which raises StripeUnavailable instead of waiting on
+    a failing Stripe. Concurrent requests for the same order within the
+    same minute send identical parameters under the same idempotency key,
+    so Stripe returns them a single session.
+    """
+
+    # sessions closer than this to their expiry are not handed out again
+    expiry_margin = timedelta(minutes=5)
+
+    @classmethod
+    def _amount(cls, order: Order) -> int:
+        return int(order.total * 100)
+
+    @classmethod
+    def _is_reusable(cls, order: Order, amount: int) -> bool:
+        return bool(
+            order.stripe_session_id
+            and order.stripe_session_amount == amount
+            and order.stripe_session_expires
+            and order.stripe_session_expires > timezone.now() + cls.expiry_margin
+        )
+
+    @classmethod
+    def get_session(cls, order: Order) -> dict[str, str]:
+        amount = cls._amount(order)
+        if cls._is_reusable(order, amount):
+            return {
+                "sessionId": order.stripe_session_id,
+                "url": order.stripe_session_url,
+            }
+
+        minute = int(timezone.now().timestamp()) // 60
+        session = stripe_client.create_checkout_session(
+            success_url=settings.PAYMENT_SUCCESS_URL,
+            cancel_url=settings.PAYMENT_CANCEL_URL,
+            payment_method_types=["card"],
+            mode="payment",
+            line_items=[
+                {
+                    "price_data": {
+                        "currency": "usd",
+                        "product_data": {"name": f"Order #{order.id}"},
+                        "unit_amount": amount,
+                    },
+                    "quantity": 1,
+                }
+            ],
+            metadata={"order_id": str(order.id)},
+            payment_intent_data={"metadata": {"order_id": str(order.id)}},
+            expires_at=(minute + 1) * 60 + settings.STRIPE_CHECKOUT_SESSION_TTL,
+            idempotency_key=f"checkout-{order.id}-{amount}-{minute}",
+        )
+        # a session stored meanwhile by a concurrent request is kept
+        Order.objects.filter(
+            id=order.id, stripe_session_id=order.stripe_session_id
+        ).update(
+            stripe_session_id=session["id"],
+            stripe_session_url=session["url"],
+            stripe_session_amount=amount,
+            stripe_session_expires=datetime.fromtimestamp(
+                session["expires_at"], tz=dt_timezone.utc
+            ),
+        )
+        return {"sessionId": session["id"], "url": session["url"]}
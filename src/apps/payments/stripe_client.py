@@ -0,0 +1,64 @@
+import requests
+import stripe
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from src.core.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+# errors meaning Stripe is unreachable or failing, as opposed to errors
+# caused by the request itself
+TRANSIENT_ERRORS = (
+    stripe.error.APIConnectionError,
+    stripe.error.APIError,
+    stripe.error.RateLimitError,
+)
+
+
+class StripeUnavailable(Exception):
+    """
+    Raised when Stripe cannot be reached, fails or its circuit is open.
+    """
+
+
+def build_http_client() -> stripe.http_client.RequestsClient:
+    """
+    HTTP client sharing one pool of keep-alive connections between the
+    threads of a worker, with separate connect and read timeouts.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1, pool_maxsize=settings.STRIPE_HTTP_POOL_SIZE
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return stripe.http_client.RequestsClient(
+        timeout=(settings.STRIPE_CONNECT_TIMEOUT, settings.STRIPE_READ_TIMEOUT),
+        session=session,
+    )
+
+
+def configure() -> None:
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    stripe.api_base = settings.STRIPE_API_BASE
+    stripe.default_http_client = build_http_client()
+
+
+breaker = CircuitBreaker(
+    failure_threshold=settings.STRIPE_CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=settings.STRIPE_CIRCUIT_RESET_TIMEOUT,
+    failure_exceptions=TRANSIENT_ERRORS,
+)
+
+
+def create_checkout_session(**params) -> stripe.checkout.Session:
+    try:
+        return breaker.call(stripe.checkout.Session.create, **params)
+    except (CircuitOpenError, *TRANSIENT_ERRORS) as err:
+        raise StripeUnavailable(str(err)) from err
+
+
+def retrieve_payment_intent(payment_intent_id: str) -> stripe.PaymentIntent:
+    try:
+        return breaker.call(stripe.PaymentIntent.retrieve, payment_intent_id)
+    except (CircuitOpenError, *TRANSIENT_ERRORS) as err:
+        raise StripeUnavailable(str(err)) from err
@@ -1,5 +1,3 @@
-import json
-
 from django.shortcuts import get_object_or_404
 from django.conf import settings
 
@@ -9,13 +7,11 @@ from rest_framework import status, views, permissions
 from rest_framework.response import Response
 
 from src.apps.orders.models import Order
-from src.apps.orders.services import OrderService
+from src.apps.payments.services import StripeCheckoutService, StripeEventService
+from src.apps.payments.stripe_client import StripeUnavailable
 from src.core.authentication import CsrfExemptSessionAuthentication
 
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
-
-
 class StripeConfigView(views.APIView):
     """
     StripeConfigView returns Stripe's publishable_key on GET.
@@ -28,10 +24,13 @@ class StripeConfigView(views.APIView):
 
 class StripeSessionView(views.APIView):
     """
-    StripeSessionView creates stripe.checkout instance and returns
-    sessionId on GET.
+    StripeSessionView returns the sessionId and url of a stripe.checkout
+    session for the order on GET. The session is reused while it is
+    payable, and 503 is returned while Stripe is unavailable.
     """
 
+    service_class = StripeCheckoutService
+
     def get(self, request, *args, **kwargs):
         order_id = kwargs.get("pk")
         order = get_object_or_404(Order, id=order_id)
@@ -40,65 +39,46 @@ class StripeSessionView(views.APIView):
                 {"payment": "Payment already accepted"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        price_data = {
-            "price_data": {
-                "currency": "usd",
-                "product_data": {
-                    "name": f"Order #{order.id}",
+        if order.cancelled:
+            return Response(
+                {"payment": "Order was cancelled"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            session = self.service_class.get_session(order)
+        except StripeUnavailable:
+            return Response(
+                {"payment": "Payment provider is unavailable, try again later."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={
+                    "Retry-After": str(int(settings.STRIPE_CIRCUIT_RESET_TIMEOUT))
                 },
-                "unit_amount": int(order.total * 100),
-            },
-            "quantity": 1,
-        }
-
-        checkout_session = stripe.checkout.Session.create(
-            success_url=settings.PAYMENT_SUCCESS_URL,
-            cancel_url=settings.PAYMENT_SUCCESS_URL,
-            payment_method_types=["card"],
-            mode="payment",
-            line_items=[
-                price_data,
-            ],
-            metadata={"order_id": order_id},
-        )
-        return Response(
-            {"sessionId": checkout_session["id"], "url": checkout_session["url"]},
-            status=status.HTTP_200_OK,
-        )
+            )
+        return Response(session, status=status.HTTP_200_OK)
 
 
 class StripeWebhookView(views.APIView):
     """
     StripeWebhookView is responsible of handling the webhook
-    events of /webhook/ endpoint. After succesful payment,
-    the .payment_accepted attribute of Order instance is changed
-    to True.
+    events of /webhook/ endpoint. Verified events are only stored
+    and acknowledged, so Stripe never retries because of a slow response.
+    They are applied later by the `process_stripe_events` command,
+    which changes the .payment_accepted attribute of the paid Order to True.
     """
 
     authentication_classes = [CsrfExemptSessionAuthentication]
     permission_classes = [permissions.AllowAny]
-    service_class = OrderService
+    service_class = StripeEventService
 
     def post(self, request, format=None):
         endpoint_secret = settings.WEBHOOK_SECRET
-        payload = json.loads(request.body)
-        print(request.META["HTTP_STRIPE_SIGNATURE"])
-        sig_header = request.META["HTTP_STRIPE_SIGNATURE"]
+        payload = request.body
+        sig_header = request.META.get("HTTP_STRIPE_SIGNATURE", "")
 
         try:
             event = stripe.Webhook.construct_event(payload, sig_header, endpoint_secret)
-        except ValueError as err:
-            print(err)
+        except (ValueError, stripe.error.SignatureVerificationError):
             return Response(status=status.HTTP_400_BAD_REQUEST)
-        except stripe.error.SignatureVerificationError as err:
-            print(err)
-            return Response(status=status.HTTP_400_BAD_REQUEST)
-
-        if event["type"] == "checkout.session.completed":
-            session = event["data"]["object"]
-            payment_intent = stripe.PaymentIntent.retrieve(id=session["payment_intent"])
-            self.service_class.fullfill_order(
-                session=session, payment_intent=payment_intent
-            )
 
+        self.service_class.record_event(event.to_dict_recursive())
         return Response(status=status.HTTP_200_OK)
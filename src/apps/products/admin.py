@@ -3,6 +3,7 @@ from django.contrib import admin
 from src.apps.products.models import (
     Product,
     ProductCategory,
+    ProductDailySales,
     ProductInventory,
     ProductReview,
 )
@@ -12,3 +13,4 @@ admin.site.register(Product)
 admin.site.register(ProductInventory)
 admin.site.register(ProductCategory)
 admin.site.register(ProductReview)
+admin.site.register(ProductDailySales)
@@ -1,11 +1,45 @@
+import re
+
 from django import forms
-from django.db.models import Case, When, F, Avg
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Concat
 from django.db import models
 from django_filters import rest_framework as filters
 from src.apps.products.models import Product, ProductCategory, ProductReview, User
 
 
+SEARCH_CONFIG = "english"
+
+
+def build_prefix_search_query(value: str):
+    """
+    Turns free text into a tsquery matching every word as a prefix,
+    e.g. "bro ric" -> 'bro':* & 'ric':*. Returns None for text without words.
+    """
+    words = re.findall(r"[^\W_]+", value)
+    if not words:
+        return None
+    return SearchQuery(
+        " & ".join(f"{word}:*" for word in words),
+        search_type="raw",
+        config=SEARCH_CONFIG,
+    )
+
+
+# Every ordering is backed by a composite index on products_product.
+PRODUCT_ORDERINGS = {
+    "bestselling": ("-sales_30d", "-created", "-id"),
+    "bestselling_week": ("-sales_7d", "-created", "-id"),
+    "top_rated": (F("top_rated_score").desc(nulls_last=True), "-created", "-id"),
+    "newest": ("-created", "-id"),
+}
+
+
 class ProductFilter(filters.FilterSet):
+    search = filters.CharFilter(
+        label="Full-text search in name and descriptions", method="filter_search"
+    )
     category = filters.ModelMultipleChoiceFilter(
         queryset=ProductCategory.objects.all(),
         field_name="category__name",
@@ -20,19 +54,37 @@ class ProductFilter(filters.FilterSet):
             ("lt", "Less than"),
         ],
     )
+    effective_price = filters.LookupChoiceFilter(
+        label="Price after discount",
+        field_class=forms.DecimalField,
+        lookup_choices=[
+            ("exact", "Equals"),
+            ("gt", "Greater than"),
+            ("lt", "Less than"),
+        ],
+    )
     discounted = filters.BooleanFilter(
-        label="Is discounted",
-        method="filter_is_discounted",
+        label="Is discounted", field_name="is_discounted"
     )
 
     average_rating = filters.NumberFilter(
-        label="Average rating equals", method="filter_average_rating"
+        label="Average rating equals", field_name="avg_rating"
     )
     average_rating__lt = filters.NumberFilter(
-        label="Average rating lower than", method="filter_average_rating"
+        label="Average rating lower than", field_name="avg_rating", lookup_expr="lt"
     )
     average_rating__gt = filters.NumberFilter(
-        label="Average rating higher than", method="filter_average_rating"
+        label="Average rating higher than", field_name="avg_rating", lookup_expr="gt"
+    )
+    ordering = filters.ChoiceFilter(
+        label="Ordering",
+        choices=[
+            ("bestselling", "Bestselling in the last 30 days"),
+            ("bestselling_week", "Bestselling in the last 7 days"),
+            ("top_rated", "Top rated"),
+            ("newest", "Newest"),
+        ],
+        method="filter_ordering",
     )
 
     class Meta:
@@ -42,27 +94,34 @@ class ProductFilter(filters.FilterSet):
             "price",
         ]
 
-    def filter_average_rating(self, queryset, name, value):
-        if value is not None:
-            queryset = queryset.annotate(
-                average_rating=Avg("reviews__rating", distinct=True)
-            )
-            if name == "average_rating":
-                queryset = queryset.filter(average_rating=value)
-            if name == "average_rating__lt":
-                queryset = queryset.filter(average_rating__lt=value)
-            if name == "average_rating__gt":
-                queryset = queryset.filter(average_rating__gt=value)
+    def filter_ordering(self, queryset, name, value):
+        if value:
+            queryset = queryset.order_by(*PRODUCT_ORDERINGS[value])
         return queryset
 
-    def filter_is_discounted(self, queryset, name, value):
-        if value is not None:
-            queryset = queryset.annotate(
-                discounted=Case(
-                    When(price=F("discount_price"), then=False), default=True
-                )
-            ).filter(discounted=value)
-        return queryset
+    def filter_search(self, queryset, name, value):
+        query = build_prefix_search_query(value)
+        if query is None:
+            return queryset
+        return (
+            queryset.filter(search_vector=query)
+            .annotate(
+                search_rank=SearchRank(F("search_vector"), query),
+                search_headline=SearchHeadline(
+                    Concat(
+                        "name",
+                        Value(". "),
+                        Coalesce("short_description", Value("")),
+                        Value(" "),
+                        Coalesce("long_description", Value("")),
+                    ),
+                    query,
+                    config=SEARCH_CONFIG,
+                    max_fragments=2,
+                ),
+            )
+            .order_by("-search_rank", "-created", "-id")
+        )
 
 
 class ReviewFilter(filters.FilterSet):
@@ -0,0 +1,95 @@
+import threading
+import time
+from statistics import quantiles
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connection, connections
+from django.test import Client
+
+from src.core.db.pool import close_pools, get_pool_stats
+
+MODES = ("none", "persistent", "pool")
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs requests concurrently with a new connection per request "
+        "(none), persistent connections and the connection pool, and reports "
+        "requests per second of each. Without --path, every request runs a "
+        "single query between the request started and finished signals, "
+        "which is what manages the connections; with --path the endpoint is "
+        "requested through the full middleware and view stack."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path")
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--pool-size", type=int, default=4)
+        parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+
+    def _configure(self, mode: str, pool_size: int) -> None:
+        settings_dict = connections.settings["default"]
+        settings_dict["CONN_MAX_AGE"] = 60 if mode == "persistent" else 0
+        settings_dict["POOL"] = (
+            {"MAX_SIZE": pool_size, "TIMEOUT": 30} if mode == "pool" else None
+        )
+
+    def _query(self) -> None:
+        request_started.send(sender=self.__class__)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        finally:
+            request_finished.send(sender=self.__class__)
+
+    def _worker(self, path: str, count: int, latencies: list[float]) -> None:
+        client = Client()
+        try:
+            for _ in range(count):
+                start = time.perf_counter()
+                if path:
+                    response = client.get(path)
+                    if response.status_code != 200:
+                        raise RuntimeError(f"{path} returned {response.status_code}.")
+                else:
+                    self._query()
+                latencies.append(time.perf_counter() - start)
+        finally:
+            connections.close_all()
+
+    def _run(self, options) -> tuple[float, list[float]]:
+        concurrency = options["concurrency"]
+        per_worker = options["requests"] // concurrency
+        latencies = []
+        threads = [
+            threading.Thread(
+                target=self._worker, args=(options["path"], per_worker, latencies)
+            )
+            for _ in range(concurrency)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start, sorted(latencies)
+
+    def handle(self, *args, **options):
+        connections.close_all()
+        original = dict(connections.settings["default"])
+        try:
+            for mode in options["modes"]:
+                self._configure(mode, options["pool_size"])
+                elapsed, latencies = self._run(options)
+                cuts = quantiles(latencies, n=100, method="inclusive")
+                self.stdout.write(
+                    f"{mode}: {len(latencies) / elapsed:.1f} req/s "
+                    f"p50={cuts[49] * 1000:.1f}ms p99={cuts[98] * 1000:.1f}ms"
+                )
+                if mode == "pool":
+                    self.stdout.write(f"pool: {get_pool_stats()['default']}")
+                close_pools()
+        finally:
+            connections.settings["default"].update(original)
@@ -0,0 +1,126 @@
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.renderers import JSONRenderer
+
+from src.apps.orders.models import Cart, CartItem, Order, OrderItem
+from src.apps.orders.serializers import (
+    CartItemOutputSerializer,
+    OrderItemOutputSerializer,
+)
+from src.apps.products.models import Product, ProductCategory, ProductInventory
+from src.apps.products.serializers import ProductListOutputSerializer
+from src.core.renderers import ORJSONRenderer
+from src.core.serializers import compile_serializer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Serializes the same rows with the DRF output serializers rendered by "
+        "JSONRenderer and with the compiled serializers over values() rows "
+        "rendered by ORJSONRenderer, checks both give the same bytes and "
+        "reports the time per 1,000 rows (query, serialization and "
+        "rendering, best of --repeat runs). The rows are created in a "
+        "transaction which is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def _create_rows(self, count: int):
+        category = ProductCategory.objects.create(name=f"benchmark-{uuid.uuid4()}")
+        inventories = ProductInventory.objects.bulk_create(
+            ProductInventory(quantity=index % 50, sold=index % 7)
+            for index in range(count)
+        )
+        products = []
+        for index, inventory in enumerate(inventories):
+            product = Product(
+                name=f"Product {index}",
+                price=f"{index % 500 + 1}.99",
+                discount_price=f"{index % 500}.49" if index % 3 else None,
+                category=category if index % 10 else None,
+                inventory=inventory,
+            )
+            product.update_price_fields()
+            products.append(product)
+        Product.objects.bulk_create(products)
+
+        user = User.objects.create(username=f"benchmark-{uuid.uuid4()}")
+        cart = Cart.objects.create(user=user)
+        order = Order.objects.create(user=user)
+        CartItem.objects.bulk_create(
+            CartItem(cart=cart, product=product, quantity=index % 5 + 1)
+            for index, product in enumerate(products)
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=product, quantity=index % 5 + 1)
+            for index, product in enumerate(products)
+        )
+        # so the planner does not assume the tables are as small as before
+        with connection.cursor() as cursor:
+            for model in (ProductInventory, Product, CartItem, OrderItem):
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+        return (
+            (
+                ProductListOutputSerializer,
+                Product.objects.filter(inventory__in=inventories).select_related(
+                    "inventory", "category"
+                ),
+            ),
+            (
+                CartItemOutputSerializer,
+                CartItem.objects.filter(cart=cart).select_related("product"),
+            ),
+            (
+                OrderItemOutputSerializer,
+                OrderItem.objects.filter(order=order).select_related("product"),
+            ),
+        )
+
+    def _best(self, func, repeat: int) -> tuple[float, bytes]:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            content = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, content
+
+    def handle(self, *args, **options):
+        rows, repeat = options["rows"], options["repeat"]
+        with transaction.atomic():
+            for serializer_class, queryset in self._create_rows(rows):
+                queryset = queryset.order_by("id")
+                compiled = compile_serializer(serializer_class, queryset.model)
+                drf_time, drf_content = self._best(
+                    lambda: JSONRenderer().render(
+                        serializer_class(queryset, many=True).data
+                    ),
+                    repeat,
+                )
+                fast_time, fast_content = self._best(
+                    lambda: ORJSONRenderer().render(
+                        compiled.serialize(compiled.values(queryset))
+                    ),
+                    repeat,
+                )
+                if fast_content != drf_content:
+                    raise CommandError(
+                        f"{serializer_class.__name__}: the compiled output differs."
+                    )
+                per_thousand = 1000 / rows * 1000
+                self.stdout.write(
+                    f"{serializer_class.__name__}: identical JSON "
+                    f"({len(drf_content)} bytes), "
+                    f"drf={drf_time * per_thousand:.1f}ms "
+                    f"compiled={fast_time * per_thousand:.1f}ms per 1,000 rows, "
+                    f"{drf_time / fast_time:.1f}x faster"
+                )
+            transaction.set_rollback(True)
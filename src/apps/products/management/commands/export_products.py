@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from src.apps.products.services import ProductExportService
+from src.core.streaming import CSV, FORMATS, write_rows
+
+
+class Command(BaseCommand):
+    help = "Writes the whole catalog as CSV or JSON lines, in the import format."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file-format", choices=FORMATS, default=CSV)
+        parser.add_argument(
+            "--output", help="Path of the file to write, stdout by default."
+        )
+
+    def handle(self, *args, **options):
+        lines = write_rows(
+            ProductExportService.iter_rows(),
+            options["file_format"],
+            fieldnames=ProductExportService.fieldnames,
+        )
+        if not options["output"]:
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+
+        with open(options["output"], "w", encoding="utf-8", newline="") as output:
+            output.writelines(lines)
@@ -0,0 +1,48 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from src.apps.products.services import ProductImportService
+from src.core.streaming import FORMATS, guess_format, open_text, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk loads products from a CSV or JSON lines file, in batches. "
+        "Invalid rows are skipped and reported on stderr."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path of the file, or - to read stdin.")
+        parser.add_argument(
+            "--file-format",
+            choices=FORMATS,
+            help="Format of the file, guessed from its extension by default.",
+        )
+        parser.add_argument("--batch-size", type=int)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["file_format"] or guess_format(path)
+        try:
+            stream = (
+                open_text(sys.stdin.buffer)
+                if path == "-"
+                else open(path, encoding="utf-8", newline="")
+            )
+        except OSError as err:
+            raise CommandError(err)
+
+        created = failed = 0
+        with stream:
+            for result in ProductImportService.import_products(
+                read_rows(stream, file_format), batch_size=options["batch_size"]
+            ):
+                created += result["created"]
+                failed += len(result["errors"])
+                for error in result["errors"]:
+                    self.stderr.write(f"Row {error['row']}: {error['errors']}")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Imported {created} products, skipped {failed} rows.")
+        )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from src.apps.products.services import ReviewService
+
+
+class Command(BaseCommand):
+    help = "Recomputes stored rating aggregates of products from their reviews."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--product",
+            action="append",
+            dest="product_ids",
+            help="Only rebuild the given product id. Can be passed multiple times.",
+        )
+
+    def handle(self, *args, **options):
+        updated = ReviewService.rebuild_rating_aggregates(
+            product_ids=options["product_ids"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt rating aggregates of {updated} products.")
+        )
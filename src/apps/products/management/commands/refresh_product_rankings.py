@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from src.apps.products.services import ProductRankingService
+
+
+class Command(BaseCommand):
+    help = (
+        "Rolls the bestseller sales windows forward and recomputes top-rated "
+        "scores of products."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep refreshing the rankings every --interval seconds.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=3600.0,
+            help="Seconds to sleep between refreshes in --loop mode.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            updated = ProductRankingService.refresh()
+            self.stdout.write(
+                self.style.SUCCESS(f"Refreshed rankings of {updated} products.")
+            )
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,47 @@
+# Generated by Django 4.0 on 2026-10-18 02:59
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    ProductReview = apps.get_model("products", "ProductReview")
+
+    reviews = ProductReview.objects.filter(product=OuterRef("pk")).values("product")
+    Product.objects.update(
+        rating_sum=Coalesce(
+            Subquery(reviews.annotate(value=Sum("rating")).values("value")), 0.0
+        ),
+        review_count=Coalesce(
+            Subquery(reviews.annotate(value=Count("pk")).values("value")), 0
+        ),
+        avg_rating=Subquery(reviews.annotate(value=Avg("rating")).values("value")),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='avg_rating',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,124 @@
+# Generated by Django 4.0 on 2026-10-18 03:17
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+import django.db.models.deletion
+import django.db.models.expressions
+import uuid
+
+
+def backfill_rankings(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    ProductDailySales = apps.get_model("products", "ProductDailySales")
+    OrderItem = apps.get_model("orders", "OrderItem")
+
+    sales = (
+        OrderItem.objects.filter(order__payment_accepted=True)
+        .annotate(
+            day=TruncDate(Coalesce("order__payment__created", "order__created"))
+        )
+        .values("product_id", "day")
+        .annotate(total=Sum("quantity"))
+        .order_by()
+    )
+    ProductDailySales.objects.bulk_create(
+        [
+            ProductDailySales(
+                product_id=row["product_id"], day=row["day"], quantity=row["total"]
+            )
+            for row in sales.iterator()
+        ],
+        batch_size=1000,
+    )
+
+    today = timezone.localdate()
+    windows = {}
+    for field, days in (("sales_7d", 7), ("sales_30d", 30)):
+        window = (
+            ProductDailySales.objects.filter(
+                product=OuterRef("pk"), day__gte=today - timedelta(days=days - 1)
+            )
+            .values("product")
+            .annotate(total=Sum("quantity"))
+            .values("total")
+        )
+        windows[field] = Coalesce(Subquery(window), 0)
+    Product.objects.filter(
+        id__in=ProductDailySales.objects.values("product_id")
+    ).update(**windows)
+
+    Product.objects.filter(
+        review_count__gte=settings.PRODUCT_TOP_RATED_MIN_REVIEWS
+    ).update(top_rated_score=F("avg_rating"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_created_id_indexes'),
+        ('products', '0004_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductDailySales',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('day', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Product daily sales',
+            },
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='sales_30d',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='sales_7d',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='top_rated_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['sales_30d', 'created', 'id'], name='product_sales_30d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['sales_7d', 'created', 'id'], name='product_sales_7d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'sales_30d', 'created', 'id'], name='product_category_sales_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.expressions.OrderBy(django.db.models.expressions.F('top_rated_score'), descending=True, nulls_last=True), django.db.models.expressions.OrderBy(django.db.models.expressions.F('created'), descending=True), django.db.models.expressions.OrderBy(django.db.models.expressions.F('id'), descending=True), name='product_top_rated_idx'),
+        ),
+        migrations.AddField(
+            model_name='productdailysales',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='products.product'),
+        ),
+        migrations.AddIndex(
+            model_name='productdailysales',
+            index=models.Index(fields=['day'], name='product_daily_sales_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='productdailysales',
+            constraint=models.UniqueConstraint(fields=('product', 'day'), name='product_daily_sales_unique'),
+        ),
+        migrations.RunPython(backfill_rankings, migrations.RunPython.noop),
+    ]
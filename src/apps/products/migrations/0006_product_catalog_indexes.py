@@ -0,0 +1,108 @@
+# Generated by Django 4.0 on 2026-10-18 03:20
+
+from django.db import migrations, models
+from django.db.models import F, Q
+
+
+def backfill_discounts(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+
+    discounted = Q(discount_price__gt=0, discount_price__lt=F("price"))
+    Product.objects.filter(discounted).update(
+        is_discounted=True, effective_price=F("discount_price")
+    )
+    Product.objects.exclude(discounted).update(
+        is_discounted=False, effective_price=F("price")
+    )
+
+
+CREATE_IN_STOCK_TRIGGERS = """
+CREATE FUNCTION products_product_in_stock_update() RETURNS trigger AS $$
+BEGIN
+    NEW.in_stock := COALESCE(
+        (SELECT quantity > 0 FROM products_productinventory WHERE id = NEW.inventory_id),
+        false
+    );
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER products_product_in_stock_trigger
+    BEFORE INSERT OR UPDATE OF inventory_id, in_stock
+    ON products_product
+    FOR EACH ROW EXECUTE FUNCTION products_product_in_stock_update();
+
+CREATE FUNCTION products_productinventory_in_stock_sync() RETURNS trigger AS $$
+BEGIN
+    UPDATE products_product SET in_stock = NEW.quantity > 0 WHERE inventory_id = NEW.id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER products_productinventory_in_stock_trigger
+    AFTER UPDATE OF quantity
+    ON products_productinventory
+    FOR EACH ROW
+    WHEN ((OLD.quantity > 0) IS DISTINCT FROM (NEW.quantity > 0))
+    EXECUTE FUNCTION products_productinventory_in_stock_sync();
+
+UPDATE products_product SET in_stock = in_stock;
+"""
+
+DROP_IN_STOCK_TRIGGERS = """
+DROP TRIGGER IF EXISTS products_productinventory_in_stock_trigger ON products_productinventory;
+DROP FUNCTION IF EXISTS products_productinventory_in_stock_sync();
+DROP TRIGGER IF EXISTS products_product_in_stock_trigger ON products_product;
+DROP FUNCTION IF EXISTS products_product_in_stock_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_rankings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=7),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='in_stock',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='is_discounted',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(backfill_discounts, migrations.RunPython.noop),
+        migrations.RunSQL(CREATE_IN_STOCK_TRIGGERS, DROP_IN_STOCK_TRIGGERS),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('in_stock', True)), fields=['created', 'id'], name='product_stock_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('in_stock', True), ('is_discounted', True)), fields=['created', 'id'], name='product_stock_discount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('in_stock', True)), fields=['price'], name='product_stock_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('in_stock', True)), fields=['category', 'price'], name='product_stock_cat_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('in_stock', True)), fields=['category', 'effective_price'], name='product_stock_cat_eff_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('in_stock', True)), fields=['effective_price'], name='product_stock_eff_price_idx'),
+        ),
+    ]
@@ -1,5 +1,10 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import F, Q
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 import uuid
 
 User = get_user_model()
@@ -60,28 +65,130 @@ class Product(models.Model):
         ProductInventory, on_delete=models.CASCADE, related_name="product"
     )
 
+    # Denormalized review aggregates, maintained by ReviewService and
+    # recomputed by the `rebuild_product_ratings` management command.
+    rating_sum = models.FloatField(default=0.0)
+    review_count = models.IntegerField(default=0)
+    avg_rating = models.FloatField(null=True, blank=True)
+    # Materialized rankings. Sales windows are bumped on every paid order and
+    # rolled forward by the `refresh_product_rankings` management command.
+    # top_rated_score is avg_rating once the product has enough reviews.
+    sales_7d = models.IntegerField(default=0)
+    sales_30d = models.IntegerField(default=0)
+    top_rated_score = models.FloatField(null=True, blank=True)
+
+    # Weighted tsvector of name, short and long description, maintained by
+    # a database trigger (see migration 0004_product_search_vector).
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # Persisted for index-driven catalog filters. effective_price and
+    # is_discounted are derived from price and discount_price in save();
+    # in_stock mirrors inventory.quantity > 0 and is maintained by database
+    # triggers (see migration 0006_product_catalog_indexes).
+    effective_price = models.DecimalField(max_digits=7, decimal_places=2, default=0)
+    is_discounted = models.BooleanField(default=False)
+    in_stock = models.BooleanField(default=False, editable=False)
+
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = "Product"
         verbose_name_plural = "Products"
+        indexes = [
+            models.Index(fields=["created", "id"], name="product_created_id_idx"),
+            GinIndex(fields=["search_vector"], name="product_search_vector_idx"),
+            models.Index(
+                fields=["sales_30d", "created", "id"], name="product_sales_30d_idx"
+            ),
+            models.Index(
+                fields=["sales_7d", "created", "id"], name="product_sales_7d_idx"
+            ),
+            models.Index(
+                fields=["category", "sales_30d", "created", "id"],
+                name="product_category_sales_idx",
+            ),
+            models.Index(
+                F("top_rated_score").desc(nulls_last=True),
+                F("created").desc(),
+                F("id").desc(),
+                name="product_top_rated_idx",
+            ),
+            # partial indexes covering the public catalog, which only lists
+            # products in stock
+            models.Index(
+                fields=["created", "id"],
+                name="product_stock_created_idx",
+                condition=Q(in_stock=True),
+            ),
+            models.Index(
+                fields=["created", "id"],
+                name="product_stock_discount_idx",
+                condition=Q(in_stock=True, is_discounted=True),
+            ),
+            models.Index(
+                fields=["price"],
+                name="product_stock_price_idx",
+                condition=Q(in_stock=True),
+            ),
+            models.Index(
+                fields=["category", "price"],
+                name="product_stock_cat_price_idx",
+                condition=Q(in_stock=True),
+            ),
+            models.Index(
+                fields=["category", "effective_price"],
+                name="product_stock_cat_eff_idx",
+                condition=Q(in_stock=True),
+            ),
+            models.Index(
+                fields=["effective_price"],
+                name="product_stock_eff_price_idx",
+                condition=Q(in_stock=True),
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.name
 
+    @staticmethod
+    def calculate_discount_price(price, percentage) -> Decimal:
+        price = Decimal(str(price))
+        return round(price * (1 - Decimal(str(percentage)) / 100), 2)
+
+    def update_price_fields(self) -> None:
+        """
+        Derives is_discounted and effective_price from the prices. Called by
+        save(), code writing products in bulk has to call it itself.
+        """
+        price = Decimal(str(self.price))
+        discount_price = (
+            Decimal(str(self.discount_price)) if self.discount_price else None
+        )
+        self.is_discounted = bool(discount_price) and discount_price < price
+        self.effective_price = discount_price if self.is_discounted else price
+
+    def save(self, *args, **kwargs):
+        self.update_price_fields()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"price", "discount_price"} & set(
+            update_fields
+        ):
+            kwargs["update_fields"] = {
+                *update_fields,
+                "is_discounted",
+                "effective_price",
+            }
+        super().save(*args, **kwargs)
+
     def set_discount(self, percentage: float):
-        self.discount_price = round((self.price * (1 - percentage / 100)), 2)
+        self.discount_price = self.calculate_discount_price(self.price, percentage)
         self.save()
 
     def remove_discount(self):
         self.discount_price = None
         self.save()
 
-    @property
-    def is_discounted(self) -> bool:
-        return bool(self.discount_price)
-
     @property
     def dollar_price(self):
         return "$%s" % self.price
@@ -90,14 +197,6 @@ class Product(models.Model):
     def dollar_discount_price(self):
         return "$%s" % self.discount_price if self.discount_price else ""
 
-    @property
-    def avg_rating(self):
-        return self.reviews.aggregate(models.Avg("rating")).get("rating__avg")
-
-    @property
-    def review_count(self):
-        return self.reviews.count()
-
     def get_absolute_url(self) -> str:
         return f"/api/products/{self.pk}/"
 
@@ -106,6 +205,36 @@ class Product(models.Model):
         return self.get_absolute_url()
 
 
+class ProductDailySales(models.Model):
+    """
+    Units of a product sold per day, the source of the rolling sales windows
+    stored on Product.
+    """
+
+    id = models.UUIDField(
+        primary_key=True, default=uuid.uuid4, editable=False, unique=True
+    )
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="daily_sales"
+    )
+    day = models.DateField()
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Product daily sales"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "day"], name="product_daily_sales_unique"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["day"], name="product_daily_sales_day_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.quantity} of {self.product_id} sold on {self.day}"
+
+
 class ProductReview(models.Model):
     id = models.UUIDField(
         primary_key=True, default=uuid.uuid4, editable=False, unique=True
@@ -120,6 +249,15 @@ class ProductReview(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created", "id"], name="review_created_id_idx"),
+            models.Index(
+                fields=["product", "created", "id"],
+                name="review_product_created_id_idx",
+            ),
+        ]
+
     def __str__(self) -> str:
         return f"Review of {self.product.name} | Author: {self.user.username}"
 
@@ -1,5 +1,6 @@
 from django.core.validators import MaxValueValidator, MinValueValidator
 from rest_framework import serializers
+from src.core.streaming import FORMATS
 from src.apps.products.models import (
     ProductCategory,
     ProductInventory,
@@ -53,6 +54,12 @@ class ProductInputSerializer(serializers.Serializer):
     inventory = ProductInventoryInputSerializer(many=False, required=True)
 
 
+class ProductImportInputSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    # guessed from the file extension when omitted
+    file_format = serializers.ChoiceField(choices=FORMATS, required=False)
+
+
 class ProductInventoryOutputSerializer(serializers.ModelSerializer):
     updated = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S", read_only=True)
 
@@ -65,6 +72,9 @@ class ProductInventoryOutputSerializer(serializers.ModelSerializer):
 class ProductListOutputSerializer(serializers.ModelSerializer):
     inventory = ProductInventoryOutputSerializer(many=False, read_only=True)
     category = ProductCategoryOutputSerializer(many=False, read_only=True)
+    # only present on results of the `search` filter
+    search_rank = serializers.FloatField(read_only=True, default=None)
+    search_headline = serializers.CharField(read_only=True, default=None)
 
     class Meta:
         model = Product
@@ -79,8 +89,12 @@ class ProductListOutputSerializer(serializers.ModelSerializer):
             "review_count",
             "inventory",
             "category",
+            "search_rank",
+            "search_headline",
         )
         read_only_fields = fields
+        # dollar_price and dollar_discount_price only read serialized fields
+        values_dependencies = ()
 
 
 class ProductDetailOutputSerializer(serializers.ModelSerializer):
@@ -128,7 +142,7 @@ class ProductReviewUpdateInputSerializer(serializers.Serializer):
 
 class ProductReviewOutputSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source="user.username", read_only=True)
-    product_id = serializers.CharField(source="product.id", read_only=True)
+    product_id = serializers.CharField(read_only=True)
     created = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S", read_only=True)
     updated = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S", read_only=True)
 
@@ -1,18 +1,103 @@
-from typing import Any
-from django.db import transaction
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Any, Iterable, Iterator, Optional, Union
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connection, transaction
+from django.db.models import (
+    Avg,
+    Case,
+    Count,
+    F,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, NullIf
+from django.db.models.lookups import GreaterThanOrEqual
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework.serializers import ValidationError
 from src.apps.products.models import (
     ProductCategory,
+    ProductDailySales,
     ProductInventory,
     Product,
     ProductReview,
 )
+from src.apps.products.serializers import ProductInputSerializer
+from src.apps.products.validators import validate_stock_reservation
+from src.core.cache import ResponseCache
+from src.core.streaming import batched, unflatten
 
 
 User = get_user_model()
 
 
+class CatalogCacheService:
+    """
+    Maps catalog writes to the response cache namespaces they affect.
+    Product lists depend on `products`, product details on `product:<id>`
+    and the category list on `categories`. `catalog` is shared by all of
+    them and is bumped by bulk operations touching an unknown set of rows.
+    """
+
+    CATALOG = "catalog"
+    PRODUCT_LIST = "products"
+    CATEGORY_LIST = "categories"
+
+    @classmethod
+    def product_namespace(cls, product_id: Any) -> str:
+        return f"product:{product_id}"
+
+    @classmethod
+    def invalidate_products(cls, product_ids: Iterable[Any]) -> None:
+        ResponseCache.invalidate(
+            cls.PRODUCT_LIST,
+            *(cls.product_namespace(product_id) for product_id in product_ids),
+        )
+
+    @classmethod
+    def invalidate_inventories(
+        cls, inventory_ids: Iterable[Any], in_stock_changed_ids: Iterable[Any] = ()
+    ) -> None:
+        """
+        Invalidates the details of the products of the inventories. Product
+        lists, which filter on Product.in_stock, are only invalidated when an
+        inventory in `in_stock_changed_ids` went in or out of stock.
+        Checkouts, cancellations and payments change stock all the time and
+        would otherwise empty the list cache under exactly that load. Lists
+        show the stock of the other products for up to RESPONSE_CACHE_TIMEOUT.
+        """
+        product_ids = Product.objects.filter(
+            inventory_id__in=list(inventory_ids)
+        ).values_list("id", flat=True)
+        namespaces = [cls.product_namespace(product_id) for product_id in product_ids]
+        if in_stock_changed_ids:
+            namespaces.append(cls.PRODUCT_LIST)
+        ResponseCache.invalidate(*namespaces)
+
+    @classmethod
+    def invalidate_categories(cls, category_ids: Iterable[Any] = ()) -> None:
+        ResponseCache.invalidate(cls.CATEGORY_LIST)
+        if category_ids:
+            cls.invalidate_products(
+                Product.objects.filter(category_id__in=list(category_ids)).values_list(
+                    "id", flat=True
+                )
+            )
+
+    @classmethod
+    def invalidate_catalog(cls) -> None:
+        ResponseCache.invalidate(cls.CATALOG)
+
+
 class ProductService:
     """
     Service for managing creating and updating product instances.
@@ -32,6 +117,9 @@ class ProductService:
         if discount_data:
             if percentage := discount_data.get("percentage", None):
                 product.set_discount(percentage)
+        if created:
+            CatalogCacheService.invalidate_categories()
+        CatalogCacheService.invalidate_products([product.id])
         return product
 
     @classmethod
@@ -43,7 +131,7 @@ class ProductService:
 
         inventory = instance.inventory
         inventory.quantity = inventory_data.get("quantity", inventory.quantity)
-        inventory.save()
+        inventory.save(update_fields=["quantity", "updated"])
 
         fields = ["name", "price", "weight", "short_description", "long_description"]
         for field in fields:
@@ -60,21 +148,425 @@ class ProductService:
                 instance.set_discount(percentage)
         else:
             instance.set_discount(0)
+        if created:
+            CatalogCacheService.invalidate_categories()
+        CatalogCacheService.invalidate_products([instance.id])
 
         return instance
 
 
+class ProductImportService:
+    """
+    Service for loading large product feeds. Rows are shaped like the input
+    of ProductService.create_product, validated with ProductInputSerializer
+    and the model field constraints, and written in batches: the categories
+    of a batch are resolved with a single query and inventories and products
+    are inserted with one bulk_create each. Invalid rows are skipped and
+    reported with their row number.
+    """
+
+    @classmethod
+    def _to_decimal(cls, value: Optional[float]) -> Optional[Decimal]:
+        return None if value is None else Decimal(str(value))
+
+    @classmethod
+    def _build_product(cls, data: dict[str, Any]) -> Product:
+        discount_data = data.get("discount")
+        product = Product(
+            name=data["name"],
+            price=cls._to_decimal(data.get("price")),
+            weight=cls._to_decimal(data.get("weight")),
+            short_description=data.get("short_description"),
+            long_description=data.get("long_description"),
+            category=ProductCategory(**data["category"]),
+            inventory=ProductInventory(**data["inventory"]),
+        )
+
+        errors = {}
+        for prefix, instance, exclude in (
+            (None, product, ["category", "inventory"]),
+            ("category", product.category, None),
+            ("inventory", product.inventory, None),
+        ):
+            try:
+                instance.clean_fields(exclude=exclude)
+            except DjangoValidationError as err:
+                errors.update(
+                    {prefix: err.message_dict} if prefix else err.message_dict
+                )
+        if errors:
+            raise ValidationError(errors)
+
+        if discount_data:
+            if percentage := discount_data.get("percentage", None):
+                product.discount_price = Product.calculate_discount_price(
+                    product.price, percentage
+                )
+        product.update_price_fields()
+        return product
+
+    @classmethod
+    def _resolve_categories(cls, names: set[str]) -> tuple[dict[str, Any], bool]:
+        categories = dict(
+            ProductCategory.objects.filter(name__in=names).values_list("name", "id")
+        )
+        missing = names - categories.keys()
+        if missing:
+            # a concurrent import may create the same category, so ids are
+            # read back instead of taken from the instances
+            ProductCategory.objects.bulk_create(
+                [ProductCategory(name=name) for name in missing],
+                ignore_conflicts=True,
+            )
+            categories.update(
+                ProductCategory.objects.filter(name__in=missing).values_list(
+                    "name", "id"
+                )
+            )
+        return categories, bool(missing)
+
+    @classmethod
+    @transaction.atomic
+    def import_batch(
+        cls, rows: Iterable[tuple[int, Union[dict[str, Any], ValueError]]]
+    ) -> dict[str, Any]:
+        products, errors = [], []
+        for row_number, row in rows:
+            if isinstance(row, ValueError):
+                errors.append(
+                    {"row": row_number, "errors": {"non_field_errors": [str(row)]}}
+                )
+                continue
+            serializer = ProductInputSerializer(data=row)
+            try:
+                serializer.is_valid(raise_exception=True)
+                products.append(cls._build_product(serializer.validated_data))
+            except ValidationError as err:
+                errors.append({"row": row_number, "errors": err.detail})
+
+        if products:
+            categories, created = cls._resolve_categories(
+                {product.category.name for product in products}
+            )
+            for product in products:
+                product.category_id = categories[product.category.name]
+            ProductInventory.objects.bulk_create(
+                [product.inventory for product in products]
+            )
+            Product.objects.bulk_create(products)
+            if created:
+                CatalogCacheService.invalidate_categories()
+            # new products have no cached details, only the lists change
+            CatalogCacheService.invalidate_products(())
+
+        return {"created": len(products), "errors": errors}
+
+    @classmethod
+    def import_products(
+        cls,
+        rows: Iterable[tuple[int, Union[dict[str, Any], ValueError]]],
+        batch_size: Optional[int] = None,
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Lazily imports (row number, row) pairs, as produced by
+        src.core.streaming.read_rows(), yielding the result of every batch.
+        Each batch is committed on its own.
+        """
+        batch_size = batch_size or settings.PRODUCT_IMPORT_BATCH_SIZE
+        for batch in batched(rows, batch_size):
+            yield cls.import_batch(batch)
+
+
+class ProductExportService:
+    """
+    Service for dumping the catalog in the format read by ProductImportService.
+    Rows are fetched through a server-side cursor, so memory use does not
+    grow with the size of the catalog.
+    """
+
+    fieldnames = (
+        "id",
+        "name",
+        "price",
+        "discount_price",
+        "discount.percentage",
+        "weight",
+        "short_description",
+        "long_description",
+        "category.name",
+        "inventory.quantity",
+        "inventory.sold",
+    )
+    query_fields = (
+        "id",
+        "name",
+        "price",
+        "discount_price",
+        "is_discounted",
+        "weight",
+        "short_description",
+        "long_description",
+        "category__name",
+        "inventory__quantity",
+        "inventory__sold",
+    )
+
+    @classmethod
+    def iter_rows(cls, chunk_size: int = 2000) -> Iterator[dict[str, Any]]:
+        queryset = Product.objects.order_by("created", "id").values(*cls.query_fields)
+        for row in queryset.iterator(chunk_size=chunk_size):
+            if row.pop("is_discounted"):
+                row["discount__percentage"] = round(
+                    (1 - row["discount_price"] / row["price"]) * 100, 2
+                )
+            # missing values are left out, as empty cells are on import
+            yield unflatten(
+                {
+                    key.replace("__", "."): value
+                    for key, value in row.items()
+                    if value is not None
+                }
+            )
+
+
+class InventoryService:
+    """
+    Service for changing stock of product inventories under concurrent checkouts.
+    Quantities are passed as a mapping of inventory id to the number of units.
+
+    Every method first locks the affected rows with SELECT ... FOR UPDATE in
+    primary key order, so concurrent transactions touching overlapping sets of
+    products always acquire locks in the same order and cannot deadlock. The
+    change itself is a single set-based UPDATE relative to the current value,
+    so no concurrent update is lost.
+    """
+
+    @classmethod
+    def _lock(cls, inventory_ids: Iterable[Any]) -> dict[Any, int]:
+        """
+        Returns the quantities of the locked inventories.
+        """
+        return dict(
+            ProductInventory.objects.select_for_update()
+            .filter(id__in=inventory_ids)
+            .order_by("id")
+            .values_list("id", "quantity")
+        )
+
+    @classmethod
+    def _per_inventory(cls, quantities: dict[Any, int]) -> Case:
+        return Case(
+            *(
+                When(id=inventory_id, then=Value(quantity))
+                for inventory_id, quantity in quantities.items()
+            ),
+            output_field=IntegerField(),
+        )
+
+    @classmethod
+    @transaction.atomic
+    def reserve(cls, quantities: dict[Any, int]) -> None:
+        """
+        Decrements available stock. Rows without enough stock do not match
+        the WHERE clause, so oversell raises ValidationError and the whole
+        transaction is rolled back.
+        """
+        if not quantities:
+            return
+        stock = cls._lock(quantities.keys())
+        in_stock = Q()
+        for inventory_id, quantity in quantities.items():
+            in_stock |= Q(id=inventory_id, quantity__gte=quantity)
+        reserved = ProductInventory.objects.filter(in_stock).update(
+            quantity=F("quantity") - cls._per_inventory(quantities)
+        )
+        validate_stock_reservation(reserved=reserved, requested=len(quantities))
+        CatalogCacheService.invalidate_inventories(
+            quantities.keys(),
+            in_stock_changed_ids=[
+                inventory_id
+                for inventory_id, quantity in quantities.items()
+                if stock[inventory_id] > 0 >= stock[inventory_id] - quantity
+            ],
+        )
+
+    @classmethod
+    @transaction.atomic
+    def release(cls, quantities: dict[Any, int]) -> None:
+        if not quantities:
+            return
+        stock = cls._lock(quantities.keys())
+        ProductInventory.objects.filter(id__in=quantities.keys()).update(
+            quantity=F("quantity") + cls._per_inventory(quantities)
+        )
+        CatalogCacheService.invalidate_inventories(
+            quantities.keys(),
+            in_stock_changed_ids=[
+                inventory_id
+                for inventory_id, quantity in quantities.items()
+                if stock.get(inventory_id, 1) <= 0 < stock[inventory_id] + quantity
+            ],
+        )
+
+    @classmethod
+    @transaction.atomic
+    def record_sale(cls, quantities: dict[Any, int]) -> None:
+        if not quantities:
+            return
+        cls._lock(quantities.keys())
+        ProductInventory.objects.filter(id__in=quantities.keys()).update(
+            sold=F("sold") + cls._per_inventory(quantities)
+        )
+        CatalogCacheService.invalidate_inventories(quantities.keys())
+
+
+class ProductRankingService:
+    """
+    Service maintaining the bestseller and top-rated rankings stored on
+    Product, so that the catalog can be ordered by them straight off an index.
+
+    Paid orders add their quantities to ProductDailySales and to the sales
+    windows of the sold products. .refresh() recomputes the windows from the
+    daily sales, dropping days which left them, and the top-rated scores; it
+    is meant to run periodically and only issues plain UPDATEs, so readers
+    are never blocked.
+    """
+
+    windows = {"sales_7d": 7, "sales_30d": 30}
+
+    @classmethod
+    def top_rated_score(cls, avg_rating, review_count) -> Case:
+        return Case(
+            When(
+                GreaterThanOrEqual(
+                    review_count, settings.PRODUCT_TOP_RATED_MIN_REVIEWS
+                ),
+                then=avg_rating,
+            ),
+            default=Value(None),
+        )
+
+    @classmethod
+    def _upsert_daily_sales(cls, quantities: dict[Any, int], day: date) -> None:
+        table = ProductDailySales._meta.db_table
+        rows = [
+            (uuid.uuid4(), product_id, day, quantity)
+            for product_id, quantity in quantities.items()
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (id, product_id, day, quantity)
+                VALUES {", ".join(["(%s, %s, %s, %s)"] * len(rows))}
+                ON CONFLICT (product_id, day)
+                DO UPDATE SET quantity = {table}.quantity + EXCLUDED.quantity
+                """,
+                [value for row in rows for value in row],
+            )
+
+    @classmethod
+    @transaction.atomic
+    def record_sales(
+        cls, quantities: dict[Any, int], day: Optional[date] = None
+    ) -> None:
+        """
+        Adds sold quantities, a mapping of product id to units, to today's
+        sales. Product rows are locked in primary key order first, like in
+        InventoryService, so concurrent payments cannot deadlock.
+        """
+        if not quantities:
+            return
+        list(
+            Product.objects.select_for_update()
+            .filter(id__in=quantities.keys())
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        cls._upsert_daily_sales(quantities, day or timezone.localdate())
+        sold = Case(
+            *(
+                When(id=product_id, then=Value(quantity))
+                for product_id, quantity in quantities.items()
+            ),
+            output_field=IntegerField(),
+        )
+        Product.objects.filter(id__in=quantities.keys()).update(
+            **{field: F(field) + sold for field in cls.windows}
+        )
+
+    @classmethod
+    @transaction.atomic
+    def refresh(cls, today: Optional[date] = None) -> int:
+        """
+        Recomputes sales windows of products sold within the longest window
+        or still having non-zero windows, and the top-rated scores.
+        Returns the number of products updated.
+        """
+        today = today or timezone.localdate()
+        longest_window_start = today - timedelta(days=max(cls.windows.values()) - 1)
+        windows = {}
+        for field, days in cls.windows.items():
+            sales = (
+                ProductDailySales.objects.filter(
+                    product=OuterRef("pk"), day__gte=today - timedelta(days=days - 1)
+                )
+                .values("product")
+                .annotate(total=Sum("quantity"))
+                .values("total")
+            )
+            windows[field] = Coalesce(Subquery(sales), 0)
+
+        stale_windows = Q(
+            id__in=ProductDailySales.objects.filter(
+                day__gte=longest_window_start
+            ).values("product_id")
+        )
+        for field in cls.windows:
+            stale_windows |= Q(**{f"{field}__gt": 0})
+        updated = Product.objects.filter(stale_windows).update(**windows)
+
+        updated += Product.objects.filter(
+            Q(review_count__gte=settings.PRODUCT_TOP_RATED_MIN_REVIEWS)
+            | Q(top_rated_score__isnull=False)
+        ).update(
+            top_rated_score=cls.top_rated_score(F("avg_rating"), F("review_count"))
+        )
+        CatalogCacheService.invalidate_catalog()
+        return updated
+
+
 class ReviewService:
     """
-    Service for managing product reviews.
+    Service for managing product reviews. Every write keeps the denormalized
+    rating_sum, review_count, avg_rating and top_rated_score of the reviewed
+    product in sync within the same transaction, using a single UPDATE.
     """
 
+    @classmethod
+    def _update_rating_aggregates(
+        cls, product_id: Any, rating_delta: float, count_delta: int
+    ) -> None:
+        review_count = F("review_count") + count_delta
+        avg_rating = (F("rating_sum") + rating_delta) / NullIf(review_count, 0)
+        Product.objects.filter(id=product_id).update(
+            rating_sum=F("rating_sum") + rating_delta,
+            review_count=review_count,
+            avg_rating=avg_rating,
+            top_rated_score=ProductRankingService.top_rated_score(
+                avg_rating, review_count
+            ),
+        )
+        CatalogCacheService.invalidate_products([product_id])
+
     @classmethod
     @transaction.atomic
     def create_review(cls, user: User, data: dict[str, Any]) -> ProductReview:
         product_id = data.pop("product_id")
         product = get_object_or_404(Product, id=product_id)
         review = ProductReview.objects.create(user=user, product=product, **data)
+        cls._update_rating_aggregates(
+            product_id=product.id, rating_delta=review.rating, count_delta=1
+        )
         return review
 
     @classmethod
@@ -82,7 +574,56 @@ class ReviewService:
     def update_review(
         cls, instance: ProductReview, data: dict[str, Any]
     ) -> ProductReview:
+        previous_rating = instance.rating
         instance.description = data["description"]
         instance.rating = data["rating"]
         instance.save()
+        cls._update_rating_aggregates(
+            product_id=instance.product_id,
+            rating_delta=instance.rating - previous_rating,
+            count_delta=0,
+        )
         return instance
+
+    @classmethod
+    @transaction.atomic
+    def delete_review(cls, instance: ProductReview) -> None:
+        cls._update_rating_aggregates(
+            product_id=instance.product_id,
+            rating_delta=-instance.rating,
+            count_delta=-1,
+        )
+        instance.delete()
+
+    @classmethod
+    @transaction.atomic
+    def rebuild_rating_aggregates(
+        cls, product_ids: Optional[Iterable[Any]] = None
+    ) -> int:
+        """
+        Recomputes stored aggregates from ProductReview rows with one UPDATE.
+        Returns the number of products updated.
+        """
+        reviews = ProductReview.objects.filter(product=OuterRef("pk")).values("product")
+        products = Product.objects.all()
+        if product_ids is not None:
+            product_ids = list(product_ids)
+            products = products.filter(id__in=product_ids)
+            CatalogCacheService.invalidate_products(product_ids)
+        else:
+            CatalogCacheService.invalidate_catalog()
+        updated = products.update(
+            rating_sum=Coalesce(
+                Subquery(reviews.annotate(value=Sum("rating")).values("value")), 0.0
+            ),
+            review_count=Coalesce(
+                Subquery(reviews.annotate(value=Count("pk")).values("value")), 0
+            ),
+            avg_rating=Subquery(reviews.annotate(value=Avg("rating")).values("value")),
+        )
+        products.update(
+            top_rated_score=ProductRankingService.top_rated_score(
+                F("avg_rating"), F("review_count")
+            )
+        )
+        return updated
@@ -2,6 +2,8 @@ from django.urls import path
 
 from src.apps.products.views import (
     ProductDetailAPIView,
+    ProductExportAPIView,
+    ProductImportAPIView,
     ProductListCreateAPIView,
     ProductCategoryListCreateAPIView,
     ProductCategoryDetailAPIView,
@@ -14,6 +16,8 @@ app_name = "products"
 urlpatterns = [
     path("", ProductListCreateAPIView.as_view(), name="product-list"),
     path("<uuid:pk>/", ProductDetailAPIView.as_view(), name="product-detail"),
+    path("import/", ProductImportAPIView.as_view(), name="product-import"),
+    path("export/", ProductExportAPIView.as_view(), name="product-export"),
     path(
         "categories/", ProductCategoryListCreateAPIView.as_view(), name="category-list"
     ),
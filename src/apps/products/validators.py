@@ -0,0 +1,8 @@
+from rest_framework.serializers import ValidationError
+
+
+def validate_stock_reservation(reserved: int, requested: int):
+    if reserved < requested:
+        raise ValidationError(
+            {"quantity": "not enough available products in stock"},
+        )
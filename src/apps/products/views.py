@@ -1,6 +1,10 @@
-from rest_framework import permissions, generics, status
+from django.http import StreamingHttpResponse
+from rest_framework import permissions, generics, status, views
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from django_filters import rest_framework as filters
+from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 
 from src.apps.products.models import (
@@ -11,6 +15,7 @@ from src.apps.products.models import (
 from src.apps.products.serializers import (
     ProductCategoryInputSerializer,
     ProductCategoryOutputSerializer,
+    ProductImportInputSerializer,
     ProductInputSerializer,
     ProductListOutputSerializer,
     ProductDetailOutputSerializer,
@@ -18,24 +23,58 @@ from src.apps.products.serializers import (
     ProductReviewOutputSerializer,
     ProductReviewUpdateInputSerializer,
 )
-from src.apps.products.services import ProductService, ReviewService
+from src.apps.products.services import (
+    CatalogCacheService,
+    ProductExportService,
+    ProductImportService,
+    ProductService,
+    ReviewService,
+)
 from src.apps.products.filters import ProductFilter, ReviewFilter
+from src.core.cache import CachedResponseMixin
+from src.core.mixins import (
+    QuerySetOptimizationMixin,
+    ReplicaReadMixin,
+    ValuesSerializationMixin,
+)
+from src.core.pagination import CursorOrLimitOffsetPagination
 from src.core.permissions import OwnerOrReadOnly, StaffOrReadOnly
+from src.core.streaming import (
+    CONTENT_TYPES,
+    CSV,
+    FORMATS,
+    guess_format,
+    open_text,
+    read_rows,
+    write_rows,
+)
 
 
-class ProductListCreateAPIView(generics.ListAPIView):
+class ProductListCreateAPIView(
+    ReplicaReadMixin,
+    CachedResponseMixin,
+    ValuesSerializationMixin,
+    QuerySetOptimizationMixin,
+    generics.ListAPIView,
+):
     queryset = Product.objects.all()
     serializer_class = ProductListOutputSerializer
     permission_classes = [StaffOrReadOnly]
     filter_backends = [filters.DjangoFilterBackend]
     filterset_class = ProductFilter
+    pagination_class = CursorOrLimitOffsetPagination
     service_class = ProductService
+    select_related_fields = ("inventory", "category")
+    values_extra_fields = ("created",)
+
+    def get_cache_namespaces(self):
+        return [CatalogCacheService.CATALOG, CatalogCacheService.PRODUCT_LIST]
 
     def get_queryset(self):
-        qs = self.queryset
+        qs = super().get_queryset()
         if self.request.user.is_staff:
             return qs
-        return qs.filter(inventory__quantity__gt=0)
+        return qs.filter(in_stock=True)
 
     @swagger_auto_schema(request_body=ProductInputSerializer)
     def post(self, request, *args, **kwargs):
@@ -48,17 +87,29 @@ class ProductListCreateAPIView(generics.ListAPIView):
         )
 
 
-class ProductDetailAPIView(generics.RetrieveDestroyAPIView):
+class ProductDetailAPIView(
+    ReplicaReadMixin,
+    CachedResponseMixin,
+    QuerySetOptimizationMixin,
+    generics.RetrieveDestroyAPIView,
+):
     queryset = Product.objects.all()
     serializer_class = ProductDetailOutputSerializer
     permission_classes = [StaffOrReadOnly]
     service_class = ProductService
+    select_related_fields = ("inventory", "category")
+
+    def get_cache_namespaces(self):
+        return [
+            CatalogCacheService.CATALOG,
+            CatalogCacheService.product_namespace(self.kwargs["pk"]),
+        ]
 
     def get_queryset(self):
-        qs = self.queryset
+        qs = super().get_queryset()
         if self.request.user.is_superuser:
             return qs
-        return qs.filter(inventory__quantity__gt=0)
+        return qs.filter(in_stock=True)
 
     @swagger_auto_schema(request_body=ProductInputSerializer)
     def put(self, request, *args, **kwargs):
@@ -75,39 +126,125 @@ class ProductDetailAPIView(generics.RetrieveDestroyAPIView):
 
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
+        CatalogCacheService.invalidate_products([instance.id])
         instance.inventory.delete()
         instance.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class ProductCategoryListCreateAPIView(generics.ListAPIView):
+class ProductImportAPIView(generics.GenericAPIView):
+    """
+    Bulk loads products from an uploaded CSV or JSON lines file. CSV files
+    name nested fields with dots, e.g. `category.name`. Valid rows are
+    imported in batches and every invalid row is reported with its number.
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = [MultiPartParser]
+    serializer_class = ProductImportInputSerializer
+    service_class = ProductImportService
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data["file"]
+        file_format = serializer.validated_data.get("file_format") or guess_format(
+            upload.name
+        )
+
+        created, errors = 0, []
+        for result in self.service_class.import_products(
+            read_rows(open_text(upload.file), file_format)
+        ):
+            created += result["created"]
+            errors += result["errors"]
+        return Response(
+            {"created": created, "errors": errors}, status=status.HTTP_200_OK
+        )
+
+
+class ProductExportAPIView(views.APIView):
+    """
+    Streams the whole catalog as CSV or JSON lines, in the format accepted
+    by the import endpoint.
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+    service_class = ProductExportService
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                "file_format",
+                openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                enum=list(FORMATS),
+                default=CSV,
+            )
+        ]
+    )
+    def get(self, request, *args, **kwargs):
+        file_format = request.query_params.get("file_format", CSV)
+        if file_format not in FORMATS:
+            raise ValidationError(
+                {"file_format": [f"Expected one of: {', '.join(FORMATS)}."]}
+            )
+        response = StreamingHttpResponse(
+            write_rows(
+                self.service_class.iter_rows(),
+                file_format,
+                fieldnames=self.service_class.fieldnames,
+            ),
+            content_type=CONTENT_TYPES[file_format],
+        )
+        response[
+            "Content-Disposition"
+        ] = f'attachment; filename="products.{file_format}"'
+        return response
+
+
+class ProductCategoryListCreateAPIView(
+    ReplicaReadMixin, CachedResponseMixin, generics.ListAPIView
+):
     queryset = ProductCategory.objects.all()
     serializer_class = ProductCategoryOutputSerializer
     permission_classes = [StaffOrReadOnly]
 
+    def get_cache_namespaces(self):
+        return [CatalogCacheService.CATALOG, CatalogCacheService.CATEGORY_LIST]
+
     @swagger_auto_schema(request_body=ProductCategoryInputSerializer)
     def post(self, request, *args, **kwargs):
         serializer = ProductCategoryInputSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         category = ProductCategory.objects.create(**serializer.validated_data)
+        CatalogCacheService.invalidate_categories()
         return Response(
             self.get_serializer(category).data, status=status.HTTP_201_CREATED
         )
 
 
-class ProductCategoryDetailAPIView(generics.RetrieveDestroyAPIView):
+class ProductCategoryDetailAPIView(ReplicaReadMixin, generics.RetrieveDestroyAPIView):
     queryset = ProductCategory.objects.all()
     serializer_class = ProductCategoryOutputSerializer
     permission_classes = [StaffOrReadOnly]
 
+    def perform_destroy(self, instance):
+        CatalogCacheService.invalidate_categories([instance.id])
+        instance.delete()
+
 
-class ProductReviewListCreateAPIView(generics.ListAPIView):
+class ProductReviewListCreateAPIView(
+    ReplicaReadMixin, QuerySetOptimizationMixin, generics.ListAPIView
+):
     queryset = ProductReview.objects.all()
     serializer_class = ProductReviewOutputSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filter_backends = [filters.DjangoFilterBackend]
     filterset_class = ReviewFilter
+    pagination_class = CursorOrLimitOffsetPagination
     service_class = ReviewService
+    select_related_fields = ("user",)
 
     @swagger_auto_schema(request_body=ProductReviewInputSerializer)
     def post(self, request, *args, **kwargs):
@@ -122,11 +259,14 @@ class ProductReviewListCreateAPIView(generics.ListAPIView):
         )
 
 
-class ProductReviewDetailAPIView(generics.RetrieveDestroyAPIView):
+class ProductReviewDetailAPIView(
+    ReplicaReadMixin, QuerySetOptimizationMixin, generics.RetrieveDestroyAPIView
+):
     queryset = ProductReview.objects.all()
     serializer_class = ProductReviewOutputSerializer
     permission_classes = [OwnerOrReadOnly]
     service_class = ReviewService
+    select_related_fields = ("user",)
 
     @swagger_auto_schema(request_body=ProductReviewUpdateInputSerializer)
     def put(self, request, *args, **kwargs):
@@ -142,3 +282,8 @@ class ProductReviewDetailAPIView(generics.RetrieveDestroyAPIView):
             self.get_serializer(updated_review).data,
             status=status.HTTP_200_OK,
         )
+
+    def destroy(self, request, *args, **kwargs):
+        instance = self.get_object()
+        self.service_class.delete_review(instance)
+        return Response(status=status.HTTP_204_NO_CONTENT)
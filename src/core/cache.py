@@ -0,0 +1,172 @@
+import hashlib
+import time
+from typing import Iterable, Sequence
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+from src.core.db.router import current_replica, use_primary
+
+
+class ResponseCache:
+    """
+    Read-through cache of serialized GET responses.
+
+    Entries are never deleted one by one. Every key embeds the current
+    version of the namespaces the response depends on (e.g. `products`,
+    `product:<id>`), and invalidating a namespace bumps its version, which
+    makes all entries built against the old version unreachable until they
+    expire. Hits and misses are counted per cached view.
+    """
+
+    key_prefix = "response-cache"
+
+    @classmethod
+    def get_cache(cls):
+        return caches[settings.RESPONSE_CACHE_ALIAS]
+
+    @classmethod
+    def _version_key(cls, namespace: str) -> str:
+        return f"{cls.key_prefix}:version:{namespace}"
+
+    @classmethod
+    def _changed_key(cls, namespace: str) -> str:
+        return f"{cls.key_prefix}:changed:{namespace}"
+
+    @classmethod
+    def _stats_key(cls, name: str, outcome: str) -> str:
+        return f"{cls.key_prefix}:stats:{name}:{outcome}"
+
+    @classmethod
+    def get_versions(cls, namespaces: Sequence[str]) -> list[int]:
+        cache = cls.get_cache()
+        keys = [cls._version_key(namespace) for namespace in namespaces]
+        versions = cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                # a random start value, so entries cached against a version
+                # evicted from the cache are not served again
+                cache.add(key, time.time_ns(), timeout=None)
+                versions[key] = cache.get(key)
+        return [versions[key] for key in keys]
+
+    @classmethod
+    def _bump(cls, namespaces: Iterable[str]) -> None:
+        cache = cls.get_cache()
+        for namespace in namespaces:
+            key = cls._version_key(namespace)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, time.time_ns(), timeout=None)
+
+    @classmethod
+    def invalidate(cls, *namespaces: str) -> None:
+        """
+        Bumps the namespaces immediately and once more after the surrounding
+        transaction commits, so responses cached by concurrent requests
+        from data read before the commit are dropped as well.
+        """
+        namespaces = set(namespaces)
+        if not namespaces:
+            return
+        cls._bump(namespaces)
+        transaction.on_commit(lambda: cls._bump(namespaces))
+        if settings.DATABASE_REPLICAS:
+            transaction.on_commit(lambda: cls._mark_changed(namespaces))
+
+    @classmethod
+    def _mark_changed(cls, namespaces: Iterable[str]) -> None:
+        cls.get_cache().set_many(
+            {cls._changed_key(namespace): True for namespace in namespaces},
+            timeout=settings.REPLICA_STICKY_SECONDS,
+        )
+
+    @classmethod
+    def changed_recently(cls, namespaces: Sequence[str]) -> bool:
+        """
+        Whether any of the namespaces was invalidated in the last
+        REPLICA_STICKY_SECONDS, i.e. replicas may not have the change yet.
+        """
+        keys = [cls._changed_key(namespace) for namespace in namespaces]
+        return bool(cls.get_cache().get_many(keys))
+
+    @classmethod
+    def build_key(cls, name: str, request, role: str, namespaces: Sequence[str]) -> str:
+        query = sorted(
+            (key, value)
+            for key, values in request.query_params.lists()
+            for value in values
+        )
+        fingerprint = hashlib.md5(
+            repr((request.get_host(), request.path, query)).encode("utf-8")
+        ).hexdigest()
+        versions = ".".join(str(version) for version in cls.get_versions(namespaces))
+        return f"{cls.key_prefix}:{name}:{role}:{versions}:{fingerprint}"
+
+    @classmethod
+    def record(cls, name: str, hit: bool) -> None:
+        cache = cls.get_cache()
+        key = cls._stats_key(name, "hits" if hit else "misses")
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+    @classmethod
+    def get_stats(cls, name: str) -> dict[str, int]:
+        cache = cls.get_cache()
+        return {
+            outcome: cache.get(cls._stats_key(name, outcome), 0)
+            for outcome in ("hits", "misses")
+        }
+
+
+class CachedResponseMixin:
+    """
+    Mixin for read-mostly generic views, which serves GET responses from
+    ResponseCache. Views declare the namespaces their output depends on by
+    overriding get_cache_namespaces(). The X-Cache header reports whether
+    the response was a HIT or a MISS.
+
+    Responses missing from the cache are built from the primary instead of
+    a replica while their namespaces were invalidated recently, so that
+    data a replica has not caught up with yet is never cached.
+    """
+
+    cache_name = None
+
+    def get_cache_name(self) -> str:
+        return self.cache_name or self.__class__.__name__
+
+    def get_cache_namespaces(self) -> list[str]:
+        raise NotImplementedError
+
+    def get_cache_role(self) -> str:
+        user = self.request.user
+        if user.is_superuser:
+            return "superuser"
+        if user.is_staff:
+            return "staff"
+        return "public"
+
+    def get(self, request, *args, **kwargs):
+        name = self.get_cache_name()
+        cache = ResponseCache.get_cache()
+        namespaces = self.get_cache_namespaces()
+        key = ResponseCache.build_key(name, request, self.get_cache_role(), namespaces)
+        data = cache.get(key)
+        if data is not None:
+            ResponseCache.record(name, hit=True)
+            return Response(data, headers={"X-Cache": "HIT"})
+
+        ResponseCache.record(name, hit=False)
+        if current_replica() and ResponseCache.changed_recently(namespaces):
+            use_primary()
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+        response["X-Cache"] = "MISS"
+        return response
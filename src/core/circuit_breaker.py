@@ -0,0 +1,86 @@
+import threading
+import time
+from typing import Any, Callable
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a dependency whose circuit is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Per-process circuit breaker around calls to an external dependency.
+
+    After `failure_threshold` consecutive failures (exceptions listed in
+    `failure_exceptions`) the circuit opens and calls fail immediately with
+    CircuitOpenError for `reset_timeout` seconds, instead of tying up a
+    worker until the dependency times out. Then a single trial call is let
+    through: success closes the circuit, failure opens it again. Other
+    exceptions, e.g. invalid requests, pass through without counting.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_timeout: float,
+        failure_exceptions: tuple[type[BaseException], ...] = (Exception,),
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_exceptions = failure_exceptions
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def _before_call(self) -> None:
+        with self._lock:
+            state = self.state
+            if state == self.OPEN or (state == self.HALF_OPEN and self.trial_running):
+                raise CircuitOpenError("Circuit is open.")
+            if state == self.HALF_OPEN:
+                self.trial_running = True
+
+    def _on_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def _on_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+    def call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        self._before_call()
+        try:
+            result = func(*args, **kwargs)
+        except self.failure_exceptions:
+            self._on_failure()
+            raise
+        except BaseException:
+            with self._lock:
+                self.trial_running = False
+            raise
+        self._on_success()
+        return result
+
+    def reset(self) -> None:
+        self._on_success()
@@ -0,0 +1,92 @@
+from functools import partial
+
+from django.db.backends.postgresql import base
+
+from src.core.db.pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL backend with two additions configured in the database
+    settings:
+
+    * `CONN_HEALTH_CHECKS`: a persistent connection reused by a new request
+      is checked with SELECT 1 before its first query and reopened if the
+      server dropped it, instead of failing the request. It is the same
+      option as in Django 4.1, so the setting keeps working after an
+      upgrade. Idle connections taken from the pool are checked as well.
+    * `POOL` (`{"MAX_SIZE": ..., "TIMEOUT": ...}`): connections are taken
+      from a pool shared by the threads of the process instead of being
+      opened per thread, and closing a connection returns it to the pool.
+      Use it with CONN_MAX_AGE = 0, so connections go back to the pool at
+      the end of every request.
+    """
+
+    # the connection was checked or opened during the current request
+    health_check_done = False
+
+    @property
+    def pool(self):
+        options = self.settings_dict.get("POOL")
+        if not options:
+            return None
+        return get_pool(
+            self.alias, max_size=options["MAX_SIZE"], timeout=options["TIMEOUT"]
+        )
+
+    @staticmethod
+    def _check_idle(connection) -> bool:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            if not connection.autocommit:
+                connection.rollback()
+        except base.Database.Error:
+            return False
+        return True
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        connection = pool.getconn(
+            connect=partial(super().get_new_connection, conn_params),
+            check=self._check_idle
+            if self.settings_dict.get("CONN_HEALTH_CHECKS")
+            else None,
+        )
+        options = self.settings_dict["OPTIONS"]
+        self.isolation_level = options.get(
+            "isolation_level", connection.isolation_level
+        )
+        return connection
+
+    def connect(self):
+        self.health_check_done = True
+        super().connect()
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        pool.putconn(self.connection)
+
+    def close_if_health_check_failed(self):
+        if (
+            self.connection is None
+            or self.health_check_done
+            or not self.settings_dict.get("CONN_HEALTH_CHECKS")
+        ):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
+
+    def close_if_unusable_or_obsolete(self):
+        # called when a request starts and finishes
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
@@ -0,0 +1,159 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Optional
+
+from psycopg2 import extensions
+
+
+class PoolTimeout(Exception):
+    """
+    Raised when no connection is returned to a full pool in time.
+    """
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of at most `max_size` connections, shared by the
+    threads of a worker process. Threads wait up to `timeout` seconds for a
+    connection when all of them are in use.
+
+    Connections are handed back in a clean state: an open transaction is
+    rolled back, and connections which are closed or fail the rollback are
+    discarded. No session state is set on checkout, so the pool is safe in
+    front of a transaction-mode PgBouncer.
+    """
+
+    def __init__(self, max_size: int, timeout: float):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = deque()
+        self._size = 0
+        self._condition = threading.Condition()
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def getconn(
+        self,
+        connect: Callable[[], Any],
+        check: Optional[Callable[[Any], bool]] = None,
+    ):
+        """
+        Returns an idle connection, or one opened with `connect` while the
+        pool is not full. Idle connections failing `check` are discarded.
+        """
+        start = time.perf_counter()
+        while True:
+            conn = self._reserve(start)
+            if conn is None:
+                break
+            if check is None or check(conn):
+                return conn
+            self.putconn(conn, close=True)
+        try:
+            return connect()
+        except BaseException:
+            self._discard()
+            raise
+
+    def _reserve(self, start: float):
+        """
+        Waits for an idle connection or a free slot. Returns the idle
+        connection, or None after reserving a slot for a new connection,
+        which is opened outside of the lock.
+        """
+        waited = False
+        with self._condition:
+            while not self._idle and self._size >= self.max_size:
+                waited = True
+                remaining = self.timeout - (time.perf_counter() - start)
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(
+                        f"No connection available within {self.timeout}s."
+                    )
+                self._condition.wait(remaining)
+            self.checkouts += 1
+            if waited:
+                wait_time = time.perf_counter() - start
+                self.waits += 1
+                self.wait_time += wait_time
+                self.max_wait_time = max(self.max_wait_time, wait_time)
+            if self._idle:
+                return self._idle.pop()
+            self._size += 1
+            return None
+
+    def _discard(self) -> None:
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def _is_clean(self, conn) -> bool:
+        if conn.closed:
+            return False
+        try:
+            if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except Exception:
+            return False
+        return True
+
+    def putconn(self, conn, close: bool = False) -> None:
+        if close or not self._is_clean(conn):
+            try:
+                conn.close()
+            finally:
+                self._discard()
+            return
+        with self._condition:
+            self._idle.append(conn)
+            self._condition.notify()
+
+    def closeall(self) -> None:
+        with self._condition:
+            while self._idle:
+                self._idle.pop().close()
+                self._size -= 1
+
+    def stats(self) -> dict[str, Any]:
+        with self._condition:
+            return {
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "wait_time_ms": round(self.wait_time * 1000, 2),
+                "max_wait_time_ms": round(self.max_wait_time * 1000, 2),
+            }
+
+
+_pools: dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias: str, max_size: int, timeout: float) -> ConnectionPool:
+    with _pools_lock:
+        if alias not in _pools:
+            _pools[alias] = ConnectionPool(max_size=max_size, timeout=timeout)
+        return _pools[alias]
+
+
+def get_pool_stats() -> dict[str, dict[str, Any]]:
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.stats() for alias, pool in pools.items()}
+
+
+def close_pools() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.closeall()
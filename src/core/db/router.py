@@ -0,0 +1,119 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class RoutingState:
+    """
+    Routing of the current request: the replica its reads are sent to, if
+    any, whether it has written to the primary, and the depth of atomic
+    blocks the replica was chosen in.
+    """
+
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+        self.atomic_depth = 0
+
+
+def _atomic_depth() -> int:
+    connection = connections[DEFAULT_DB_ALIAS]
+    if not connection.in_atomic_block:
+        return 0
+    # nested atomic blocks add an entry each, savepoint or not
+    return len(connection.savepoint_ids) + 1
+
+
+_state: ContextVar[Optional[RoutingState]] = ContextVar("db_routing", default=None)
+
+
+@contextmanager
+def routing_context() -> Iterator[RoutingState]:
+    state = RoutingState()
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+def use_replica() -> Optional[str]:
+    """
+    Sends the reads of the current request to a randomly chosen replica.
+    Does nothing outside of a routing context, without replicas or once
+    the request has written to the primary.
+    """
+    state = _state.get()
+    if state is None or state.wrote or not settings.DATABASE_REPLICAS:
+        return None
+    if state.replica is None:
+        state.replica = random.choice(settings.DATABASE_REPLICAS)
+        state.atomic_depth = _atomic_depth()
+    return state.replica
+
+
+def use_primary() -> None:
+    state = _state.get()
+    if state is not None:
+        state.replica = None
+
+
+def current_replica() -> Optional[str]:
+    state = _state.get()
+    return None if state is None else state.replica
+
+
+def _pin_key(user) -> str:
+    return f"db-primary-pin:{user.pk}"
+
+
+def pin_to_primary(user) -> None:
+    """
+    Sends the reads of the user to the primary for REPLICA_STICKY_SECONDS,
+    so they see their own writes before the replicas catch up.
+    """
+    caches[settings.REPLICA_PIN_CACHE_ALIAS].set(
+        _pin_key(user), True, timeout=settings.REPLICA_STICKY_SECONDS
+    )
+
+
+def is_pinned_to_primary(user) -> bool:
+    if not user.is_authenticated:
+        return False
+    return caches[settings.REPLICA_PIN_CACHE_ALIAS].get(_pin_key(user), False)
+
+
+class ReplicaRouter:
+    """
+    Sends reads to the replica chosen for the current request by
+    use_replica(), and everything else to the primary. Reads stay on the
+    primary inside transactions opened after the replica was chosen and
+    after the request wrote anything, so a request always sees its own
+    writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.replica is None or state.wrote:
+            return None
+        if _atomic_depth() > state.atomic_depth:
+            return None
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,29 @@
+from django.db import connections
+from rest_framework import permissions, views
+from rest_framework.response import Response
+
+from src.core.db.pool import get_pool_stats
+
+
+class DatabaseStatsView(views.APIView):
+    """
+    Returns the connection settings of every database and the statistics of
+    the connection pools of the worker process handling the request.
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        pools = get_pool_stats()
+        return Response(
+            {
+                alias: {
+                    "conn_max_age": connections[alias].settings_dict["CONN_MAX_AGE"],
+                    "conn_health_checks": connections[alias].settings_dict.get(
+                        "CONN_HEALTH_CHECKS", False
+                    ),
+                    "pool": pools.get(alias),
+                }
+                for alias in connections
+            }
+        )
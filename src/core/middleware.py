@@ -0,0 +1,160 @@
+import logging
+import random
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from src.core.db.router import pin_to_primary, routing_context
+
+logger = logging.getLogger(__name__)
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper counting queries and their duration. Queries
+    are grouped by their SQL before parameters are bound, so the same
+    statement run in a loop (an N+1 pattern) shows up as one group.
+    Parameters are never kept, so no request data ends up in the logs.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = defaultdict(lambda: [0, 0.0])
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            statement = self.statements[sql]
+            statement[0] += 1
+            statement[1] += duration
+
+    def duplicates(self, threshold: int) -> dict[str, int]:
+        return {
+            sql: count
+            for sql, (count, _) in self.statements.items()
+            if count >= threshold
+        }
+
+    def slowest(self, limit: int) -> list[dict]:
+        statements = sorted(
+            self.statements.items(), key=lambda item: item[1][1], reverse=True
+        )
+        return [
+            {"sql": sql, "count": count, "duration_ms": round(duration * 1000, 2)}
+            for sql, (count, duration) in statements[:limit]
+        ]
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Records the number and duration of database queries, the view time and
+    the total time of every request. Results are reported in three ways:
+
+    * a `Server-Timing` response header (db, view and total durations),
+      when SERVER_TIMING_HEADER is on, and then only for staff users unless
+      DEBUG is on, as the timings tell how expensive a request is,
+    * an INFO log record per request with the numbers as structured fields,
+    * a WARNING log record with the slowest statements for requests slower
+      than SLOW_REQUEST_THRESHOLD, sampled at SLOW_REQUEST_SAMPLE_RATE.
+      Statements repeated DUPLICATE_QUERY_THRESHOLD times or more in one
+      request are logged as a WARNING as well.
+
+    Queries run while a streaming response body is consumed happen after
+    the middleware returns and are not recorded.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.REQUEST_INSTRUMENTATION:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        request._view_started = None
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        end = time.perf_counter()
+
+        timings = {
+            "duration_ms": round((end - start) * 1000, 2),
+            "view_ms": round((end - (request._view_started or start)) * 1000, 2),
+            "db_ms": round(recorder.duration * 1000, 2),
+            "queries": recorder.count,
+        }
+        if self.sends_timings(request):
+            response["Server-Timing"] = (
+                'db;dur={db_ms};desc="{queries} queries", view;dur={view_ms}, '
+                "total;dur={duration_ms}".format(**timings)
+            )
+        self.report(request, response, recorder, timings)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._view_started = time.perf_counter()
+
+    def sends_timings(self, request) -> bool:
+        if not settings.SERVER_TIMING_HEADER:
+            return False
+        # set by the authentication of the view, also for token auth
+        user = getattr(request, "user", None)
+        return settings.DEBUG or getattr(user, "is_staff", False)
+
+    def report(self, request, response, recorder, timings) -> None:
+        route = getattr(request.resolver_match, "route", None)
+        fields = {
+            "method": request.method,
+            "path": request.path,
+            "route": route,
+            "status": response.status_code,
+            **timings,
+        }
+        logger.info("request", extra=fields)
+
+        duplicates = recorder.duplicates(settings.DUPLICATE_QUERY_THRESHOLD)
+        if duplicates:
+            logger.warning(
+                "duplicate queries",
+                extra={**fields, "duplicates": duplicates},
+            )
+        if (
+            timings["duration_ms"] >= settings.SLOW_REQUEST_THRESHOLD
+            and random.random() < settings.SLOW_REQUEST_SAMPLE_RATE
+        ):
+            logger.warning(
+                "slow request",
+                extra={**fields, "statements": recorder.slowest(limit=5)},
+            )
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Opens the database routing context of every request (see
+    src.core.db.router). Views opt in to reading from a replica, and users
+    whose request wrote to the primary are pinned to it for
+    REPLICA_STICKY_SECONDS.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with routing_context() as state:
+            response = self.get_response(request)
+        if state.wrote and settings.DATABASE_REPLICAS:
+            user = getattr(request, "user", None)
+            if user is not None and user.is_authenticated:
+                pin_to_primary(user)
+        return response
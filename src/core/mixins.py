@@ -0,0 +1,94 @@
+from typing import Sequence, Union
+
+from django.conf import settings
+from django.db.models import Prefetch, QuerySet
+from rest_framework import permissions
+from rest_framework.response import Response
+
+from src.core.db.router import is_pinned_to_primary, use_replica
+from src.core.serializers import SerializerNotCompilable, compile_serializer
+
+
+class QuerySetOptimizationMixin:
+    """
+    Mixin for generic views, which applies the select_related/prefetch_related
+    plan declared by the view to the queryset returned by get_queryset().
+
+    Views should list every relation their output serializer touches, so that
+    serializing a page costs a constant number of queries. Views overriding
+    get_queryset() should start from super().get_queryset() instead of
+    self.queryset to keep the plan applied.
+    """
+
+    select_related_fields: Sequence[str] = ()
+    prefetch_related_fields: Sequence[Union[str, Prefetch]] = ()
+
+    def optimize_queryset(self, queryset: QuerySet) -> QuerySet:
+        if self.select_related_fields:
+            queryset = queryset.select_related(*self.select_related_fields)
+        if self.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*self.prefetch_related_fields)
+        return queryset
+
+    def get_queryset(self):
+        return self.optimize_queryset(super().get_queryset())
+
+
+class ReplicaReadMixin:
+    """
+    Mixin for API views, which serves GET, HEAD and OPTIONS requests from a
+    read replica. Users who wrote anything in the last
+    REPLICA_STICKY_SECONDS keep reading from the primary. The user is
+    authenticated against the primary before the replica is chosen.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            settings.DATABASE_REPLICAS
+            and request.method in permissions.SAFE_METHODS
+            and not is_pinned_to_primary(request.user)
+        ):
+            use_replica()
+
+
+class ValuesSerializationMixin:
+    """
+    Mixin for list views, which serializes the listed page from values()
+    rows with the compiled output serializer (src.core.serializers) when
+    FAST_SERIALIZATION is on, instead of building model instances and
+    running the serializer on them. Serializers which cannot be compiled and
+    views listing something else than a queryset use the serializer as is.
+
+    Fields read from the rows by the paginator besides the serialized ones,
+    e.g. `created` of cursor pagination, are listed in values_extra_fields.
+    """
+
+    values_extra_fields: Sequence[str] = ()
+
+    def get_compiled_serializer(self):
+        if not settings.FAST_SERIALIZATION:
+            return None
+        try:
+            return compile_serializer(self.get_serializer_class())
+        except SerializerNotCompilable:
+            return None
+
+    def list(self, request, *args, **kwargs):
+        compiled = self.get_compiled_serializer()
+        if compiled is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if isinstance(queryset, QuerySet):
+            queryset = compiled.values(queryset, *self.values_extra_fields)
+            serialize = compiled.serialize
+        else:
+            # e.g. carts of the cache storage, serialized like ListModelMixin
+            def serialize(objects):
+                return self.get_serializer(objects, many=True).data
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serialize(page))
+        return Response(serialize(queryset))
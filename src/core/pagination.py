@@ -0,0 +1,76 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+
+class CreatedCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (created, id). Every page is an index range scan
+    on a composite index, so deep pages cost the same as the first one and no
+    COUNT(*) is issued.
+    """
+
+    ordering = ("-created", "-id")
+    page_size_query_param = "limit"
+    max_page_size = 100
+
+
+class CursorOrLimitOffsetPagination(LimitOffsetPagination):
+    """
+    Opt-in pagination for large lists. Keeps the limit/offset envelope
+    (count, next, previous, results) by default and switches to cursor
+    pagination when the request passes `cursor` or `pagination=cursor`.
+    Links returned in cursor mode carry the cursor, so clients only opt in
+    on the first request. Cursor pages are always ordered by (-created, -id),
+    so requests combining cursor mode with any other ordering of the
+    queryset (e.g. set by a filter) are rejected with 400 instead of being
+    silently re-ordered.
+    """
+
+    mode_query_param = "pagination"
+    cursor_mode = "cursor"
+    cursor_pagination_class = CreatedCursorPagination
+
+    def use_cursor(self, request) -> bool:
+        cursor_query_param = self.cursor_pagination_class.cursor_query_param
+        return (
+            cursor_query_param in request.query_params
+            or request.query_params.get(self.mode_query_param) == self.cursor_mode
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.use_cursor(request):
+            ordering = tuple(queryset.query.order_by)
+            if ordering and ordering != tuple(self.cursor_pagination_class.ordering):
+                raise ValidationError(
+                    {
+                        self.mode_query_param: "Cursor pagination only supports "
+                        "the default ordering, use limit/offset pagination."
+                    }
+                )
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        if not queryset.ordered:
+            queryset = queryset.order_by(*self.cursor_pagination_class.ordering)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_fields(self, view):
+        return super().get_schema_fields(view) + [
+            field
+            for field in self.cursor_pagination_class().get_schema_fields(view)
+            if field.name == self.cursor_pagination_class.cursor_query_param
+        ]
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            parameter
+            for parameter in self.cursor_pagination_class().get_schema_operation_parameters(
+                view
+            )
+            if parameter["name"] == self.cursor_pagination_class.cursor_query_param
+        ]
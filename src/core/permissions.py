@@ -51,18 +51,18 @@ class OwnerOrAdmin(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.user.is_superuser:
             return True
-        return obj.user == request.user
+        return obj.user_id == request.user.pk
 
 
 class CartOwnerOrAdmin(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.user.is_superuser:
             return True
-        return obj.cart.user == request.user
+        return obj.cart.user_id == request.user.pk
 
 
 class OwnerOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         return bool(
-            request.method in permissions.SAFE_METHODS or request.user == obj.user
+            request.method in permissions.SAFE_METHODS or obj.user_id == request.user.pk
         )
@@ -0,0 +1,117 @@
+import datetime
+import uuid
+from decimal import Decimal
+
+from django.utils.functional import Promise
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# values encoded the same way by orjson, directly or through the encoder of
+# JSONRenderer, and holding no other values
+_PLAIN_TYPES = (
+    str,
+    int,
+    type(None),
+    datetime.date,
+    datetime.time,
+    datetime.timedelta,
+    uuid.UUID,
+    Promise,
+)
+
+
+def _formats_like_json(data) -> bool:
+    """
+    Whether orjson writes every number in `data` the way the json module
+    does. Both write the shortest repr of a float, but below 1e-4 and from
+    1e16 on the json module writes 1e-05 and 1e+16 where orjson writes
+    0.00001 and 1e16, and orjson writes NaN and infinities as null.
+    Decimals are floats in JSON. Data holding values of other types is not
+    checked further and counts as different.
+    """
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, _PLAIN_TYPES):
+            continue
+        if isinstance(value, dict):
+            stack.extend(value)
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+        elif isinstance(value, (float, Decimal)):
+            number = abs(float(value))
+            if number and not 1e-4 <= number < 1e16:
+                return False
+        else:
+            return False
+    return True
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    """
+    JSONRenderer encoding with orjson, rendering the same bytes. Values
+    orjson does not encode the way JSONRenderer does (datetimes, decimals,
+    lazy strings, ...) go through the encoder of JSONRenderer. Data with
+    numbers orjson formats differently (see _formats_like_json()), indented
+    output, non-compact or ASCII-only settings and data orjson rejects
+    (e.g. integers over 64 bits) are rendered by JSONRenderer, and so is
+    everything when orjson is not installed.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        renderer_context = renderer_context or {}
+        if (
+            orjson is None
+            or not self.compact
+            or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context)
+            or not _formats_like_json(data)
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # same escaping as JSONRenderer, see its render()
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """
+    Renders MessagePack for clients sending `Accept: application/msgpack`.
+    Values without a MessagePack type are converted like in JSON responses.
+    Requires the optional msgpack package.
+    """
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+    encoder_class = encoders.JSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(
+            data, default=self.encoder_class().default, use_bin_type=True
+        )
@@ -0,0 +1,388 @@
+import inspect
+from functools import lru_cache
+from typing import Any, Callable, Iterable, Optional
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Model, QuerySet
+from rest_framework import fields, serializers
+from rest_framework.fields import empty
+
+Row = dict[str, Any]
+
+
+class SerializerNotCompilable(Exception):
+    """
+    Raised for serializers using fields compile_serializer() cannot turn
+    into a function over values() rows. Callers fall back to the serializer.
+    """
+
+
+def _converter(field: fields.Field) -> Callable[[Any], Any]:
+    # exact types only, subclasses may override to_representation()
+    field_type = type(field)
+    if field_type is fields.ReadOnlyField:
+        return lambda value: value
+    if field_type is fields.CharField:
+        return str
+    if field_type is fields.IntegerField:
+        return int
+    if field_type is fields.FloatField:
+        return float
+    if field_type is fields.UUIDField and field.uuid_format == "hex_verbose":
+        return str
+    return field.to_representation
+
+
+@lru_cache(maxsize=None)
+def _row_class(model: type[Model]) -> type:
+    """
+    Plain class carrying the properties of the model and the methods of its
+    classes they may call, so they can be evaluated on values of a row
+    without building model instances.
+    """
+    attrs = {}
+    for klass in reversed(model.__mro__):
+        for name, attr in vars(klass).items():
+            if isinstance(attr, property) or (
+                inspect.isfunction(attr)
+                and klass not in Model.__mro__
+                and not name.startswith("__")
+            ):
+                attrs[name] = attr
+    return type(f"{model.__name__}Row", (), attrs)
+
+
+class _RowList:
+    """
+    Stands for the related manager of a reverse relation on a row object,
+    holding the row objects of the related rows like a prefetch would.
+    """
+
+    def __init__(self, objects: list):
+        self._objects = objects
+
+    def all(self) -> list:
+        return self._objects
+
+
+def _object_builder(
+    model: type[Model], prefix: str, paths: Iterable[str]
+) -> Callable[[Row], Any]:
+    """
+    Returns a function building a row object of the model, with nested row
+    objects for its relations, from the values stored under `prefix`. A
+    relation is None when the primary key of the related row is None.
+    """
+    attrs = {}
+    relations = {}
+    for path in paths:
+        name, _, rest = path.partition("__")
+        if rest:
+            relations.setdefault(name, []).append(rest)
+        else:
+            attrs[name] = prefix + path
+    builders = {}
+    for name, rest in relations.items():
+        related_model = model._meta.get_field(name).related_model
+        builders[name] = (
+            f"{prefix}{name}__{related_model._meta.pk.attname}",
+            _object_builder(related_model, f"{prefix}{name}__", rest),
+        )
+    row_class = _row_class(model)
+
+    def build(row: Row) -> Any:
+        obj = row_class()
+        for name, key in attrs.items():
+            setattr(obj, name, row[key])
+        for name, (pk_key, builder) in builders.items():
+            setattr(obj, name, None if row[pk_key] is None else builder(row))
+        return obj
+
+    return build
+
+
+def _with_relation_keys(model: type[Model], paths: Iterable[str]) -> list[str]:
+    """
+    Adds the primary key of every relation the values() paths go through,
+    _object_builder() reads them to tell missing related rows.
+    """
+    result = []
+    for path in paths:
+        related_model = model
+        attrs = path.split("__")
+        for index, attr in enumerate(attrs[:-1]):
+            related_model = related_model._meta.get_field(attr).related_model
+            result.append(
+                "__".join([*attrs[: index + 1], related_model._meta.pk.attname])
+            )
+        result.append(path)
+    return list(dict.fromkeys(result))
+
+
+class _Level:
+    """
+    Compiles a (nested) serializer into a function building its output from
+    the values stored under `prefix` in a row.
+    """
+
+    def __init__(self, serializer: serializers.Serializer, model, prefix: str):
+        self.model = model
+        self.prefix = prefix
+        self.paths: list[str] = []
+        self.field_paths: list[str] = []
+        self.annotations: list[str] = []
+        self.getters: list[tuple[str, Callable[[Row, Any], Any]]] = []
+        # (source, row key, foreign key, compiled child) of nested lists
+        self.lists: list[tuple[str, str, str, CompiledSerializer]] = []
+        self.build = None
+
+        uses_properties = False
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                getter = self._list(field)
+            elif isinstance(field, serializers.BaseSerializer):
+                getter = self._nested(field)
+            else:
+                getter, is_property = self._field(field)
+                uses_properties = uses_properties or is_property
+            self.getters.append((name, getter))
+
+        if uses_properties:
+            dependencies = getattr(serializer.Meta, "values_dependencies", None)
+            if dependencies is None:
+                raise SerializerNotCompilable(
+                    f"{type(serializer).__name__} uses model properties "
+                    "without declaring Meta.values_dependencies."
+                )
+            object_paths = _with_relation_keys(
+                model, dict.fromkeys([*self.field_paths, *dependencies])
+            )
+            self._add_keys(self.prefix + path for path in object_paths)
+            self.build = _object_builder(model, prefix, object_paths)
+
+    def _add_keys(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            if key not in self.paths:
+                self.paths.append(key)
+
+    def _resolve(self, source_attrs: list[str]):
+        """
+        Follows the to-one relations in `source_attrs` and returns the
+        model and field the last attribute refers to, if any.
+        """
+        model = self.model
+        for attr in source_attrs[:-1]:
+            try:
+                field = model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                raise SerializerNotCompilable(f"{attr} is not a field of {model}.")
+            if not (field.many_to_one or field.one_to_one):
+                raise SerializerNotCompilable(f"{attr} is not a to-one relation.")
+            model = field.related_model
+        try:
+            return model, model._meta.get_field(source_attrs[-1])
+        except FieldDoesNotExist:
+            return model, None
+
+    def _list(self, serializer) -> Callable[[Row, Any], Any]:
+        if self.prefix or serializer.source == "*" or len(serializer.source_attrs) > 1:
+            raise SerializerNotCompilable(
+                f"{serializer.field_name} is not a list of the serialized rows."
+            )
+        _, relation = self._resolve(serializer.source_attrs)
+        if relation is None or not relation.one_to_many:
+            raise SerializerNotCompilable(f"{serializer.field_name} is not to-many.")
+        child = CompiledSerializer(type(serializer.child), relation.related_model)
+        key = f"{serializer.field_name}[]"
+        self.lists.append((serializer.source, key, relation.field.attname, child))
+        self._add_keys([self.model._meta.pk.attname])
+
+        def get(row, obj):
+            return [representation for representation, _ in row[key]]
+
+        return get
+
+    def _nested(self, serializer) -> Callable[[Row, Any], Any]:
+        if serializer.source == "*":
+            raise SerializerNotCompilable(f"{serializer.field_name} is not to-one.")
+        _, relation = self._resolve(serializer.source_attrs)
+        if relation is None or not (relation.many_to_one or relation.one_to_one):
+            raise SerializerNotCompilable(f"{serializer.field_name} is not to-one.")
+        path = "__".join(serializer.source_attrs)
+        related_model = relation.related_model
+        nested = _Level(serializer, related_model, f"{self.prefix}{path}__")
+        if nested.annotations:
+            raise SerializerNotCompilable("Nested annotations are not supported.")
+        pk_key = f"{self.prefix}{path}__{related_model._meta.pk.attname}"
+        self._add_keys([pk_key, *nested.paths])
+        represent = nested.represent
+
+        def get(row, obj):
+            return None if row[pk_key] is None else represent(row)
+
+        return get
+
+    def _field(self, field: fields.Field) -> tuple[Callable[[Row, Any], Any], bool]:
+        """
+        Returns the getter of the field and whether it reads a property.
+        """
+        if field.source == "*" or isinstance(
+            field, (serializers.RelatedField, serializers.ManyRelatedField)
+        ):
+            raise SerializerNotCompilable(f"{field.field_name} is not a plain field.")
+        convert = _converter(field)
+        model, model_field = self._resolve(field.source_attrs)
+        key = self.prefix + "__".join(field.source_attrs)
+
+        if model_field is not None:
+            if model_field.is_relation:
+                raise SerializerNotCompilable(f"{field.field_name} is a relation.")
+            self.field_paths.append("__".join(field.source_attrs))
+            self._add_keys([key])
+
+            def get(row, obj):
+                value = row[key]
+                return None if value is None else convert(value)
+
+            return get, False
+
+        attr = getattr(model, field.source_attrs[-1], None)
+        if len(field.source_attrs) == 1 and isinstance(attr, property):
+            fget = attr.fget
+
+            def get(row, obj):
+                value = fget(obj)
+                return None if value is None else convert(value)
+
+            return get, True
+
+        if len(field.source_attrs) == 1 and field.default is not empty:
+            # an annotation, only present on some querysets
+            self.annotations.append(key)
+            default = field.get_default()
+
+            def get(row, obj):
+                value = row.get(key, default)
+                return None if value is None else convert(value)
+
+            return get, False
+
+        raise SerializerNotCompilable(f"{field.field_name} has an unknown source.")
+
+    def represent_with_object(self, row: Row) -> tuple[dict[str, Any], Any]:
+        """
+        Returns the output and the row object built for the properties.
+        """
+        obj = self.build(row) if self.build is not None else None
+        if obj is not None and self.lists:
+            obj._prefetched_objects_cache = {}
+            for source, key, _, _ in self.lists:
+                related = _RowList([related_obj for _, related_obj in row[key]])
+                setattr(obj, source, related)
+                obj._prefetched_objects_cache[source] = related
+        return {name: get(row, obj) for name, get in self.getters}, obj
+
+    def represent(self, row: Row) -> dict[str, Any]:
+        return self.represent_with_object(row)[0]
+
+
+class CompiledSerializer:
+    """
+    Output of a read-only serializer computed from values() rows: model
+    fields are read from the row, nested to-one serializers from the values
+    of the joined rows and model properties are evaluated on a plain object
+    built from the row. Nested lists over reverse foreign keys are read in
+    one values() query per list for all the rows, in the order of
+    Meta.values_ordering of the nested serializer (the primary key by
+    default), and their row objects are set on the row object like a
+    prefetch. The output is equal to serializer.data of the instances the
+    rows were read from, with the nested lists prefetched in that order.
+    """
+
+    def __init__(self, serializer_class, model: type[Model]):
+        self.serializer_class = serializer_class
+        self.model = model
+        self.ordering = getattr(
+            serializer_class.Meta, "values_ordering", (model._meta.pk.name,)
+        )
+        self._root = _Level(serializer_class(), model, "")
+
+    def values(self, queryset: QuerySet, *extra_fields: str) -> QuerySet:
+        """
+        Returns the queryset as values() rows carrying every value the
+        serializer reads, plus `extra_fields`, e.g. fields a paginator
+        reads from the rows.
+        """
+        annotations = [
+            name
+            for name in self._root.annotations
+            if name in queryset.query.annotations
+        ]
+        paths = dict.fromkeys([*self._root.paths, *annotations, *extra_fields])
+        return queryset.prefetch_related(None).values(*paths)
+
+    def to_representation(self, row: Row) -> dict[str, Any]:
+        return self._root.represent(row)
+
+    def _add_lists(self, rows: list[Row]) -> None:
+        """
+        Stores the (output, row object) pairs of the nested lists of every
+        row under the keys of the lists.
+        """
+        pk_key = self.model._meta.pk.attname
+        pks = [row[pk_key] for row in rows]
+        for _, key, foreign_key, child in self._root.lists:
+            related: dict[Any, list] = {}
+            if pks:
+                queryset = child.model._default_manager.filter(
+                    **{f"{foreign_key}__in": pks}
+                ).order_by(*child.ordering)
+                child_rows = list(child.values(queryset, foreign_key))
+                child._add_lists(child_rows)
+                for child_row in child_rows:
+                    related.setdefault(child_row[foreign_key], []).append(
+                        child._root.represent_with_object(child_row)
+                    )
+            for row in rows:
+                row[key] = related.get(row[pk_key], [])
+
+    def serialize(self, rows: Iterable[Row]) -> list[dict[str, Any]]:
+        if self._root.lists:
+            rows = list(rows)
+            self._add_lists(rows)
+        represent = self._root.represent
+        return [represent(row) for row in rows]
+
+
+@lru_cache(maxsize=None)
+def _compile(serializer_class, model) -> Optional[CompiledSerializer]:
+    try:
+        return CompiledSerializer(serializer_class, model)
+    except SerializerNotCompilable:
+        return None
+
+
+def compile_serializer(
+    serializer_class, model: Optional[type[Model]] = None
+) -> CompiledSerializer:
+    """
+    Compiles a read-only ModelSerializer of `model` (Meta.model by default)
+    into a CompiledSerializer, once per process. Supports model fields,
+    fields of to-one relations (`source="product.name"`), nested to-one
+    serializers, nested lists of reverse foreign keys at the top level,
+    model properties and annotations with a default. Fields of the row
+    objects the properties read besides the serialized fields are declared
+    in Meta.values_dependencies as values() paths.
+
+    Raises SerializerNotCompilable for anything else, e.g. nested lists
+    inside nested serializers, method fields or related fields.
+    """
+    model = model or serializer_class.Meta.model
+    compiled = _compile(serializer_class, model)
+    if compiled is None:
+        raise SerializerNotCompilable(
+            f"{serializer_class.__name__} cannot be compiled for {model.__name__}."
+        )
+    return compiled
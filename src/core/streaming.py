@@ -0,0 +1,118 @@
+import csv
+import io
+import json
+from itertools import islice
+from typing import Any, Iterable, Iterator, Sequence, Union
+
+CSV = "csv"
+JSONL = "jsonl"
+FORMATS = (CSV, JSONL)
+CONTENT_TYPES = {CSV: "text/csv", JSONL: "application/x-ndjson"}
+
+
+def guess_format(filename: str, default: str = CSV) -> str:
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if extension in ("jsonl", "ndjson"):
+        return JSONL
+    if extension == CSV:
+        return CSV
+    return default
+
+
+def batched(iterable: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def flatten(data: dict[str, Any], prefix: str = "") -> dict[str, Any]:
+    """
+    Flattens nested dicts into dotted keys, e.g. {"category": {"name": "x"}}
+    into {"category.name": "x"}, so they fit a single CSV row.
+    """
+    flat = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix=f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def unflatten(data: dict[str, Any]) -> dict[str, Any]:
+    nested = {}
+    for key, value in data.items():
+        *parents, name = key.split(".")
+        target = nested
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[name] = value
+    return nested
+
+
+def read_rows(
+    stream: Iterable[str], file_format: str
+) -> Iterator[tuple[int, Union[dict[str, Any], ValueError]]]:
+    """
+    Lazily parses a text stream into (row number, nested dict) pairs. CSV
+    columns use dotted names for nested fields and empty cells are treated
+    as missing values. Lines which cannot be parsed are yielded with a
+    ValueError in place of the dict, so one bad line does not stop the
+    whole stream.
+    """
+    if file_format == JSONL:
+        for row_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as err:
+                row = ValueError(f"Invalid JSON: {err}")
+            if not isinstance(row, (dict, ValueError)):
+                row = ValueError("Expected a JSON object.")
+            yield row_number, row
+        return
+
+    reader = csv.DictReader(stream)
+    for row in reader:
+        # the header is line 1, rows are numbered as in the file
+        yield reader.line_num, unflatten(
+            {
+                key: value
+                for key, value in row.items()
+                if key and value not in ("", None)
+            }
+        )
+
+
+class _Echo:
+    """
+    File-like object whose write() returns the written value, which lets the
+    csv module produce lines one at a time for a streaming response.
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def write_rows(
+    rows: Iterable[dict[str, Any]], file_format: str, fieldnames: Sequence[str]
+) -> Iterator[str]:
+    """
+    Lazily renders nested dicts as CSV lines (with dotted column names) or
+    JSON lines, without holding more than one row in memory.
+    """
+    if file_format == JSONL:
+        for row in rows:
+            yield json.dumps(row, default=str) + "\n"
+        return
+
+    writer = csv.DictWriter(_Echo(), fieldnames=fieldnames, extrasaction="ignore")
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(flatten(row))
+
+
+def open_text(binary_stream, encoding: str = "utf-8") -> io.TextIOWrapper:
+    # newline="" is required by the csv module to handle quoted line breaks
+    return io.TextIOWrapper(binary_stream, encoding=encoding, newline="")
@@ -7,6 +7,11 @@ base_settings = [
     "stripe.py",
     "drf.py",
     "swagger.py",
+    "email.py",
+    "cache.py",
+    "products.py",
+    "orders.py",
+    "monitoring.py",
 ]
 
 
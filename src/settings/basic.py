@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 import os
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parents[2]
@@ -36,6 +36,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # 3rd party
     "rest_framework",
     "rest_framework.authtoken",
@@ -53,9 +54,12 @@ INSTALLED_APPS = [
     "src.apps.products",
     "src.apps.orders",
     "src.apps.payments",
+    "src.apps.notifications",
 ]
 
 MIDDLEWARE = [
+    "src.core.middleware.RequestInstrumentationMiddleware",
+    "src.core.middleware.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -90,17 +94,60 @@ WSGI_APPLICATION = "src.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
+# Connections are kept open for DB_CONN_MAX_AGE seconds and checked before
+# being reused by a new request. With DB_POOL, connections are shared by the
+# threads of a worker through a pool of DB_POOL_MAX_SIZE connections and go
+# back to it at the end of every request. DB_PGBOUNCER disables server-side
+# cursors, which do not survive transaction-mode PgBouncer.
+DB_POOL = config("DB_POOL", default=False, cast=bool)
+DB_PGBOUNCER = config("DB_PGBOUNCER", default=False, cast=bool)
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        "ENGINE": "src.core.db",
         "HOST": config("POSTGRES_HOST"),
         "PORT": config("POSTGRES_PORT", cast=int),
         "USER": config("POSTGRES_USER"),
         "PASSWORD": config("POSTGRES_PASSWORD"),
         "NAME": config("POSTGRES_DB"),
+        "CONN_MAX_AGE": 0
+        if DB_POOL
+        else config("DB_CONN_MAX_AGE", default=60, cast=int),
+        "CONN_HEALTH_CHECKS": config("DB_CONN_HEALTH_CHECKS", default=True, cast=bool),
+        "POOL": {
+            "MAX_SIZE": config("DB_POOL_MAX_SIZE", default=10, cast=int),
+            "TIMEOUT": config("DB_POOL_TIMEOUT", default=5.0, cast=float),
+        }
+        if DB_POOL
+        else None,
+        "DISABLE_SERVER_SIDE_CURSORS": DB_PGBOUNCER,
     }
 }
 
+# Read replicas as comma separated `host` or `host:port` entries, with the
+# credentials and database name of the primary. Safe-method requests of the
+# catalog views read from them (src.core.db.router), except for users who
+# wrote anything in the last REPLICA_STICKY_SECONDS. Listing the primary's
+# own host creates a replica alias pointing at the primary.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(
+    config("POSTGRES_REPLICA_HOSTS", default="", cast=Csv()), start=1
+):
+    host, _, port = replica.partition(":")
+    DATABASES[f"replica_{index}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": int(port) if port else DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica_{index}")
+
+DATABASE_ROUTERS = ["src.core.db.router.ReplicaRouter"]
+REPLICA_STICKY_SECONDS = config("REPLICA_STICKY_SECONDS", default=10, cast=int)
+# the cache must be shared by the workers (REDIS_URL) for pins to hold
+# across them, settings/cache.py refuses a local-memory cache outside DEBUG
+REPLICA_PIN_CACHE_ALIAS = "default"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -147,6 +194,4 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'images')
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
-EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
-
 PHONENUMBER_DEFAULT_REGION = "PL"
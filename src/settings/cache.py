@@ -0,0 +1,58 @@
+from decouple import config
+from django.core.exceptions import ImproperlyConfigured
+
+# Local-memory cache by default, for DEBUG only. Set REDIS_URL (e.g.
+# redis://redis:6379/0) to share the cache between workers.
+REDIS_URL = config("REDIS_URL", default="")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        },
+        "carts": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "carts",
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "ecommapi",
+        },
+        # carts must not be culled like cached responses
+        "carts": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "ecommapi-carts",
+            "OPTIONS": {"MAX_ENTRIES": 1_000_000},
+        },
+    }
+
+# Read-through cache of public catalog responses (src.core.cache)
+RESPONSE_CACHE_ALIAS = "default"
+RESPONSE_CACHE_TIMEOUT = config("RESPONSE_CACHE_TIMEOUT", default=300, cast=int)
+
+# A write pins the reads of the user to the primary through the
+# REPLICA_PIN_CACHE_ALIAS cache (src.core.db.router). In a local-memory
+# cache the pin only holds in the worker process which handled the write,
+# so outside of DEBUG the workers must share the cache (REDIS_URL).
+if (
+    DATABASE_REPLICAS
+    and CACHES[REPLICA_PIN_CACHE_ALIAS]["BACKEND"].endswith(".LocMemCache")
+    and not DEBUG
+):
+    raise ImproperlyConfigured(
+        "Read replicas need a cache shared by the workers, set REDIS_URL."
+    )
+
+# Invalidating cached responses bumps versions in the RESPONSE_CACHE_ALIAS
+# cache (src.core.cache). In a local-memory cache only the worker process
+# which handled the write sees the bump, the others keep serving stale
+# responses until they expire.
+if CACHES[RESPONSE_CACHE_ALIAS]["BACKEND"].endswith(".LocMemCache") and not DEBUG:
+    raise ImproperlyConfigured(
+        "Cached responses need a cache shared by the workers, set REDIS_URL."
+    )
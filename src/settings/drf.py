@@ -1,13 +1,37 @@
 from datetime import timedelta
+from importlib.util import find_spec
+
+from decouple import config
+
+# Builds request.user from the JWT claims without loading the user row
+# (src.apps.accounts.authentication).
+JWT_STATELESS_AUTHENTICATION = config(
+    "JWT_STATELESS_AUTHENTICATION", default=True, cast=bool
+)
+
+# Lists of views with ValuesSerializationMixin are serialized from values()
+# rows by compiled output serializers (src.core.serializers).
+FAST_SERIALIZATION = config("FAST_SERIALIZATION", default=False, cast=bool)
+
+DEFAULT_RENDERER_CLASSES = [
+    "src.core.renderers.ORJSONRenderer",
+    "rest_framework.renderers.BrowsableAPIRenderer",
+]
+# msgpack is optional, without it application/msgpack is not acceptable
+if find_spec("msgpack") is not None:
+    DEFAULT_RENDERER_CLASSES.append("src.core.renderers.MessagePackRenderer")
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "dj_rest_auth.jwt_auth.JWTCookieAuthentication",
+        "src.apps.accounts.authentication.StatelessJWTCookieAuthentication"
+        if JWT_STATELESS_AUTHENTICATION
+        else "dj_rest_auth.jwt_auth.JWTCookieAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
     ],
+    "DEFAULT_RENDERER_CLASSES": DEFAULT_RENDERER_CLASSES,
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
     "PAGE_SIZE": 10,
     "DEFAULT_PERMISSION_CLASSES": ["rest_framework.permissions.IsAuthenticated"],
@@ -17,7 +41,18 @@ REST_FRAMEWORK = {
 
 REST_USE_JWT = True
 
+REST_AUTH_SERIALIZERS = {
+    "JWT_TOKEN_CLAIMS_SERIALIZER": "src.apps.accounts.serializers.TokenClaimsSerializer",
+}
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=5),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
 }
+
+# Revocations are shared by the workers only through a shared cache
+# (REDIS_URL). Otherwise other workers see them after the timeout.
+JWT_REVOCATION_CACHE_ALIAS = "default"
+JWT_REVOCATION_CACHE_TIMEOUT = config(
+    "JWT_REVOCATION_CACHE_TIMEOUT", default=60, cast=int
+)
@@ -0,0 +1,24 @@
+from decouple import config
+
+EMAIL_BACKEND = config(
+    "EMAIL_BACKEND", default="django.core.mail.backends.console.EmailBackend"
+)
+EMAIL_HOST = config("EMAIL_HOST", default="localhost")
+EMAIL_PORT = config("EMAIL_PORT", default=25, cast=int)
+EMAIL_HOST_USER = config("EMAIL_HOST_USER", default="")
+EMAIL_HOST_PASSWORD = config("EMAIL_HOST_PASSWORD", default="")
+EMAIL_USE_TLS = config("EMAIL_USE_TLS", default=False, cast=bool)
+EMAIL_TIMEOUT = config("EMAIL_TIMEOUT", default=10, cast=int)
+# Used by django.core.mail.backends.filebased.EmailBackend
+EMAIL_FILE_PATH = config("EMAIL_FILE_PATH", default="/tmp/ecommapi-emails")
+
+DEFAULT_FROM_EMAIL = "ecommapi@ecommapi.com"
+
+# Outbox worker (`manage.py send_queued_emails`)
+EMAIL_OUTBOX_MAX_ATTEMPTS = config("EMAIL_OUTBOX_MAX_ATTEMPTS", default=5, cast=int)
+# Delay in seconds before the first retry, doubled with every next attempt
+EMAIL_OUTBOX_RETRY_DELAY = config("EMAIL_OUTBOX_RETRY_DELAY", default=60, cast=int)
+# Seconds a worker has to send the emails it claimed, on top of
+# EMAIL_TIMEOUT for connecting and for every email of the batch. Emails of a
+# worker which crashed are claimed again after that.
+EMAIL_OUTBOX_CLAIM_TIMEOUT = config("EMAIL_OUTBOX_CLAIM_TIMEOUT", default=60, cast=int)
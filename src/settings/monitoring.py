@@ -0,0 +1,29 @@
+from decouple import config
+
+# Per-request query and latency instrumentation
+# (src.core.middleware.RequestInstrumentationMiddleware)
+REQUEST_INSTRUMENTATION = config("REQUEST_INSTRUMENTATION", default=True, cast=bool)
+# Server-Timing response header, sent to staff users only unless DEBUG is on
+SERVER_TIMING_HEADER = config("SERVER_TIMING_HEADER", default=False, cast=bool)
+# Milliseconds after which a request is logged with its slowest statements
+SLOW_REQUEST_THRESHOLD = config("SLOW_REQUEST_THRESHOLD", default=500, cast=int)
+# Fraction of slow requests which are logged
+SLOW_REQUEST_SAMPLE_RATE = config("SLOW_REQUEST_SAMPLE_RATE", default=0.1, cast=float)
+# Number of runs of the same statement in one request reported as N+1
+DUPLICATE_QUERY_THRESHOLD = config("DUPLICATE_QUERY_THRESHOLD", default=10, cast=int)
+
+LOG_LEVEL = config("LOG_LEVEL", default="INFO")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "json": {"()": "src.core.formatters.JSONFormatter"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "json"},
+    },
+    "loggers": {
+        "src": {"handlers": ["console"], "level": LOG_LEVEL, "propagate": False},
+    },
+}
@@ -0,0 +1,38 @@
+from decouple import config
+from django.core.exceptions import ImproperlyConfigured
+
+# Where carts are kept, see src.apps.orders.storage. Use
+# "src.apps.orders.storage.CacheCartStorage" to keep carts in the
+# CART_CACHE_ALIAS cache until they are ordered.
+CART_STORAGE_BACKEND = config(
+    "CART_STORAGE_BACKEND", default="src.apps.orders.storage.DatabaseCartStorage"
+)
+CART_CACHE_ALIAS = "carts"
+# Seconds after the last change of a cart before it expires. Cached carts
+# expire on their own, database carts are purged by `manage.py reap_orders`.
+CART_TTL = config("CART_TTL", default=7 * 24 * 60 * 60, cast=int)
+# Seconds after which the lock serializing changes of a cached cart expires
+CART_LOCK_TIMEOUT = config("CART_LOCK_TIMEOUT", default=10, cast=int)
+
+# Cached carts are locked in the cache, a local-memory cache keeps them (and
+# their locks) per worker process. Outside of DEBUG the workers must share
+# the cache (REDIS_URL).
+if (
+    CART_STORAGE_BACKEND.endswith(".CacheCartStorage")
+    and CACHES[CART_CACHE_ALIAS]["BACKEND"].endswith(".LocMemCache")
+    and not DEBUG
+):
+    raise ImproperlyConfigured(
+        "CacheCartStorage needs a cache shared by the workers, set REDIS_URL."
+    )
+
+# Seconds an order may stay unpaid before `manage.py reap_orders` cancels it
+# and returns its items to the inventory
+ORDER_PAYMENT_TTL = config("ORDER_PAYMENT_TTL", default=24 * 60 * 60, cast=int)
+# Seconds an order is kept after its Stripe Checkout session expired, for
+# the payment events of the session to arrive and be processed
+ORDER_PAYMENT_GRACE = config("ORDER_PAYMENT_GRACE", default=60 * 60, cast=int)
+
+# Maximum number of coupon codes kept by the in-process cache of active
+# coupons (src.apps.orders.cache.ActiveCouponCache)
+COUPON_CACHE_MAX_ENTRIES = config("COUPON_CACHE_MAX_ENTRIES", default=1000, cast=int)
@@ -0,0 +1,9 @@
+from decouple import config
+
+# Minimum number of reviews for a product to be ranked as top rated
+PRODUCT_TOP_RATED_MIN_REVIEWS = config(
+    "PRODUCT_TOP_RATED_MIN_REVIEWS", default=3, cast=int
+)
+
+# Number of rows written per transaction by the bulk product import
+PRODUCT_IMPORT_BATCH_SIZE = config("PRODUCT_IMPORT_BATCH_SIZE", default=1000, cast=int)
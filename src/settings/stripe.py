@@ -7,3 +7,27 @@ WEBHOOK_SECRET = config("WEBHOOK_SECRET")
 
 PAYMENT_SUCCESS_URL = config("PAYMENT_SUCCESS_URL")
 PAYMENT_CANCEL_URL = config("PAYMENT_CANCEL_URL")
+
+# Webhook events pipeline (`manage.py process_stripe_events`)
+STRIPE_EVENT_MAX_ATTEMPTS = config("STRIPE_EVENT_MAX_ATTEMPTS", default=5, cast=int)
+# Delay in seconds before the first retry, doubled with every next attempt
+STRIPE_EVENT_RETRY_DELAY = config("STRIPE_EVENT_RETRY_DELAY", default=10, cast=int)
+
+# Checkout sessions. Point STRIPE_API_BASE at `manage.py run_fake_stripe`
+# for latency and failure injection benchmarks.
+STRIPE_API_BASE = config("STRIPE_API_BASE", default="https://api.stripe.com")
+STRIPE_CONNECT_TIMEOUT = config("STRIPE_CONNECT_TIMEOUT", default=2.0, cast=float)
+STRIPE_READ_TIMEOUT = config("STRIPE_READ_TIMEOUT", default=10.0, cast=float)
+# Keep-alive connections to Stripe per worker process
+STRIPE_HTTP_POOL_SIZE = config("STRIPE_HTTP_POOL_SIZE", default=10, cast=int)
+# Consecutive failures opening the circuit, and seconds before a trial call
+STRIPE_CIRCUIT_FAILURE_THRESHOLD = config(
+    "STRIPE_CIRCUIT_FAILURE_THRESHOLD", default=5, cast=int
+)
+STRIPE_CIRCUIT_RESET_TIMEOUT = config(
+    "STRIPE_CIRCUIT_RESET_TIMEOUT", default=30.0, cast=float
+)
+# Seconds a checkout session stays payable, Stripe accepts 30 min to 24 h
+STRIPE_CHECKOUT_SESSION_TTL = config(
+    "STRIPE_CHECKOUT_SESSION_TTL", default=60 * 60, cast=int
+)
@@ -0,0 +1,9 @@
+from decouple import config
+
+from src.settings import *  # noqa: F401, F403
+
+# Settings of the test suite, `python manage.py test --settings=src.settings.testing`
+
+# the test runner would print a record for every request made by the tests
+LOG_LEVEL = config("LOG_LEVEL", default="CRITICAL")
+LOGGING["loggers"]["src"]["level"] = LOG_LEVEL  # noqa: F405
@@ -1,9 +1,19 @@
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
 
 from src.apps.accounts.models import UserProfile, UserAddress
+from src.apps.products.models import (
+    Product,
+    ProductCategory,
+    ProductInventory,
+    ProductReview,
+)
 
 User = get_user_model()
 
@@ -69,3 +79,107 @@ class TestUserProfileViews(APITestCase):
         response = self.client.get(self.user_profile_list_url)
 
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TestStatelessJWTAuthentication(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="testuser")
+        cls.user.set_password("Testpass123")
+        cls.user.save()
+        cls.user_profile = UserProfile.objects.create(
+            user=cls.user, phone_number="692267652", birthday="1999-01-01"
+        )
+        product = Product.objects.create(
+            name="Rice",
+            price="2.99",
+            category=ProductCategory.objects.create(name="Food"),
+            inventory=ProductInventory.objects.create(quantity=10, sold=0),
+        )
+        cls.review = ProductReview.objects.create(
+            user=cls.user, product=product, description="Tasty", rating=5
+        )
+
+        cls.login_url = reverse("accounts:login")
+        cls.logout_url = reverse("accounts:logout")
+        cls.token_refresh_url = reverse("accounts:token_refresh")
+        cls.user_profile_list_url = reverse("accounts:user-profile-list")
+        cls.address_list_url = reverse("accounts:address-list")
+        cls.review_detail_url = reverse(
+            "products:review-detail", kwargs={"pk": cls.review.id}
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def _login(self) -> dict:
+        response = self.client.post(
+            self.login_url, {"username": "testuser", "password": "Testpass123"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # authenticate with the token only, not the session of the login
+        self.client.cookies.clear()
+        return response.data
+
+    def _authorize(self, access_token: str) -> None:
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access_token}")
+
+    def test_token_authenticates_without_loading_user(self):
+        self._authorize(self._login()["access_token"])
+        self.client.get(self.address_list_url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.address_list_url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([query for query in queries if '"auth_user"' in query["sql"]])
+
+    def test_owner_permission_works_with_token_user(self):
+        self._authorize(self._login()["access_token"])
+
+        response = self.client.delete(self.review_detail_url)
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(ProductReview.objects.exists())
+
+    def test_logout_revokes_tokens(self):
+        tokens = self._login()
+        self._authorize(tokens["access_token"])
+        self.client.post(self.logout_url)
+
+        response = self.client.get(self.user_profile_list_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        refreshed = self.client.post(
+            self.token_refresh_url, {"refresh": tokens["refresh_token"]}
+        )
+        self._authorize(refreshed.data["access"])
+        response = self.client.get(self.user_profile_list_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivation_revokes_tokens(self):
+        self._authorize(self._login()["access_token"])
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get(self.user_profile_list_url)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_login_after_revocation_is_accepted(self):
+        self._authorize(self._login()["access_token"])
+        self.client.post(self.logout_url)
+        self.client.credentials()
+
+        self._authorize(self._login()["access_token"])
+        response = self.client.get(self.user_profile_list_url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_token_without_claims_loads_user(self):
+        self._authorize(str(RefreshToken.for_user(self.user).access_token))
+
+        response = self.client.get(self.user_profile_list_url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 1)
@@ -0,0 +1,193 @@
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from src.apps.notifications.models import OutgoingEmail
+from src.apps.notifications.services import EmailOutboxService
+
+
+class CountingEmailBackend(EmailBackend):
+    opened = 0
+
+    def open(self):
+        CountingEmailBackend.opened += 1
+        return super().open()
+
+
+class FailingEmailBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionRefusedError("SMTP server unavailable")
+
+
+class UnreachableEmailBackend(EmailBackend):
+    def open(self):
+        raise ConnectionRefusedError("SMTP server unreachable")
+
+
+class WorkerCrash(BaseException):
+    pass
+
+
+class CrashingEmailBackend(EmailBackend):
+    """
+    Sends the first message, then the worker dies while sending the second.
+    """
+
+    def send_messages(self, messages):
+        if mail.outbox:
+            raise WorkerCrash()
+        return super().send_messages(messages)
+
+
+class TestEmailOutboxService(TestCase):
+    def setUp(self):
+        self.service_class = EmailOutboxService
+        CountingEmailBackend.opened = 0
+
+    def _enqueue(self, count: int):
+        for index in range(count):
+            self.service_class.enqueue(
+                "Subject {}".format(index), "Body", ["testuser@gmail.com"]
+            )
+
+    def test_outbox_service_queues_email_without_sending_it(self):
+        email = self.service_class.enqueue("Subject", "Body", ["testuser@gmail.com"])
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(email.status, OutgoingEmail.PENDING)
+        self.assertEqual(email.from_email, "ecommapi@ecommapi.com")
+
+    @override_settings(
+        EMAIL_BACKEND="tests.test_apps.test_notifications.test_services.CountingEmailBackend"
+    )
+    def test_outbox_service_sends_batch_over_single_connection(self):
+        self._enqueue(5)
+        sent, failed = self.service_class.send_pending(batch_size=10)
+
+        self.assertEqual((sent, failed), (5, 0))
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(CountingEmailBackend.opened, 1)
+        self.assertEqual(
+            OutgoingEmail.objects.filter(status=OutgoingEmail.SENT).count(), 5
+        )
+
+    def test_outbox_service_respects_batch_size(self):
+        self._enqueue(5)
+        sent, _ = self.service_class.send_pending(batch_size=2)
+
+        self.assertEqual(sent, 2)
+        self.assertEqual(
+            OutgoingEmail.objects.filter(status=OutgoingEmail.PENDING).count(), 3
+        )
+
+    def test_outbox_service_does_not_resend_sent_emails(self):
+        self._enqueue(1)
+        self.service_class.send_pending()
+        self.service_class.send_pending()
+
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(
+        EMAIL_BACKEND="tests.test_apps.test_notifications.test_services.FailingEmailBackend"
+    )
+    def test_outbox_service_retries_failed_email_with_backoff(self):
+        self._enqueue(1)
+        sent, failed = self.service_class.send_pending(max_attempts=3)
+
+        email = OutgoingEmail.objects.get()
+        self.assertEqual((sent, failed), (0, 1))
+        self.assertEqual(email.status, OutgoingEmail.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertIn("SMTP server unavailable", email.last_error)
+        self.assertGreater(email.send_after, timezone.now())
+
+        self.assertEqual(self.service_class.send_pending(max_attempts=3), (0, 0))
+
+    @override_settings(
+        EMAIL_BACKEND="tests.test_apps.test_notifications.test_services.FailingEmailBackend"
+    )
+    def test_outbox_service_gives_up_after_max_attempts(self):
+        self._enqueue(1)
+        OutgoingEmail.objects.update(attempts=2)
+        self.service_class.send_pending(max_attempts=3)
+
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.status, OutgoingEmail.FAILED)
+        self.assertEqual(email.attempts, 3)
+
+    def test_outbox_service_works_with_file_backend(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(
+                EMAIL_BACKEND="django.core.mail.backends.filebased.EmailBackend",
+                EMAIL_FILE_PATH=directory,
+            ):
+                self._enqueue(3)
+                sent, _ = self.service_class.send_pending()
+            files = os.listdir(directory)
+            with open(os.path.join(directory, files[0])) as file:
+                content = file.read()
+
+        self.assertEqual(sent, 3)
+        self.assertEqual(len(files), 1)
+        self.assertEqual(content.count("To: testuser@gmail.com"), 3)
+
+    @override_settings(
+        EMAIL_BACKEND="tests.test_apps.test_notifications.test_services.UnreachableEmailBackend"
+    )
+    def test_outbox_service_backs_off_batch_when_server_is_unreachable(self):
+        self._enqueue(3)
+        sent, failed = self.service_class.send_pending(max_attempts=3)
+
+        self.assertEqual((sent, failed), (0, 3))
+        for email in OutgoingEmail.objects.all():
+            self.assertEqual(email.status, OutgoingEmail.PENDING)
+            self.assertEqual(email.attempts, 1)
+            self.assertIn("SMTP server unreachable", email.last_error)
+            self.assertGreater(email.send_after, timezone.now())
+
+    @override_settings(EMAIL_TIMEOUT=10, EMAIL_OUTBOX_CLAIM_TIMEOUT=60)
+    def test_outbox_claim_outlasts_a_slow_batch(self):
+        self._enqueue(100)
+        now = timezone.now()
+        self.assertEqual(len(self.service_class._claim(batch_size=100)), 100)
+
+        # connecting and every email took EMAIL_TIMEOUT, another worker polls
+        later = now + timedelta(seconds=101 * 10)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            self.assertEqual(self.service_class._claim(batch_size=100), [])
+
+    @override_settings(
+        EMAIL_BACKEND="tests.test_apps.test_notifications.test_services.CrashingEmailBackend"
+    )
+    def test_outbox_service_does_not_resend_emails_sent_before_crash(self):
+        self._enqueue(3)
+        with self.assertRaises(WorkerCrash):
+            self.service_class.send_pending()
+
+        self.assertEqual(
+            OutgoingEmail.objects.get(status=OutgoingEmail.SENT).attempts, 1
+        )
+        self.assertEqual(
+            OutgoingEmail.objects.filter(status=OutgoingEmail.SENDING).count(), 2
+        )
+        # claimed emails are left alone until their claim expires
+        self.assertEqual(self.service_class.send_pending(), (0, 0))
+
+        OutgoingEmail.objects.filter(status=OutgoingEmail.SENDING).update(
+            send_after=timezone.now() - timedelta(seconds=1)
+        )
+        mail.outbox = []
+        with override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend"
+        ):
+            self.assertEqual(self.service_class.send_pending(), (2, 0))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(
+            OutgoingEmail.objects.filter(status=OutgoingEmail.SENT).count(), 3
+        )
@@ -0,0 +1,73 @@
+import json
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from src.apps.products.models import Product, ProductInventory, ProductCategory
+from src.apps.orders.models import Order, OrderItem
+
+User = get_user_model()
+
+
+class TestExportOrdersCommand(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="testuser")
+        cls.product = Product.objects.create(
+            name="Rice",
+            price="2.99",
+            category=ProductCategory.objects.create(name="Food"),
+            inventory=ProductInventory.objects.create(quantity=100, sold=0),
+        )
+        cls.order = Order.objects.create(user=cls.user)
+        OrderItem.objects.create(order=cls.order, product=cls.product, quantity=2)
+
+    def test_command_writes_order_rows_to_stdout(self):
+        out = StringIO()
+        call_command("export_orders", file_format="jsonl", stdout=out)
+
+        (line,) = out.getvalue().splitlines()
+        row = json.loads(line)
+        self.assertEqual(row["order_id"], str(self.order.id))
+        self.assertEqual(row["quantity"], 2)
+
+    def test_command_filters_orders_by_date_range(self):
+        out = StringIO()
+        call_command("export_orders", "--to", "2000-01-01", stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 1)
+
+    def test_command_rejects_reversed_date_range(self):
+        with self.assertRaises(CommandError):
+            call_command("export_orders", "--from", "2022-02-01", "--to", "2022-01-01")
+
+
+@override_settings(ORDER_PAYMENT_TTL=3600)
+class TestReapOrdersCommand(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="testuser")
+        cls.product = Product.objects.create(
+            name="Rice",
+            price="2.99",
+            category=ProductCategory.objects.create(name="Food"),
+            inventory=ProductInventory.objects.create(quantity=100, sold=0),
+        )
+
+    def test_command_reports_reclaimed_orders(self):
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=order, product=self.product, quantity=2)
+        Order.objects.filter(id=order.id).update(
+            created=timezone.now() - timedelta(hours=2)
+        )
+
+        out = StringIO()
+        call_command("reap_orders", stdout=out)
+
+        self.assertIn("Cancelled orders: 1, released units: 2", out.getvalue())
+        self.assertTrue(Order.objects.get(id=order.id).cancelled)
+        self.product.inventory.refresh_from_db()
+        self.assertEqual(self.product.inventory.quantity, 102)
@@ -0,0 +1,137 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Sum
+from django.test import TransactionTestCase
+from rest_framework.exceptions import ValidationError
+
+from src.apps.accounts.models import UserAddress, UserProfile
+from src.apps.products.models import Product, ProductInventory, ProductCategory
+from src.apps.orders.models import Cart, CartItem, Order, OrderItem
+from src.apps.orders.services import OrderService
+
+User = get_user_model()
+
+
+class TestConcurrentCheckouts(TransactionTestCase):
+    """
+    Runs hundreds of checkouts from a pool of threads, each thread using its own
+    database connection, against a shared set of inventories.
+    """
+
+    checkouts = 200
+    workers = 20
+
+    def setUp(self):
+        self.service_class = OrderService
+        self.address = UserAddress.objects.create(
+            address_1="Test 6/15",
+            country="PL",
+            city="Warszawa",
+            postalcode="00-001",
+        )
+        self.users = User.objects.bulk_create(
+            [
+                User(username=f"user{index}", email=f"user{index}@gmail.com")
+                for index in range(self.checkouts)
+            ]
+        )
+        profiles = UserProfile.objects.bulk_create(
+            [
+                UserProfile(user=user, phone_number="692267652", birthday="1999-01-01")
+                for user in self.users
+            ]
+        )
+        UserProfile.address.through.objects.bulk_create(
+            [
+                UserProfile.address.through(
+                    userprofile_id=profile.id, useraddress_id=self.address.id
+                )
+                for profile in profiles
+            ]
+        )
+        self.carts = Cart.objects.bulk_create([Cart(user=user) for user in self.users])
+        self.product_category = ProductCategory.objects.create(name="Food")
+
+    def _create_product(self, quantity: int) -> Product:
+        return Product.objects.create(
+            name="Rice",
+            price="2.99",
+            category=self.product_category,
+            inventory=ProductInventory.objects.create(quantity=quantity, sold=0),
+        )
+
+    def _checkout(self, index: int) -> bool:
+        try:
+            self.service_class.create_order(
+                self.carts[index].id,
+                user=self.users[index],
+                data={"address_id": self.address.id},
+            )
+            return True
+        except ValidationError:
+            return False
+        finally:
+            connection.close()
+
+    def _run_checkouts(self) -> list[bool]:
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(self._checkout, range(self.checkouts)))
+
+    def test_concurrent_checkouts_never_oversell_or_lose_updates(self):
+        stock = 150
+        product = self._create_product(quantity=stock)
+        CartItem.objects.bulk_create(
+            [CartItem(cart=cart, product=product, quantity=1) for cart in self.carts]
+        )
+
+        results = self._run_checkouts()
+
+        inventory = ProductInventory.objects.get(id=product.inventory_id)
+        ordered = OrderItem.objects.aggregate(total=Sum("quantity"))["total"]
+        self.assertEqual(results.count(True), stock)
+        self.assertEqual(Order.objects.count(), stock)
+        self.assertEqual(ordered, stock)
+        self.assertEqual(inventory.quantity, 0)
+
+    def test_concurrent_checkouts_of_overlapping_carts_do_not_deadlock(self):
+        first_product = self._create_product(quantity=1000)
+        second_product = self._create_product(quantity=1000)
+        cart_items = []
+        for index, cart in enumerate(self.carts):
+            products = [first_product, second_product]
+            if index % 2:
+                products.reverse()
+            cart_items += [
+                CartItem(cart=cart, product=product, quantity=2) for product in products
+            ]
+        CartItem.objects.bulk_create(cart_items)
+
+        results = self._run_checkouts()
+
+        self.assertTrue(all(results))
+        for product in (first_product, second_product):
+            inventory = ProductInventory.objects.get(id=product.inventory_id)
+            self.assertEqual(inventory.quantity, 1000 - 2 * self.checkouts)
+
+    def test_concurrent_order_cancellations_restore_all_stock(self):
+        product = self._create_product(quantity=self.checkouts)
+        CartItem.objects.bulk_create(
+            [CartItem(cart=cart, product=product, quantity=1) for cart in self.carts]
+        )
+        self._run_checkouts()
+        orders = list(Order.objects.all())
+
+        def cancel(order):
+            try:
+                self.service_class.destroy_order(order)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            list(executor.map(cancel, orders))
+
+        inventory = ProductInventory.objects.get(id=product.inventory_id)
+        self.assertEqual(inventory.quantity, self.checkouts)
+        self.assertFalse(Order.objects.exists())
@@ -1,14 +1,38 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+import uuid
+
 from django.http.response import Http404
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.core import mail
+from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 
 from src.apps.accounts.models import UserAddress, UserProfile
-from src.apps.payments.models import PaymentDetails
+from src.apps.notifications.models import OutgoingEmail
+from src.apps.notifications.services import EmailOutboxService
+from src.apps.payments.models import PaymentDetails, StripeEvent
 from src.apps.products.models import Product, ProductInventory, ProductCategory
-from src.apps.orders.models import Coupon, Order, OrderItem, Cart, CartItem
-from src.apps.orders.services import CouponService, CartService, OrderService
+from src.apps.orders.cache import ActiveCouponCache
+from src.apps.orders.models import (
+    Coupon,
+    CouponRedemption,
+    Order,
+    OrderItem,
+    Cart,
+    CartItem,
+)
+from src.apps.orders.services import (
+    CouponService,
+    CartService,
+    OrderExportService,
+    OrderReaperService,
+    OrderService,
+)
 
 User = get_user_model()
 
@@ -73,6 +97,104 @@ class TestCouponService(TestCase):
         )
 
 
+class TestCouponRedemption(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service_class = CouponService
+        cls.user = User.objects.create(username="testuser")
+        cls.other_user = User.objects.create(username="otheruser")
+        cls.coupon = Coupon.objects.create(
+            code="promo10", amount=10, min_order_total=20, is_active=True
+        )
+
+    def setUp(self):
+        ActiveCouponCache.clear()
+
+    def test_active_coupon_is_cached_until_changed_by_service(self):
+        self.service_class.get_active_coupon("promo10")
+        with self.assertNumQueries(0):
+            coupon = self.service_class.get_active_coupon("promo10")
+        self.assertEqual(coupon, self.coupon)
+
+        self.service_class.update_coupon(
+            instance=coupon,
+            data={
+                "code": "promo10",
+                "amount": 15,
+                "is_active": True,
+                "min_order_total": 30,
+            },
+        )
+        self.assertEqual(self.service_class.get_active_coupon("promo10").amount, 15)
+
+        self.service_class.delete_coupon(coupon)
+        with self.assertRaises(Http404):
+            self.service_class.get_active_coupon("promo10")
+
+    def test_coupon_codes_are_unique(self):
+        with self.assertRaises(ValidationError):
+            self.service_class.create_coupon(
+                data={
+                    "code": "promo10",
+                    "amount": 5,
+                    "is_active": True,
+                    "min_order_total": 20,
+                }
+            )
+        self.assertEqual(Coupon.objects.count(), 1)
+
+    def test_redeem_coupon_counts_uses(self):
+        self.service_class.redeem_coupon("promo10", user=self.user, total=20)
+        self.service_class.redeem_coupon("promo10", user=self.user, total=20)
+        self.service_class.redeem_coupon("promo10", user=self.other_user, total=20)
+
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.times_used, 3)
+        self.assertEqual(
+            CouponRedemption.objects.get(coupon=self.coupon, user=self.user).count, 2
+        )
+
+    def test_redeem_coupon_enforces_usage_limits(self):
+        Coupon.objects.filter(id=self.coupon.id).update(max_uses=2, max_uses_per_user=1)
+        self.service_class.redeem_coupon("promo10", user=self.user, total=20)
+        with self.assertRaises(ValidationError):
+            self.service_class.redeem_coupon("promo10", user=self.user, total=20)
+        self.service_class.redeem_coupon("promo10", user=self.other_user, total=20)
+        with self.assertRaises(ValidationError):
+            self.service_class.redeem_coupon(
+                "promo10", user=User.objects.create(username="third"), total=20
+            )
+
+    def test_redeem_coupon_reloads_coupon_changed_outside_service(self):
+        self.service_class.get_active_coupon("promo10")
+        Coupon.objects.filter(id=self.coupon.id).update(
+            min_order_total=50, updated=timezone.now()
+        )
+        with self.assertRaises(ValidationError):
+            self.service_class.redeem_coupon("promo10", user=self.user, total=20)
+
+        Coupon.objects.filter(id=self.coupon.id).update(is_active=False)
+        with self.assertRaises(Http404):
+            self.service_class.redeem_coupon("promo10", user=self.user, total=60)
+
+    def test_release_coupons_reverts_redemptions(self):
+        self.service_class.redeem_coupon("promo10", user=self.user, total=20)
+        order = Order.objects.create(user=self.user, coupon=self.coupon)
+        # orders placed before redemptions were counted
+        Order.objects.create(user=self.other_user, coupon=self.coupon)
+
+        self.service_class.release_coupons(Order.objects.all())
+
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.times_used, 0)
+        self.assertEqual(
+            CouponRedemption.objects.get(coupon=self.coupon, user=self.user).count, 0
+        )
+        OrderService.destroy_order(order)
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.times_used, 0)
+
+
 class TestCartService(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -164,6 +286,89 @@ class TestCartService(TestCase):
         self.assertEqual(CartItem.objects.all().count(), 1)
         self.assertEqual(cart_item.quantity, quantity)
 
+    def _create_product(self, name, quantity=100):
+        return Product.objects.create(
+            name=name,
+            price="1.00",
+            category=self.product_category,
+            inventory=ProductInventory.objects.create(quantity=quantity, sold=0),
+        )
+
+    def test_cart_service_applies_batch_of_operations_in_order(self):
+        pasta = self._create_product("Pasta")
+        bread = self._create_product("Bread")
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=1)
+        CartItem.objects.create(cart=self.cart, product=bread, quantity=1)
+
+        cart = self.service_class.update_cart_items(
+            cart=self.cart,
+            data={
+                "operations": [
+                    {"op": "add", "product_id": self.product.id, "quantity": 2},
+                    {"op": "add", "product_id": pasta.id, "quantity": 3},
+                    {"op": "set", "product_id": pasta.id, "quantity": 1},
+                    {"op": "remove", "product_id": bread.id},
+                ]
+            },
+        )
+
+        quantities = dict(
+            CartItem.objects.filter(cart=self.cart).values_list("product", "quantity")
+        )
+        self.assertEqual(quantities, {self.product.id: 3, pasta.id: 1})
+        self.assertEqual(cart.total, Decimal("8.47"))
+
+    def test_cart_service_validates_resulting_quantities_of_batch(self):
+        pasta = self._create_product("Pasta", quantity=5)
+        operations = [
+            {"op": "add", "product_id": pasta.id, "quantity": 3},
+            {"op": "add", "product_id": self.product.id, "quantity": 1},
+            {"op": "add", "product_id": pasta.id, "quantity": 3},
+        ]
+        with self.assertRaises(ValidationError) as context:
+            self.service_class.update_cart_items(
+                cart=self.cart, data={"operations": operations}
+            )
+
+        errors = context.exception.detail["operations"]
+        self.assertEqual([bool(error) for error in errors], [False, False, True])
+        self.assertIn("quantity", errors[2])
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_cart_service_rejects_batch_with_unknown_product(self):
+        operations = [{"op": "add", "product_id": uuid.uuid4(), "quantity": 1}]
+        with self.assertRaises(ValidationError) as context:
+            self.service_class.update_cart_items(
+                cart=self.cart, data={"operations": operations}
+            )
+        self.assertIn("product_id", context.exception.detail["operations"][0])
+
+    def test_cart_service_batch_runs_a_fixed_number_of_queries(self):
+        bread = self._create_product("Bread")
+
+        def update_cart(count):
+            CartItem.objects.create(cart=self.cart, product=self.product, quantity=1)
+            CartItem.objects.create(cart=self.cart, product=bread, quantity=1)
+            operations = [
+                {"op": "add", "product_id": self.product.id, "quantity": 1},
+                {"op": "remove", "product_id": bread.id},
+            ] + [
+                {
+                    "op": "add",
+                    "product_id": self._create_product(str(index)).id,
+                    "quantity": 1,
+                }
+                for index in range(count)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                self.service_class.update_cart_items(
+                    cart=self.cart, data={"operations": operations}
+                )
+            CartItem.objects.all().delete()
+            return len(queries)
+
+        self.assertEqual(update_cart(1), update_cart(20))
+
 
 class TestOrderService(TestCase):
     @classmethod
@@ -298,6 +503,98 @@ class TestOrderService(TestCase):
         self.assertEqual(Coupon.objects.get(code=data["coupon_code"]), order.coupon)
         self.assertEqual(order.total, order.before_coupon - order.coupon.amount)
 
+    def test_order_service_stores_totals_snapshot_on_created_order(self):
+        order = self.service_class.create_order(
+            self.cart.id, user=self.user, data=self.order_data_coupon
+        )
+        Product.objects.filter(id=self.product.id).update(
+            price="9.99", discount_price=None
+        )
+        order = Order.objects.get(id=order.id)
+
+        self.assertEqual(order.before_coupon_amount, Decimal("24.90"))
+        self.assertEqual(order.total_amount, Decimal("14.90"))
+        with self.assertNumQueries(0):
+            self.assertEqual(order.before_coupon, Decimal("24.90"))
+            self.assertEqual(order.total, Decimal("14.90"))
+
+    def test_order_service_stores_unit_prices_of_order_items(self):
+        order = self.service_class.create_order(
+            self.cart.id, user=self.user, data=self.order_data_no_coupon
+        )
+        self.assertEqual(
+            list(order.order_items.values_list("unit_price", flat=True)),
+            [Decimal("2.49")],
+        )
+
+    def test_order_service_recomputes_total_on_coupon_update(self):
+        order = self.service_class.create_order(
+            self.cart.id, user=self.user, data=self.order_data_no_coupon
+        )
+        self.assertEqual(order.total_amount, Decimal("24.90"))
+        self.service_class.update_order(
+            instance=order, user=self.user, data=self.order_data_coupon
+        )
+        self.assertEqual(Order.objects.get(id=order.id).total, Decimal("14.90"))
+
+    def test_order_service_counts_coupon_use_until_order_is_destroyed(self):
+        order = self.service_class.create_order(
+            self.cart.id, user=self.user, data=self.order_data_coupon
+        )
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.times_used, 1)
+
+        self.service_class.update_order(
+            instance=order, user=self.user, data=self.order_data_coupon
+        )
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.times_used, 1)
+
+        self.service_class.destroy_order(order)
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.times_used, 0)
+
+    def test_order_totals_fall_back_to_sql_aggregate_without_snapshot(self):
+        order = Order.objects.create(user=self.user, coupon=self.coupon)
+        OrderItem.objects.create(order=order, product=self.product, quantity=2)
+        OrderItem.objects.create(
+            order=order,
+            product=self._create_cart_with_lines(1).cart_items.get().product,
+        )
+
+        annotated_order = Order.objects.with_totals().get(id=order.id)
+        self.assertEqual(annotated_order.before_coupon, Decimal("24.97"))
+        self.assertEqual(order.before_coupon, Decimal("24.97"))
+        self.assertEqual(order.total, Decimal("14.97"))
+        self.assertEqual(
+            Cart.objects.with_totals().get(id=self.cart.id).total,
+            sum(item.final_price for item in self.cart.cart_items.all()),
+        )
+
+    def test_order_totals_use_prices_the_items_were_placed_for(self):
+        order = self.service_class.create_order(
+            self.cart.id, user=self.user, data=self.order_data_no_coupon
+        )
+        placed_total = order.before_coupon_amount
+        # totals of orders without a snapshot are computed from the items
+        Order.objects.filter(id=order.id).update(
+            before_coupon_amount=None, total_amount=None
+        )
+        Product.objects.filter(id=self.product.id).update(
+            price="99.99", discount_price=None
+        )
+
+        self.assertEqual(
+            Order.objects.with_totals().get(id=order.id).before_coupon, placed_total
+        )
+        self.assertEqual(
+            Order.objects.prefetch_related("order_items__product")
+            .get(id=order.id)
+            .before_coupon,
+            placed_total,
+        )
+        self.assertEqual(Order.objects.get(id=order.id).total, placed_total)
+
     def test_order_service_disallows_inactive_coupon(self):
         with self.assertRaises(Http404):
             order = self.service_class.create_order(
@@ -314,10 +611,20 @@ class TestOrderService(TestCase):
             )
         self.assertEqual(Order.objects.all().count(), 0)
 
+    def test_order_service_queues_email_instead_of_sending_it_in_transaction(self):
+        self.service_class.create_order(
+            self.cart.id, user=self.user, data=self.order_data_no_coupon
+        )
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(
+            OutgoingEmail.objects.filter(status=OutgoingEmail.PENDING).count(), 1
+        )
+
     def test_order_service_sends_email_after_creating_order(self):
         order = self.service_class.create_order(
             self.cart.id, user=self.user, data=self.order_data_no_coupon
         )
+        EmailOutboxService.send_pending()
         self.assertEqual(len(mail.outbox), 1)
         self.assertEqual(mail.outbox[0].subject, "Order #{}".format(order.id))
         self.assertEqual(
@@ -404,6 +711,63 @@ class TestOrderService(TestCase):
             product_inventory_quantity - order_item.quantity,
         )
 
+    def test_order_service_prevents_oversell_at_database_level(self):
+        self.cart_item.quantity = self.product_inventory.quantity + 1
+        self.cart_item.save()
+        with self.assertRaises(ValidationError):
+            self.service_class.create_order(
+                self.cart.id, user=self.user, data=self.order_data_no_coupon
+            )
+        self.assertEqual(Order.objects.all().count(), 0)
+        self.assertEqual(
+            ProductInventory.objects.get(id=self.product_inventory.id).quantity,
+            self.product_inventory.quantity,
+        )
+
+    def test_order_service_merges_cart_lines_of_same_product(self):
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=5)
+        order = self.service_class.create_order(
+            self.cart.id, user=self.user, data=self.order_data_no_coupon
+        )
+        self.assertEqual(OrderItem.objects.filter(order=order).count(), 2)
+        self.assertEqual(
+            ProductInventory.objects.get(id=self.product_inventory.id).quantity,
+            self.product_inventory.quantity - 15,
+        )
+
+    def _create_cart_with_lines(self, lines: int) -> Cart:
+        cart = Cart.objects.create(user=self.user)
+        for index in range(lines):
+            product = Product.objects.create(
+                name=f"Product {index}",
+                price="19.99",
+                category=self.product_category,
+                inventory=ProductInventory.objects.create(quantity=10, sold=0),
+            )
+            CartItem.objects.create(cart=cart, product=product, quantity=2)
+        return cart
+
+    def test_order_service_creates_order_in_constant_number_of_queries(self):
+        small_cart = self._create_cart_with_lines(1)
+        big_cart = self._create_cart_with_lines(50)
+
+        with CaptureQueriesContext(connection) as small_cart_queries:
+            self.service_class.create_order(
+                small_cart.id, user=self.user, data=self.order_data_coupon
+            )
+        with CaptureQueriesContext(connection) as big_cart_queries:
+            order = self.service_class.create_order(
+                big_cart.id, user=self.user, data=self.order_data_coupon
+            )
+
+        self.assertEqual(len(small_cart_queries), len(big_cart_queries))
+        self.assertEqual(OrderItem.objects.filter(order=order).count(), 50)
+        self.assertFalse(
+            ProductInventory.objects.exclude(id=self.product_inventory.id)
+            .exclude(quantity=8)
+            .exists()
+        )
+
     def test_order_service_correctly_updates_product_inventory_on_delete(self):
         product_quantity = int(self.product.inventory.quantity)
         order = self.service_class.create_order(
@@ -445,6 +809,42 @@ class TestOrderService(TestCase):
 
         self.assertEqual(order_item.quantity, order_item.product.inventory.sold)
 
+    def test_order_service_records_late_payment_of_cancelled_order(self):
+        order = self.service_class.create_order(
+            self.cart.id, user=self.user, data=self.order_data_no_coupon
+        )
+        Order.objects.filter(id=order.id).update(cancelled=True)
+
+        self.stripe_session["metadata"]["order_id"] = order.id
+        with self.assertLogs("src.apps.orders.services", "WARNING"):
+            self.service_class.fullfill_order(
+                session=self.stripe_session, payment_intent=self.payment_intent
+            )
+        order = Order.objects.get(id=order.id)
+
+        self.assertTrue(order.payment_accepted)
+        self.assertFalse(order.order_accepted)
+        self.assertEqual(order.payment, PaymentDetails.objects.get())
+        self.assertEqual(self.product.inventory.sold, 0)
+
+    def test_order_service_records_product_sales_after_payment(self):
+        order = self.service_class.create_order(
+            self.cart.id, user=self.user, data=self.order_data_no_coupon
+        )
+
+        self.stripe_session["metadata"]["order_id"] = order.id
+        self.service_class.fullfill_order(
+            session=self.stripe_session, payment_intent=self.payment_intent
+        )
+        product = Product.objects.get(id=self.product.id)
+
+        self.assertEqual(product.sales_7d, self.cart_item.quantity)
+        self.assertEqual(product.sales_30d, self.cart_item.quantity)
+        self.assertEqual(
+            product.daily_sales.aggregate(total=Sum("quantity"))["total"],
+            self.cart_item.quantity,
+        )
+
     def test_order_service_sends_email_after_payment(self):
         order = self.service_class.create_order(
             self.cart.id, user=self.user, data=self.order_data_no_coupon
@@ -453,6 +853,7 @@ class TestOrderService(TestCase):
         self.service_class.fullfill_order(
             session=self.stripe_session, payment_intent=self.payment_intent
         )
+        EmailOutboxService.send_pending()
 
         self.assertEqual(len(mail.outbox), 2)
         self.assertEqual(
@@ -483,3 +884,244 @@ class TestOrderService(TestCase):
         self.assertEqual(
             Order.objects.get(id=order.id).user, PaymentDetails.objects.get().user
         )
+
+
+@override_settings(ORDER_PAYMENT_TTL=3600, CART_TTL=3600)
+class TestOrderReaperService(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service_class = OrderReaperService
+        cls.user = User.objects.create(username="testuser", email="test@gmail.com")
+        cls.product_category = ProductCategory.objects.create(name="Food")
+        cls.rice = Product.objects.create(
+            name="Rice",
+            price="2.99",
+            category=cls.product_category,
+            inventory=ProductInventory.objects.create(quantity=10, sold=0),
+        )
+        cls.pasta = Product.objects.create(
+            name="Pasta",
+            price="3.99",
+            category=cls.product_category,
+            inventory=ProductInventory.objects.create(quantity=10, sold=0),
+        )
+        cls.stale = timezone.now() - timedelta(hours=2)
+
+    def _create_order(self, created, items, **data):
+        order = Order.objects.create(user=self.user, **data)
+        for product, quantity in items:
+            OrderItem.objects.create(order=order, product=product, quantity=quantity)
+        Order.objects.filter(id=order.id).update(created=created)
+        return order
+
+    def _create_cart(self, updated, items_updated=None):
+        cart = Cart.objects.create(user=self.user)
+        Cart.objects.filter(id=cart.id).update(updated=updated)
+        if items_updated:
+            item = CartItem.objects.create(cart=cart, product=self.rice)
+            CartItem.objects.filter(id=item.id).update(updated=items_updated)
+        return cart
+
+    def test_stale_unpaid_orders_are_cancelled_and_stock_released(self):
+        stale_order = self._create_order(self.stale, [(self.rice, 2), (self.pasta, 1)])
+        self._create_order(self.stale, [(self.rice, 3)])
+        recent_order = self._create_order(timezone.now(), [(self.rice, 4)])
+        paid_order = self._create_order(
+            self.stale, [(self.pasta, 5)], payment_accepted=True
+        )
+
+        results = self.service_class.reap(batch_size=1)
+
+        self.assertEqual(
+            results,
+            {"cancelled_orders": 2, "released_units": 6, "purged_carts": 0},
+        )
+        self.assertQuerysetEqual(
+            Order.objects.filter(cancelled=False).order_by("created"),
+            [paid_order, recent_order],
+        )
+        # kept for payments arriving late
+        self.assertEqual(OrderItem.objects.filter(order=stale_order).count(), 2)
+        self.rice.inventory.refresh_from_db()
+        self.pasta.inventory.refresh_from_db()
+        self.assertEqual(self.rice.inventory.quantity, 15)
+        self.assertEqual(self.pasta.inventory.quantity, 11)
+
+    def test_order_cancelled_by_reaper_is_not_released_again_on_delete(self):
+        order = self._create_order(self.stale, [(self.rice, 2)])
+        self.service_class.reap()
+
+        with self.assertRaises(ValidationError):
+            OrderService.destroy_order(order)
+
+        self.rice.inventory.refresh_from_db()
+        self.assertEqual(self.rice.inventory.quantity, 12)
+        self.assertTrue(Order.objects.filter(id=order.id, cancelled=True).exists())
+
+    def test_order_deleted_meanwhile_is_not_released_again(self):
+        order = self._create_order(timezone.now(), [(self.rice, 2)])
+        stale_instance = Order.objects.get(id=order.id)
+        OrderService.destroy_order(order)
+
+        with self.assertRaises(Http404):
+            OrderService.destroy_order(stale_instance)
+
+        self.rice.inventory.refresh_from_db()
+        self.assertEqual(self.rice.inventory.quantity, 12)
+
+    @override_settings(ORDER_PAYMENT_GRACE=600)
+    def test_orders_with_payable_checkout_session_are_kept(self):
+        order = self._create_order(self.stale, [(self.rice, 1)])
+        for expires, cancelled in (
+            (timedelta(minutes=30), 0),
+            # payment events of the session may still arrive
+            (-timedelta(minutes=5), 0),
+            (-timedelta(minutes=11), 1),
+        ):
+            Order.objects.filter(id=order.id).update(
+                stripe_session_expires=timezone.now() + expires
+            )
+            self.assertEqual(
+                self.service_class.cancel_stale_orders(), (cancelled, cancelled)
+            )
+
+    def test_orders_with_unprocessed_stripe_events_are_kept(self):
+        order = self._create_order(self.stale, [(self.rice, 1)])
+        event = StripeEvent.objects.create(
+            stripe_event_id="evt_1",
+            type="payment_intent.succeeded",
+            payload={"data": {"object": {"metadata": {"order_id": str(order.id)}}}},
+            stripe_created=timezone.now(),
+        )
+        for status in (StripeEvent.PENDING, StripeEvent.FAILED):
+            StripeEvent.objects.filter(id=event.id).update(status=status)
+            self.assertEqual(self.service_class.cancel_stale_orders(), (0, 0))
+
+        StripeEvent.objects.filter(id=event.id).update(status=StripeEvent.IGNORED)
+        self.assertEqual(self.service_class.cancel_stale_orders(), (1, 1))
+
+    def test_cancelled_orders_are_released_once(self):
+        order = self._create_order(self.stale, [(self.rice, 2)])
+
+        self.assertEqual(self.service_class.cancel_stale_orders(), (1, 2))
+        self.assertEqual(self.service_class.cancel_stale_orders(), (0, 0))
+        self.assertTrue(Order.objects.get(id=order.id).cancelled)
+        self.rice.inventory.refresh_from_db()
+        self.assertEqual(self.rice.inventory.quantity, 12)
+
+    def test_cancel_stale_orders_is_bounded_by_batch_size(self):
+        for _ in range(3):
+            self._create_order(self.stale, [(self.rice, 1)])
+
+        self.assertEqual(self.service_class.cancel_stale_orders(batch_size=2), (2, 2))
+        self.assertEqual(Order.objects.filter(cancelled=False).count(), 1)
+
+    def test_stale_carts_are_purged(self):
+        stale_cart = self._create_cart(self.stale, items_updated=self.stale)
+        empty_cart = self._create_cart(self.stale)
+        active_cart = self._create_cart(self.stale, items_updated=timezone.now())
+        recent_cart = self._create_cart(timezone.now())
+
+        self.assertEqual(self.service_class.purge_stale_carts(batch_size=10), 2)
+
+        self.assertQuerysetEqual(
+            Cart.objects.order_by("updated"), [active_cart, recent_cart]
+        )
+        self.assertFalse(CartItem.objects.filter(cart=stale_cart).exists())
+        self.assertFalse(Cart.objects.filter(id=empty_cart.id).exists())
+
+    @override_settings(CART_STORAGE_BACKEND="src.apps.orders.storage.CacheCartStorage")
+    def test_cached_carts_are_left_to_expire(self):
+        self._create_cart(self.stale)
+        self.assertEqual(self.service_class.purge_stale_carts(), 0)
+        self.assertEqual(Cart.objects.count(), 1)
+
+
+class TestOrderExportService(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service_class = OrderExportService
+        cls.user = User.objects.create(username="testuser", email="test@gmail.com")
+        cls.product_category = ProductCategory.objects.create(name="Food")
+        cls.rice = Product.objects.create(
+            name="Rice",
+            price="2.99",
+            discount_price="2.49",
+            category=cls.product_category,
+            inventory=ProductInventory.objects.create(quantity=100, sold=0),
+        )
+        cls.pasta = Product.objects.create(
+            name="Pasta",
+            price="3.99",
+            category=cls.product_category,
+            inventory=ProductInventory.objects.create(quantity=100, sold=0),
+        )
+        cls.coupon = Coupon.objects.create(code="test1", amount=1, is_active=True)
+        cls.payment = PaymentDetails.objects.create(
+            user=cls.user, stripe_charge_id="ch_test", amount=7.97
+        )
+        cls.order = cls._create_order(
+            datetime(2022, 5, 31, 23, 30, tzinfo=dt_timezone.utc),
+            coupon=cls.coupon,
+            payment=cls.payment,
+            payment_accepted=True,
+            before_coupon_amount=Decimal("8.97"),
+            total_amount=Decimal("7.97"),
+        )
+        OrderItem.objects.create(order=cls.order, product=cls.rice, quantity=2)
+        OrderItem.objects.create(order=cls.order, product=cls.pasta, quantity=1)
+        cls.empty_order = cls._create_order(
+            datetime(2022, 5, 1, tzinfo=dt_timezone.utc)
+        )
+        cls.old_order = cls._create_order(
+            datetime(2021, 12, 31, tzinfo=dt_timezone.utc)
+        )
+
+    @classmethod
+    def _create_order(cls, created, **data):
+        order = Order.objects.create(user=cls.user, **data)
+        Order.objects.filter(id=order.id).update(created=created)
+        return order
+
+    def test_export_service_yields_one_flat_row_per_order_item(self):
+        rows = list(
+            self.service_class.iter_rows(
+                date_from=date(2022, 1, 1), date_to=date(2022, 5, 31)
+            )
+        )
+
+        self.assertEqual(
+            [row["order_id"] for row in rows],
+            [self.empty_order.id, self.order.id, self.order.id],
+        )
+        self.assertIsNone(rows[0]["item_id"])
+        rice_row, pasta_row = rows[1:]
+        self.assertEqual(tuple(rice_row), self.service_class.fieldnames)
+        self.assertEqual(rice_row["product_name"], "Rice")
+        self.assertEqual(rice_row["line_total"], Decimal("4.98"))
+        self.assertEqual(pasta_row["line_total"], Decimal("3.99"))
+        self.assertEqual(rice_row["coupon_code"], "test1")
+        self.assertEqual(rice_row["total_amount"], Decimal("7.97"))
+        self.assertEqual(rice_row["stripe_charge_id"], "ch_test")
+        self.assertEqual(rice_row["email"], "test@gmail.com")
+
+    def test_export_service_uses_unit_prices_orders_were_placed_for(self):
+        OrderItem.objects.filter(order=self.order, product=self.rice).update(
+            unit_price=Decimal("1.99")
+        )
+        Product.objects.filter(id=self.pasta.id).update(price="5.99")
+        rows = list(self.service_class.iter_rows(date_from=date(2022, 5, 1)))
+
+        rice_row, pasta_row = rows[1:]
+        self.assertEqual(rice_row["unit_price"], Decimal("1.99"))
+        self.assertEqual(rice_row["line_total"], Decimal("3.98"))
+        # items created outside of checkout have no stored unit price
+        self.assertEqual(pasta_row["unit_price"], Decimal("5.99"))
+        self.assertEqual(pasta_row["line_total"], Decimal("5.99"))
+
+    def test_export_service_date_range_is_inclusive(self):
+        rows = self.service_class.iter_rows(date_to=date(2021, 12, 31))
+        self.assertEqual([row["order_id"] for row in rows], [self.old_order.id])
+
+        rows = self.service_class.iter_rows(date_from=date(2022, 5, 31))
+        self.assertEqual({row["order_id"] for row in rows}, {self.order.id})
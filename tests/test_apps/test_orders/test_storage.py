@@ -0,0 +1,254 @@
+import os
+import runpy
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest import mock
+import uuid
+
+from django.conf import settings
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from src.apps.accounts.models import UserAddress, UserProfile
+from src.apps.products.models import Product, ProductInventory, ProductCategory
+from src.apps.orders.models import Cart, CartItem, Order
+from src.apps.orders.storage import CacheCartStorage
+
+User = get_user_model()
+
+
+@override_settings(
+    CART_STORAGE_BACKEND="src.apps.orders.storage.CacheCartStorage", CART_TTL=60
+)
+class TestCacheCartStorage(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="testuser", email="test@gmail.com")
+        cls.other_user = User.objects.create(username="otheruser")
+        cls.address = UserAddress.objects.create(
+            address_1="Test 6/15",
+            country="PL",
+            city="Warszawa",
+            postalcode="00-001",
+        )
+        UserProfile.objects.create(
+            user=cls.user, phone_number="692267652", birthday="1999-01-01"
+        ).address.add(cls.address)
+        cls.product_category = ProductCategory.objects.create(name="Food")
+        cls.rice = cls._create_product("Rice", price="2.99", discount_price="2.49")
+        cls.pasta = cls._create_product("Pasta", price="3.99")
+
+    @classmethod
+    def _create_product(cls, name, **data):
+        return Product.objects.create(
+            name=name,
+            category=cls.product_category,
+            inventory=ProductInventory.objects.create(quantity=10, sold=0),
+            **data,
+        )
+
+    def setUp(self):
+        caches["carts"].clear()
+        self.client.force_authenticate(user=self.user)
+
+    def _create_cart(self):
+        response = self.client.post(reverse("orders:cart-list"))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data["id"]
+
+    def _add_item(self, cart_id, product, quantity):
+        return self.client.post(
+            reverse("orders:cart-item-list", kwargs={"pk": cart_id}),
+            {"product_id": str(product.id), "quantity": quantity},
+        )
+
+    def test_carts_are_kept_out_of_the_database(self):
+        cart_id = self._create_cart()
+        response = self._add_item(cart_id, self.rice, 2)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self._add_item(cart_id, self.rice, 1)
+        self._add_item(cart_id, self.pasta, 1)
+
+        response = self.client.get(
+            reverse("orders:cart-detail", kwargs={"pk": cart_id})
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["username"], "testuser")
+        self.assertEqual(response.data["total"], Decimal("11.46"))
+        self.assertEqual(len(response.data["cart_items"]), 2)
+        self.assertFalse(Cart.objects.exists())
+        self.assertFalse(CartItem.objects.exists())
+
+        response = self.client.get(reverse("orders:cart-list"))
+        self.assertEqual(response.data["count"], 1)
+
+    @override_settings(FAST_SERIALIZATION=True)
+    def test_cart_list_is_serialized_without_values_rows(self):
+        cart_id = self._create_cart()
+        self._add_item(cart_id, self.rice, 2)
+        response = self.client.get(reverse("orders:cart-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][0]["id"], cart_id)
+        self.assertEqual(len(response.data["results"][0]["cart_items"]), 1)
+
+    def test_cart_item_ids_are_stable(self):
+        cart_id = self._create_cart()
+        item_id = self._add_item(cart_id, self.rice, 1).data["id"]
+        self.assertEqual(self._add_item(cart_id, self.rice, 1).data["id"], item_id)
+        self.assertEqual(
+            item_id, str(uuid.uuid5(uuid.UUID(cart_id), str(self.rice.id)))
+        )
+
+        item_url = reverse(
+            "orders:cart-item-detail", kwargs={"pk": cart_id, "cart_item_pk": item_id}
+        )
+        response = self.client.put(item_url, {"quantity": 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["quantity"], 5)
+
+        response = self.client.delete(item_url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        response = self.client.get(item_url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cart_quantities_are_validated_against_stock(self):
+        cart_id = self._create_cart()
+        response = self._add_item(cart_id, self.rice, 11)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(
+            reverse("orders:cart-item-batch", kwargs={"pk": cart_id}),
+            {
+                "operations": [
+                    {"op": "add", "product_id": str(self.rice.id), "quantity": 6},
+                    {"op": "add", "product_id": str(self.rice.id), "quantity": 6},
+                ]
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(
+            reverse("orders:cart-item-list", kwargs={"pk": cart_id})
+        )
+        self.assertEqual(response.data["count"], 0)
+
+    def test_other_user_cannot_access_cart(self):
+        cart_id = self._create_cart()
+        self.client.force_authenticate(user=self.other_user)
+
+        response = self.client.get(
+            reverse("orders:cart-detail", kwargs={"pk": cart_id})
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self._add_item(cart_id, self.rice, 1)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse("orders:cart-list"))
+        self.assertEqual(response.data["count"], 0)
+
+    def test_order_materializes_cached_cart(self):
+        cart_id = self._create_cart()
+        self._add_item(cart_id, self.rice, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("orders:create-order", kwargs={"pk": cart_id}),
+                {"address_id": self.address.id},
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        order = Order.objects.get()
+        self.assertEqual(order.before_coupon_amount, Decimal("4.98"))
+        self.assertEqual(order.order_items.get().product, self.rice)
+        response = self.client.get(
+            reverse("orders:cart-detail", kwargs={"pk": cart_id})
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_failed_order_keeps_cached_cart(self):
+        cart_id = self._create_cart()
+        self._add_item(cart_id, self.rice, 2)
+        ProductInventory.objects.filter(id=self.rice.inventory_id).update(quantity=1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("orders:create-order", kwargs={"pk": cart_id}),
+                {"address_id": self.address.id},
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(
+            reverse("orders:cart-detail", kwargs={"pk": cart_id})
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_idle_carts_expire(self):
+        cart_id = self._create_cart()
+        self._add_item(cart_id, self.rice, 1)
+
+        expired = time.time() + 61
+        with mock.patch(
+            "django.core.cache.backends.locmem.time.time", return_value=expired
+        ):
+            self.assertIsNone(CacheCartStorage().get_cart(cart_id))
+            response = self.client.get(reverse("orders:cart-list"))
+        self.assertEqual(response.data["count"], 0)
+
+    def test_concurrent_changes_of_a_cart_are_serialized(self):
+        storage = CacheCartStorage()
+        cart = storage.create_cart(self.user)
+
+        def add_one(quantities):
+            quantity = quantities.get(self.rice.id, 0)
+            time.sleep(0.01)
+            return {self.rice.id: quantity + 1}
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            for _ in range(10):
+                executor.submit(
+                    storage.update_quantities, cart, [self.rice.id], add_one
+                )
+        self.assertEqual(storage.get_cart(cart.id).quantities, {str(self.rice.id): 10})
+
+    def test_concurrently_created_carts_are_all_listed(self):
+        storage = CacheCartStorage()
+        set_user_carts = storage._set_user_carts
+
+        def slow_set_user_carts(user_id, cart_ids):
+            time.sleep(0.01)
+            set_user_carts(user_id, cart_ids)
+
+        with mock.patch.object(storage, "_set_user_carts", slow_set_user_carts):
+            with ThreadPoolExecutor(max_workers=5) as executor:
+                carts = list(executor.map(storage.create_cart, [self.user] * 5))
+        self.assertCountEqual(
+            [cart.id for cart in storage.list_carts(self.user)],
+            [cart.id for cart in carts],
+        )
+
+    def test_failed_update_releases_the_cart(self):
+        storage = CacheCartStorage()
+        cart = storage.create_cart(self.user)
+        with self.assertRaises(ValueError):
+            storage.update_quantities(
+                cart, [self.rice.id], mock.Mock(side_effect=ValueError)
+            )
+        storage.update_quantities(cart, [self.rice.id], lambda _: {self.rice.id: 1})
+        self.assertEqual(storage.get_cart(cart.id).quantities, {str(self.rice.id): 1})
+
+    def test_settings_refuse_cached_carts_in_a_local_memory_cache(self):
+        environ = {
+            "CART_STORAGE_BACKEND": "src.apps.orders.storage.CacheCartStorage",
+            "REDIS_URL": "",
+            "DEBUG": "False",
+        }
+        path = os.path.join(settings.BASE_DIR, "src", "settings", "__init__.py")
+        with mock.patch.dict(os.environ, environ):
+            with self.assertRaises(ImproperlyConfigured):
+                runpy.run_path(path)
+            with mock.patch.dict(os.environ, {"DEBUG": "True"}):
+                runpy.run_path(path)
@@ -1,10 +1,19 @@
+import json
+from decimal import Decimal
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 import uuid
 
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from src.apps.accounts.models import UserAddress, UserProfile
+from src.apps.payments.models import PaymentDetails
 from src.apps.products.models import Product, ProductInventory, ProductCategory
 from src.apps.orders.models import Coupon, Cart, CartItem, Coupon, Order, OrderItem
 
@@ -105,6 +114,16 @@ class TestCartViews(APITestCase):
     def setUp(self):
         self.client.force_login(user=self.user)
 
+    def test_cart_list_fast_serialization_content_is_equal(self):
+        Cart.objects.create(user=self.user)
+        responses = []
+        for fast in (False, True):
+            with override_settings(FAST_SERIALIZATION=fast):
+                responses.append(self.client.get(self.cart_list_url))
+        drf, fast = responses
+        self.assertEqual(drf.status_code, status.HTTP_200_OK)
+        self.assertEqual(fast.content, drf.content)
+
     def test_user_can_retrieve_cart(self):
         response = self.client.get(self.cart_list_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -115,6 +134,7 @@ class TestCartViews(APITestCase):
     def test_user_can_retrieve_cart_by_id(self):
         response = self.client.get(self.cart_detail_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total"], Decimal("24.90"))
 
     def test_user_can_delete_cart(self):
         response = self.client.delete(self.cart_detail_url)
@@ -264,6 +284,86 @@ class TestCartItemViews(APITestCase):
         self.assertTrue(CartItem.objects.filter(cart__user=self.user).exists())
 
 
+class TestCartItemBatchView(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="testuser")
+        cls.other_user = User.objects.create(username="otheruser")
+        cls.product_category = ProductCategory.objects.create(name="Food")
+        cls.products = [
+            Product.objects.create(
+                name=f"Product {index}",
+                price="2.00",
+                category=cls.product_category,
+                inventory=ProductInventory.objects.create(quantity=10, sold=0),
+            )
+            for index in range(20)
+        ]
+        cls.cart = Cart.objects.create(user=cls.user)
+        CartItem.objects.create(cart=cls.cart, product=cls.products[0], quantity=1)
+        cls.cart_item_batch_url = reverse(
+            "orders:cart-item-batch", kwargs={"pk": cls.cart.id}
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def _add_all(self, count):
+        return {
+            "operations": [
+                {"op": "add", "product_id": str(product.id), "quantity": 2}
+                for product in self.products[:count]
+            ]
+        }
+
+    def test_user_can_apply_batch_of_operations_to_cart(self):
+        data = self._add_all(3)
+        data["operations"].append(
+            {"op": "remove", "product_id": str(self.products[1].id)}
+        )
+        response = self.client.post(self.cart_item_batch_url, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        quantities = {
+            item["product_name"]: item["quantity"]
+            for item in response.data["cart_items"]
+        }
+        self.assertEqual(quantities, {"Product 0": 3, "Product 2": 2})
+        self.assertEqual(response.data["total"], Decimal("10.00"))
+
+    def test_batch_is_rejected_as_a_whole_when_an_operation_is_invalid(self):
+        data = self._add_all(2)
+        data["operations"].append(
+            {"op": "set", "product_id": str(self.products[0].id), "quantity": 11}
+        )
+        response = self.client.post(self.cart_item_batch_url, data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("quantity", response.data["operations"][2])
+        self.assertEqual(CartItem.objects.filter(cart=self.cart).count(), 1)
+
+    def test_batch_requires_quantity_for_set_operations(self):
+        data = {"operations": [{"op": "set", "product_id": str(self.products[0].id)}]}
+        response = self.client.post(self.cart_item_batch_url, data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_user_cannot_update_cart_of_other_user(self):
+        self.client.force_authenticate(user=self.other_user)
+        response = self.client.post(self.cart_item_batch_url, self._add_all(1))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_batch_runs_a_fixed_number_of_queries(self):
+        with CaptureQueriesContext(connection) as small_batch:
+            response = self.client.post(self.cart_item_batch_url, self._add_all(2))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        CartItem.objects.filter(cart=self.cart).update(quantity=1)
+
+        with CaptureQueriesContext(connection) as large_batch:
+            response = self.client.post(self.cart_item_batch_url, self._add_all(20))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["cart_items"]), 20)
+        self.assertEqual(len(small_batch), len(large_batch))
+
+
 class TestOrderViews(APITestCase):
     @classmethod
     def setUpTestData(cls):
@@ -306,10 +406,27 @@ class TestOrderViews(APITestCase):
         self.assertEqual(response.data["count"], 1)
         self.assertEqual(uuid.UUID(response.data["results"][0]["id"]), self.order.id)
 
+    def test_user_can_retrieve_orders_with_cursor(self):
+        response = self.client.get(self.order_list_url, {"pagination": "cursor"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertNotIn("count", response.data)
+        self.assertEqual(uuid.UUID(response.data["results"][0]["id"]), self.order.id)
+
     def test_user_can_retrieve_order_by_id(self):
         response = self.client.get(self.order_detail_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_order_list_serializes_stored_totals_without_reading_items(self):
+        Order.objects.filter(id=self.order.id).update(
+            before_coupon_amount="24.90", total_amount="24.90"
+        )
+        OrderItem.objects.filter(order=self.order).update(quantity=1)
+
+        response = self.client.get(self.order_list_url)
+        self.assertEqual(response.data["results"][0]["before_coupon"], Decimal("24.90"))
+        self.assertEqual(response.data["results"][0]["total"], Decimal("24.90"))
+
     def test_user_can_delete_order(self):
         response = self.client.delete(self.order_detail_url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
@@ -317,6 +434,14 @@ class TestOrderViews(APITestCase):
         self.assertFalse(Order.objects.exists())
         self.assertFalse(OrderItem.objects.exists())
 
+    def test_user_cannot_delete_cancelled_order(self):
+        Order.objects.filter(id=self.order.id).update(cancelled=True)
+        response = self.client.delete(self.order_detail_url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.product_inventory.refresh_from_db()
+        self.assertEqual(self.product_inventory.quantity, 100)
+
     def test_other_user_cannot_retrieve_other_users_order(self):
         self.client.force_login(self.other_user)
         response = self.client.get(self.order_list_url)
@@ -354,3 +479,160 @@ class TestOrderViews(APITestCase):
 
         self.assertTrue(Order.objects.exists())
         self.assertTrue(OrderItem.objects.exists())
+
+
+class TestOrderQueryBudget(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create(
+            username="admin", is_staff=True, is_superuser=True
+        )
+        cls.product_category = ProductCategory.objects.create(name="Food")
+        cls.coupon = Coupon.objects.create(
+            code="test10", amount=10, min_order_total=20, is_active=True
+        )
+        cls.address = UserAddress.objects.create(
+            address_1="Test 6/15", country="PL", city="Warszawa", postalcode="00-001"
+        )
+        cls.products = [
+            Product.objects.create(
+                name=f"Product {index}",
+                price="2.99",
+                category=cls.product_category,
+                inventory=ProductInventory.objects.create(quantity=100, sold=0),
+            )
+            for index in range(3)
+        ]
+        cls.order_list_url = reverse("orders:order-list")
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.superuser)
+
+    def _create_orders(self, count: int):
+        for index in range(count):
+            user = User.objects.create(username=f"user{Order.objects.count()}")
+            UserProfile.objects.create(
+                user=user, phone_number="692267652", birthday="1999-01-01"
+            )
+            payment = PaymentDetails.objects.create(
+                user=user, stripe_charge_id="ch_test", amount=10
+            )
+            order = Order.objects.create(
+                user=user, address=self.address, coupon=self.coupon, payment=payment
+            )
+            for product in self.products:
+                OrderItem.objects.create(order=order, product=product, quantity=2)
+
+    def _count_list_queries(self) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.order_list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def test_superuser_order_list_costs_fixed_number_of_queries(self):
+        self._create_orders(2)
+        small_page_queries = self._count_list_queries()
+        self._create_orders(8)
+        full_page_queries = self._count_list_queries()
+
+        self.assertEqual(small_page_queries, full_page_queries)
+
+    def test_order_list_serializes_page_in_three_queries(self):
+        self._create_orders(10)
+        # COUNT(*), orders joined with their to-one relations, order items
+        with self.assertNumQueries(3):
+            response = self.client.get(self.order_list_url)
+
+        order = response.data["results"][0]
+        self.assertEqual(len(order["order_items"]), 3)
+        self.assertEqual(order["before_coupon"], Decimal("17.94"))
+        self.assertEqual(order["total"], Decimal("7.94"))
+        self.assertIsNotNone(order["userprofile"])
+        self.assertIsNotNone(order["payment"]["userprofile_id"])
+
+    def test_order_detail_costs_two_queries(self):
+        self._create_orders(1)
+        order = Order.objects.get()
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse("orders:order-detail", kwargs={"pk": order.id})
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_order_list_fast_serialization_content_is_equal(self):
+        self._create_orders(3)
+        Order.objects.create(
+            user=self.superuser, before_coupon_amount="5.98", total_amount="5.98"
+        )
+        for params in ({}, {"pagination": "cursor", "limit": 2}):
+            with self.subTest(params=params):
+                responses = []
+                for fast in (False, True):
+                    with override_settings(FAST_SERIALIZATION=fast):
+                        responses.append(self.client.get(self.order_list_url, params))
+                drf, fast = responses
+                self.assertEqual(drf.status_code, status.HTTP_200_OK)
+                self.assertEqual(fast.content, drf.content)
+
+    @override_settings(FAST_SERIALIZATION=True)
+    def test_order_list_fast_serialization_does_not_build_instances(self):
+        self._create_orders(10)
+        # COUNT(*), order rows joined with their to-one relations, order item rows
+        with self.assertNumQueries(3):
+            with mock.patch.object(Order, "from_db") as from_db:
+                response = self.client.get(self.order_list_url)
+        from_db.assert_not_called()
+        self.assertEqual(len(response.data["results"][0]["order_items"]), 3)
+
+
+class TestOrderExportView(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="testuser")
+        cls.staff = User.objects.create(username="staff", is_staff=True)
+        cls.product = Product.objects.create(
+            name="Rice",
+            price="2.99",
+            category=ProductCategory.objects.create(name="Food"),
+            inventory=ProductInventory.objects.create(quantity=100, sold=0),
+        )
+        cls.order = Order.objects.create(user=cls.user)
+        OrderItem.objects.create(order=cls.order, product=cls.product, quantity=2)
+        cls.order_export_url = reverse("orders:order-export")
+
+    def test_staff_can_export_orders_as_csv(self):
+        self.client.force_login(user=self.staff)
+        response = self.client.get(self.order_export_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv")
+
+        lines = b"".join(response.streaming_content).decode("utf-8").splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith("order_id,order_created,"))
+        self.assertIn(str(self.order.id), lines[1])
+
+    def test_staff_can_export_orders_as_json_lines(self):
+        self.client.force_login(user=self.staff)
+        response = self.client.get(
+            self.order_export_url, {"file_format": "jsonl", "date_to": "2000-01-01"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(response.streaming_content), b"")
+
+        response = self.client.get(self.order_export_url, {"file_format": "jsonl"})
+        row = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(row["product_name"], "Rice")
+        self.assertEqual(row["line_total"], "5.98")
+
+    def test_export_rejects_invalid_date_range(self):
+        self.client.force_login(user=self.staff)
+        response = self.client.get(
+            self.order_export_url, {"date_from": "2022-02-01", "date_to": "2022-01-01"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_user_cannot_export_orders(self):
+        self.client.force_login(user=self.user)
+        response = self.client.get(self.order_export_url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
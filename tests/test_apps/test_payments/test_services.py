@@ -0,0 +1,333 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from unittest import mock
+
+import stripe
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone as django_timezone
+from io import StringIO
+
+from src.apps.orders.models import Order, OrderItem
+from src.apps.payments.models import PaymentDetails, StripeEvent
+from src.apps.payments import stripe_client
+from src.apps.payments.services import StripeCheckoutService, StripeEventService
+from src.apps.products.models import Product, ProductInventory, ProductCategory
+
+User = get_user_model()
+
+
+class TestStripeEventService(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service_class = StripeEventService
+        cls.user = User.objects.create(username="testuser", email="testuser@gmail.com")
+        cls.product_category = ProductCategory.objects.create(name="Food")
+        cls.product_inventory = ProductInventory.objects.create(quantity=90, sold=0)
+        cls.product = Product.objects.create(
+            name="Rice",
+            price="2.99",
+            category=cls.product_category,
+            inventory=cls.product_inventory,
+        )
+        cls.order = Order.objects.create(user=cls.user)
+        OrderItem.objects.create(order=cls.order, product=cls.product, quantity=10)
+
+    def _event(self, event_id, event_type="payment_intent.succeeded", created=1):
+        return {
+            "id": event_id,
+            "object": "event",
+            "type": event_type,
+            "created": 1650000000 + created,
+            "data": {
+                "object": {
+                    "id": "pi_test_id",
+                    "object": "payment_intent",
+                    "amount": 2990,
+                    "metadata": {"order_id": str(self.order.id)},
+                    "charges": {"object": "list", "data": [{"id": "ch_test_id"}]},
+                }
+            },
+        }
+
+    def test_event_service_records_event_once(self):
+        self.assertTrue(self.service_class.record_event(self._event("evt_1")))
+        self.assertFalse(self.service_class.record_event(self._event("evt_1")))
+        self.assertEqual(StripeEvent.objects.all().count(), 1)
+
+    def test_event_service_fullfills_order_from_embedded_payment_intent(self):
+        self.service_class.record_event(self._event("evt_1"))
+        results = self.service_class.process_pending()
+
+        order = Order.objects.get(id=self.order.id)
+        self.assertEqual(results[StripeEvent.PROCESSED], 1)
+        self.assertTrue(order.payment_accepted)
+        self.assertTrue(order.order_accepted)
+        self.assertEqual(order.payment.stripe_charge_id, "ch_test_id")
+        self.assertEqual(order.payment.amount, 29.90)
+        self.assertEqual(
+            ProductInventory.objects.get(id=self.product_inventory.id).sold, 10
+        )
+        self.assertEqual(
+            StripeEvent.objects.get().status,
+            StripeEvent.PROCESSED,
+        )
+
+    def test_event_service_applies_duplicate_payment_events_idempotently(self):
+        self.service_class.record_event(self._event("evt_1", created=1))
+        self.service_class.record_event(self._event("evt_2", created=2))
+        self.service_class.process_pending()
+        self.service_class.process_pending()
+
+        self.assertEqual(PaymentDetails.objects.all().count(), 1)
+        self.assertEqual(
+            ProductInventory.objects.get(id=self.product_inventory.id).sold, 10
+        )
+
+    def test_event_service_ignores_unhandled_event_types(self):
+        self.service_class.record_event(
+            self._event("evt_1", event_type="charge.refunded")
+        )
+        results = self.service_class.process_pending()
+
+        self.assertEqual(results[StripeEvent.IGNORED], 1)
+        self.assertFalse(Order.objects.get(id=self.order.id).payment_accepted)
+
+    def _session_event(self, event_id, created=2):
+        return {
+            "id": event_id,
+            "object": "event",
+            "type": "checkout.session.completed",
+            "created": 1650000000 + created,
+            "data": {
+                "object": {
+                    "id": "cs_test_id",
+                    "object": "checkout.session",
+                    "payment_status": "paid",
+                    "payment_intent": "pi_test_id",
+                    "metadata": {"order_id": str(self.order.id)},
+                }
+            },
+        }
+
+    @mock.patch.object(stripe_client, "retrieve_payment_intent")
+    def test_event_service_fullfills_order_of_session_without_intent_metadata(
+        self, retrieve_payment_intent
+    ):
+        # sessions created before the order id was put into the intent metadata
+        event = self._event("evt_1", created=1)
+        del event["data"]["object"]["metadata"]["order_id"]
+        retrieve_payment_intent.return_value = event["data"]["object"]
+        self.service_class.record_event(event)
+        self.service_class.record_event(self._session_event("evt_2"))
+        results = self.service_class.process_pending()
+
+        self.assertEqual(results[StripeEvent.IGNORED], 1)
+        self.assertEqual(results[StripeEvent.PROCESSED], 1)
+        retrieve_payment_intent.assert_called_once_with("pi_test_id")
+        order = Order.objects.get(id=self.order.id)
+        self.assertTrue(order.payment_accepted)
+        self.assertEqual(order.payment.stripe_charge_id, "ch_test_id")
+
+    @mock.patch.object(stripe_client, "retrieve_payment_intent")
+    def test_event_service_calls_stripe_outside_transactions_of_claimed_events(
+        self, retrieve_payment_intent
+    ):
+        payment_intent = self._event("evt_1")["data"]["object"]
+        self.service_class.record_event(self._session_event("evt_2"))
+        # savepoints of the transactions opened by the test case
+        depth = len(connection.savepoint_ids)
+
+        def retrieve(payment_intent_id):
+            self.assertEqual(len(connection.savepoint_ids), depth)
+            # the claim is committed, other workers skip the event
+            self.assertEqual(self.service_class._claim(batch_size=10), [])
+            return payment_intent
+
+        retrieve_payment_intent.side_effect = retrieve
+        results = self.service_class.process_pending()
+
+        self.assertEqual(results[StripeEvent.PROCESSED], 1)
+        retrieve_payment_intent.assert_called_once()
+        self.assertTrue(Order.objects.get(id=self.order.id).payment_accepted)
+
+    def test_event_service_leaves_event_processed_by_another_worker(self):
+        self.service_class.record_event(self._event("evt_1"))
+        (event,) = self.service_class._claim(batch_size=10)
+        StripeEvent.objects.update(status=StripeEvent.PROCESSED)
+
+        self.service_class._process_event(event)
+
+        self.assertEqual(event.status, StripeEvent.PROCESSED)
+        self.assertFalse(PaymentDetails.objects.exists())
+        self.assertEqual(StripeEvent.objects.get().attempts, 0)
+
+    @mock.patch.object(stripe_client, "retrieve_payment_intent")
+    def test_event_service_skips_session_of_order_paid_by_intent_event(
+        self, retrieve_payment_intent
+    ):
+        self.service_class.record_event(self._event("evt_1", created=1))
+        self.service_class.record_event(self._session_event("evt_2"))
+        results = self.service_class.process_pending()
+
+        self.assertEqual(results[StripeEvent.PROCESSED], 1)
+        self.assertEqual(results[StripeEvent.IGNORED], 1)
+        retrieve_payment_intent.assert_not_called()
+        self.assertEqual(PaymentDetails.objects.count(), 1)
+
+    def test_event_service_processes_events_in_stripe_order(self):
+        self.service_class.record_event(self._event("evt_2", created=2))
+        self.service_class.record_event(self._event("evt_1", created=1))
+        self.service_class.process_pending(batch_size=1)
+
+        self.assertEqual(
+            StripeEvent.objects.get(stripe_event_id="evt_1").status,
+            StripeEvent.PROCESSED,
+        )
+        self.assertEqual(
+            StripeEvent.objects.get(stripe_event_id="evt_2").status,
+            StripeEvent.PENDING,
+        )
+
+    def test_event_service_retries_and_fails_event_of_missing_order(self):
+        event = self._event("evt_1")
+        event["data"]["object"]["metadata"]["order_id"] = str(self.product.id)
+        self.service_class.record_event(event)
+        with self.settings(STRIPE_EVENT_MAX_ATTEMPTS=2):
+            self.service_class.process_pending()
+            self.assertEqual(StripeEvent.objects.get().status, StripeEvent.PENDING)
+            StripeEvent.objects.update(next_attempt_at=django_timezone.now())
+            self.service_class.process_pending()
+
+        stripe_event = StripeEvent.objects.get()
+        self.assertEqual(stripe_event.status, StripeEvent.FAILED)
+        self.assertEqual(stripe_event.attempts, 2)
+        self.assertFalse(PaymentDetails.objects.exists())
+
+    def test_event_service_backs_off_failed_event(self):
+        event = self._event("evt_1")
+        event["data"]["object"]["metadata"]["order_id"] = str(self.product.id)
+        self.service_class.record_event(event)
+        with self.settings(STRIPE_EVENT_RETRY_DELAY=10):
+            self.service_class.process_pending()
+            first_retry = StripeEvent.objects.get().next_attempt_at
+            results = self.service_class.process_pending()
+
+            self.assertEqual(sum(results.values()), 0)
+            self.assertGreater(
+                first_retry, django_timezone.now() + timedelta(seconds=9)
+            )
+
+            StripeEvent.objects.update(next_attempt_at=django_timezone.now())
+            self.service_class.process_pending()
+
+        stripe_event = StripeEvent.objects.get()
+        self.assertEqual(stripe_event.attempts, 2)
+        self.assertGreater(
+            stripe_event.next_attempt_at,
+            django_timezone.now() + timedelta(seconds=19),
+        )
+
+    @mock.patch("src.apps.payments.management.commands.process_stripe_events.time")
+    def test_process_stripe_events_command_waits_after_failed_batch(self, time):
+        for index in range(2):
+            event = self._event(f"evt_{index}", created=index)
+            event["data"]["object"]["metadata"]["order_id"] = str(self.product.id)
+            self.service_class.record_event(event)
+        time.sleep.side_effect = KeyboardInterrupt
+        with self.assertRaises(KeyboardInterrupt):
+            call_command(
+                "process_stripe_events", "--loop", "--batch-size=2", stdout=StringIO()
+            )
+
+        time.sleep.assert_called_once()
+        self.assertEqual(
+            list(StripeEvent.objects.values_list("attempts", flat=True)), [1, 1]
+        )
+
+    def test_process_stripe_events_command_drains_pending_events(self):
+        self.service_class.record_event(self._event("evt_1"))
+        call_command("process_stripe_events", stdout=StringIO())
+
+        self.assertFalse(
+            StripeEvent.objects.filter(status=StripeEvent.PENDING).exists()
+        )
+        self.assertTrue(Order.objects.get(id=self.order.id).payment_accepted)
+
+
+class TestStripeCheckoutService(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service_class = StripeCheckoutService
+        cls.user = User.objects.create(username="testuser")
+
+    def setUp(self):
+        self.order = Order.objects.create(
+            user=self.user,
+            before_coupon_amount=Decimal("29.90"),
+            total_amount=Decimal("29.90"),
+        )
+        stripe_client.breaker.reset()
+        self.addCleanup(stripe_client.breaker.reset)
+        patcher = mock.patch("stripe.checkout.Session.create")
+        self.create_session = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.create_session.side_effect = lambda **params: {
+            "id": f"cs_test_{self.create_session.call_count}",
+            "url": "https://checkout.stripe.com/pay",
+            "expires_at": params["expires_at"],
+        }
+
+    def _get_session(self):
+        return self.service_class.get_session(Order.objects.get(id=self.order.id))
+
+    def test_session_is_stored_and_reused(self):
+        session = self._get_session()
+        self.assertEqual(self._get_session(), session)
+        self.assertEqual(self.create_session.call_count, 1)
+
+        params = self.create_session.call_args.kwargs
+        self.assertEqual(params["line_items"][0]["price_data"]["unit_amount"], 2990)
+        self.assertEqual(params["metadata"], {"order_id": str(self.order.id)})
+        self.assertTrue(
+            params["idempotency_key"].startswith(f"checkout-{self.order.id}")
+        )
+        order = Order.objects.get(id=self.order.id)
+        self.assertEqual(order.stripe_session_id, session["sessionId"])
+        self.assertEqual(order.stripe_session_amount, 2990)
+
+    def test_new_session_is_created_for_changed_total_or_expiring_session(self):
+        first = self._get_session()
+        Order.objects.filter(id=self.order.id).update(total_amount=Decimal("19.90"))
+        second = self._get_session()
+        self.assertNotEqual(second, first)
+
+        Order.objects.filter(id=self.order.id).update(
+            stripe_session_expires=datetime.now(tz=timezone.utc) + timedelta(minutes=1)
+        )
+        self.assertNotEqual(self._get_session(), second)
+        self.assertEqual(self.create_session.call_count, 3)
+
+    def test_circuit_opens_after_repeated_stripe_failures(self):
+        self.create_session.side_effect = stripe.error.APIConnectionError("timeout")
+        for _ in range(stripe_client.breaker.failure_threshold):
+            with self.assertRaises(stripe_client.StripeUnavailable):
+                self._get_session()
+
+        with self.assertRaises(stripe_client.StripeUnavailable):
+            self._get_session()
+        self.assertEqual(
+            self.create_session.call_count, stripe_client.breaker.failure_threshold
+        )
+        self.assertEqual(stripe_client.breaker.state, "open")
+
+    def test_invalid_requests_do_not_open_circuit(self):
+        self.create_session.side_effect = stripe.error.InvalidRequestError(
+            "invalid", "expires_at"
+        )
+        for _ in range(stripe_client.breaker.failure_threshold + 1):
+            with self.assertRaises(stripe.error.InvalidRequestError):
+                self._get_session()
+        self.assertEqual(stripe_client.breaker.state, "closed")
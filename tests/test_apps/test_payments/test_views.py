@@ -0,0 +1,126 @@
+import hashlib
+import hmac
+import json
+import time
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from src.apps.orders.models import Order
+from src.apps.payments.models import StripeEvent
+from src.apps.payments.stripe_client import StripeUnavailable
+
+User = get_user_model()
+
+
+def sign_payload(payload: str, secret: str) -> str:
+    timestamp = int(time.time())
+    signature = hmac.new(
+        secret.encode("utf-8"),
+        "{}.{}".format(timestamp, payload).encode("utf-8"),
+        hashlib.sha256,
+    ).hexdigest()
+    return "t={},v1={}".format(timestamp, signature)
+
+
+class TestStripeWebhookView(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.webhook_url = "/api/stripe/webhook/"
+        cls.event = {
+            "id": "evt_test_id",
+            "object": "event",
+            "type": "payment_intent.succeeded",
+            "created": 1650000000,
+            "data": {
+                "object": {
+                    "id": "pi_test_id",
+                    "object": "payment_intent",
+                    "amount": 1000,
+                    "metadata": {"order_id": "###"},
+                }
+            },
+        }
+
+    def _post_event(self, event, secret=None):
+        payload = json.dumps(event)
+        return self.client.generic(
+            "POST",
+            self.webhook_url,
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=sign_payload(
+                payload, secret or settings.WEBHOOK_SECRET
+            ),
+        )
+
+    def test_webhook_stores_event_and_acknowledges_it(self):
+        response = self._post_event(self.event)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        event = StripeEvent.objects.get()
+        self.assertEqual(event.stripe_event_id, self.event["id"])
+        self.assertEqual(event.type, self.event["type"])
+        self.assertEqual(event.status, StripeEvent.PENDING)
+        self.assertEqual(event.payload["data"], self.event["data"])
+
+    def test_webhook_deduplicates_redelivered_events(self):
+        self._post_event(self.event)
+        response = self._post_event(self.event)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(StripeEvent.objects.all().count(), 1)
+
+    def test_webhook_rejects_invalid_signature(self):
+        response = self._post_event(self.event, secret="wrong_secret")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_webhook_rejects_missing_signature(self):
+        response = self.client.generic(
+            "POST",
+            self.webhook_url,
+            json.dumps(self.event),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestStripeSessionView(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="testuser")
+        cls.order = Order.objects.create(
+            user=cls.user,
+            before_coupon_amount=Decimal("10.00"),
+            total_amount=Decimal("10.00"),
+        )
+        cls.session_url = reverse("orders:stripe-setup", kwargs={"pk": cls.order.id})
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    @mock.patch(
+        "src.apps.payments.stripe_client.create_checkout_session",
+        side_effect=StripeUnavailable("timeout"),
+    )
+    def test_session_view_returns_503_while_stripe_is_unavailable(self, _):
+        response = self.client.get(self.session_url)
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn("Retry-After", response)
+
+    def test_session_view_rejects_paid_order(self):
+        Order.objects.filter(id=self.order.id).update(payment_accepted=True)
+        response = self.client.get(self.session_url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_session_view_rejects_cancelled_order(self):
+        Order.objects.filter(id=self.order.id).update(cancelled=True)
+        response = self.client.get(self.session_url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
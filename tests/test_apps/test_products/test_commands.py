@@ -0,0 +1,110 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from src.apps.products.models import (
+    Product,
+    ProductCategory,
+    ProductInventory,
+    ProductReview,
+)
+
+User = get_user_model()
+
+
+class TestRebuildProductRatingsCommand(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="testuser")
+        cls.product_category = ProductCategory.objects.create(name="Food")
+        cls.product_inventory = ProductInventory.objects.create(quantity=100, sold=0)
+        cls.product = Product.objects.create(
+            name="Rice",
+            price="2.99",
+            category=cls.product_category,
+            inventory=cls.product_inventory,
+            rating_sum=100.0,
+            review_count=30,
+            avg_rating=3.33,
+        )
+        ProductReview.objects.create(
+            user=cls.user, product=cls.product, description="Test", rating=5.0
+        )
+
+    def test_command_rebuilds_rating_aggregates_from_reviews(self):
+        out = StringIO()
+        call_command("rebuild_product_ratings", stdout=out)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.review_count, 1)
+        self.assertEqual(self.product.rating_sum, 5.0)
+        self.assertEqual(self.product.avg_rating, 5.0)
+        self.assertIn("1 products", out.getvalue())
+
+
+class TestRefreshProductRankingsCommand(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            name="Rice",
+            price="2.99",
+            inventory=ProductInventory.objects.create(quantity=100, sold=0),
+            sales_7d=10,
+            sales_30d=10,
+        )
+
+    def test_command_recomputes_sales_windows_from_daily_sales(self):
+        out = StringIO()
+        call_command("refresh_product_rankings", stdout=out)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.sales_7d, 0)
+        self.assertEqual(self.product.sales_30d, 0)
+        self.assertIn("1 products", out.getvalue())
+
+
+class TestImportExportProductsCommands(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            name="Rice",
+            price="2.99",
+            category=ProductCategory.objects.create(name="Food"),
+            inventory=ProductInventory.objects.create(quantity=100, sold=0),
+        )
+
+    def test_exported_catalog_can_be_imported_back(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "products.csv")
+            call_command("export_products", output=path)
+            Product.objects.all().delete()
+
+            out, err = StringIO(), StringIO()
+            call_command("import_products", path, stdout=out, stderr=err)
+
+        self.assertIn("Imported 1 products, skipped 0 rows.", out.getvalue())
+        self.assertEqual(err.getvalue(), "")
+        product = Product.objects.select_related("category", "inventory").get()
+        self.assertEqual(product.name, "Rice")
+        self.assertEqual(product.category.name, "Food")
+        self.assertEqual(product.inventory.quantity, 100)
+
+    def test_import_command_reports_invalid_rows(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl") as feed:
+            feed.write('{"name": "Pasta"}\n')
+            feed.flush()
+            out, err = StringIO(), StringIO()
+            call_command("import_products", feed.name, stdout=out, stderr=err)
+
+        self.assertIn("skipped 1 rows", out.getvalue())
+        self.assertIn("Row 1:", err.getvalue())
+
+    def test_export_command_writes_json_lines_to_stdout(self):
+        out = StringIO()
+        call_command("export_products", file_format="jsonl", stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 1)
+        self.assertIn('"name": "Rice"', out.getvalue())
@@ -1,13 +1,23 @@
+from datetime import date, timedelta
+
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 
 from src.apps.products.models import (
     Product,
+    ProductDailySales,
     ProductInventory,
     ProductCategory,
     ProductReview,
 )
-from src.apps.products.services import ProductService, ReviewService
+from src.apps.products.services import (
+    InventoryService,
+    ProductExportService,
+    ProductImportService,
+    ProductRankingService,
+    ProductService,
+    ReviewService,
+)
 
 User = get_user_model()
 
@@ -95,6 +105,38 @@ class TestProductService(TestCase):
         self.assertEqual(updated_product.category.name, test_category.name)
         self.assertNotEqual(updated_product.price, updated_product.discount_price)
 
+    def test_product_service_persists_discount_flag_and_effective_price(self):
+        product = self.service_class.create_product(data=self.product_data)
+        product.refresh_from_db()
+        self.assertTrue(product.is_discounted)
+        self.assertEqual(product.effective_price, product.discount_price)
+
+        product.set_discount(0)
+        product.refresh_from_db()
+        self.assertFalse(product.is_discounted)
+        self.assertEqual(product.effective_price, product.price)
+
+    def test_product_in_stock_flag_follows_inventory_quantity(self):
+        product = self.service_class.create_product(data=self.product_data)
+        inventory_id = product.inventory_id
+        product.refresh_from_db()
+        self.assertTrue(product.in_stock)
+
+        InventoryService.reserve({inventory_id: 100})
+        product.refresh_from_db()
+        self.assertFalse(product.in_stock)
+
+        InventoryService.release({inventory_id: 1})
+        product.refresh_from_db()
+        self.assertTrue(product.in_stock)
+
+    def test_product_created_with_empty_inventory_is_not_in_stock(self):
+        product = self.service_class.create_product(
+            data={**self.product_data, "inventory": {"quantity": 0}}
+        )
+        product.refresh_from_db()
+        self.assertFalse(product.in_stock)
+
 
 class TestReviewService(TestCase):
     @classmethod
@@ -134,6 +176,7 @@ class TestReviewService(TestCase):
         self.assertEqual(ProductReview.objects.get(id=review.id), review)
         self.assertEqual(ProductReview.objects.get(id=review.id).product, self.product)
 
+        self.product.refresh_from_db()
         self.assertEqual(self.product.review_count, 1)
         self.assertEqual(self.product.avg_rating, review.rating)
 
@@ -148,5 +191,226 @@ class TestReviewService(TestCase):
         self.assertEqual(ProductReview.objects.all().count(), 1)
         self.assertEqual(ProductReview.objects.get(id=updated_review.id), review)
 
+        self.product.refresh_from_db()
         self.assertEqual(self.product.review_count, 1)
         self.assertEqual(self.product.avg_rating, review.rating)
+
+    def test_review_service_keeps_rating_aggregates_of_multiple_reviews(self):
+        other_user = User.objects.create(username="otheruser")
+        self.service_class.create_review(
+            user=self.user, data=self.product_review_data.copy()
+        )
+        self.service_class.create_review(
+            user=other_user,
+            data={"product_id": self.product.id, "description": "Meh", "rating": 2.5},
+        )
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.review_count, 2)
+        self.assertEqual(self.product.rating_sum, 7.0)
+        self.assertEqual(self.product.avg_rating, 3.5)
+
+    def test_review_service_correctly_deletes_review(self):
+        review = self.service_class.create_review(
+            user=self.user, data=self.product_review_data
+        )
+        self.service_class.delete_review(instance=review)
+
+        self.assertEqual(ProductReview.objects.all().count(), 0)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.review_count, 0)
+        self.assertEqual(self.product.rating_sum, 0)
+        self.assertIsNone(self.product.avg_rating)
+
+    def test_review_service_rebuilds_rating_aggregates(self):
+        ProductReview.objects.create(
+            user=self.user, product=self.product, description="Test", rating=4.0
+        )
+        ProductReview.objects.create(
+            user=self.user, product=self.product, description="Test", rating=3.0
+        )
+        updated = self.service_class.rebuild_rating_aggregates()
+
+        self.assertEqual(updated, 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.review_count, 2)
+        self.assertEqual(self.product.rating_sum, 7.0)
+        self.assertEqual(self.product.avg_rating, 3.5)
+
+    def test_review_service_scores_top_rated_above_review_threshold(self):
+        with self.settings(PRODUCT_TOP_RATED_MIN_REVIEWS=2):
+            review = self.service_class.create_review(
+                user=self.user, data=self.product_review_data.copy()
+            )
+            self.product.refresh_from_db()
+            self.assertIsNone(self.product.top_rated_score)
+
+            self.service_class.create_review(
+                user=self.user, data=self.product_review_data.copy()
+            )
+            self.product.refresh_from_db()
+            self.assertEqual(self.product.top_rated_score, 4.5)
+
+            self.service_class.delete_review(instance=review)
+            self.product.refresh_from_db()
+            self.assertIsNone(self.product.top_rated_score)
+
+
+class TestProductRankingService(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service_class = ProductRankingService
+        cls.today = date(2022, 5, 31)
+        cls.product_category = ProductCategory.objects.create(name="Food")
+        cls.product = Product.objects.create(
+            name="Rice",
+            price="2.99",
+            category=cls.product_category,
+            inventory=ProductInventory.objects.create(quantity=100, sold=0),
+        )
+        cls.other_product = Product.objects.create(
+            name="Pasta",
+            price="3.99",
+            category=cls.product_category,
+            inventory=ProductInventory.objects.create(quantity=100, sold=0),
+        )
+
+    def test_ranking_service_records_sales_into_daily_rows_and_windows(self):
+        self.service_class.record_sales({self.product.id: 2}, day=self.today)
+        self.service_class.record_sales(
+            {self.product.id: 3, self.other_product.id: 1}, day=self.today
+        )
+
+        self.assertEqual(
+            ProductDailySales.objects.get(
+                product=self.product, day=self.today
+            ).quantity,
+            5,
+        )
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.sales_7d, 5)
+        self.assertEqual(self.product.sales_30d, 5)
+
+    def test_ranking_service_rolls_sales_windows_forward(self):
+        self.service_class.record_sales({self.product.id: 1}, day=self.today)
+        self.service_class.record_sales(
+            {self.product.id: 10}, day=self.today - timedelta(days=10)
+        )
+        self.service_class.record_sales(
+            {self.product.id: 100}, day=self.today - timedelta(days=40)
+        )
+
+        self.service_class.refresh(today=self.today)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.sales_7d, 1)
+        self.assertEqual(self.product.sales_30d, 11)
+
+        self.service_class.refresh(today=self.today + timedelta(days=60))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.sales_7d, 0)
+        self.assertEqual(self.product.sales_30d, 0)
+
+    def test_ranking_service_refresh_applies_changed_review_threshold(self):
+        Product.objects.filter(id=self.product.id).update(
+            review_count=2, avg_rating=4.0, rating_sum=8.0
+        )
+        with self.settings(PRODUCT_TOP_RATED_MIN_REVIEWS=2):
+            self.service_class.refresh(today=self.today)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.top_rated_score, 4.0)
+
+        with self.settings(PRODUCT_TOP_RATED_MIN_REVIEWS=3):
+            self.service_class.refresh(today=self.today)
+        self.product.refresh_from_db()
+        self.assertIsNone(self.product.top_rated_score)
+
+
+class TestProductImportService(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service_class = ProductImportService
+        cls.product_category = ProductCategory.objects.create(name="Food")
+
+    def _row(self, name, category="Food", **data):
+        return {
+            "name": name,
+            "price": "10.00",
+            "category": {"name": category},
+            "inventory": {"quantity": 5},
+            **data,
+        }
+
+    def test_import_service_creates_products_in_bulk(self):
+        rows = enumerate(
+            [
+                self._row("Rice", discount={"percentage": 10}),
+                self._row("Pasta", category="Pasta"),
+                self._row("Bread", category="Pasta", short_description="Fresh"),
+            ],
+            start=1,
+        )
+        # savepoint, categories, missing category insert and read back,
+        # inventories, products, release
+        with self.assertNumQueries(7):
+            (result,) = self.service_class.import_products(rows, batch_size=10)
+
+        self.assertEqual(result, {"created": 3, "errors": []})
+        self.assertEqual(ProductCategory.objects.count(), 2)
+        rice = Product.objects.select_related("inventory").get(name="Rice")
+        self.assertEqual(rice.category, self.product_category)
+        self.assertEqual(rice.inventory.quantity, 5)
+        self.assertEqual(str(rice.discount_price), "9.00")
+        self.assertTrue(rice.is_discounted)
+        self.assertEqual(rice.effective_price, rice.discount_price)
+        self.assertTrue(rice.in_stock)
+        self.assertTrue(Product.objects.filter(search_vector="fresh").exists())
+
+    def test_import_service_reports_invalid_rows_and_imports_the_rest(self):
+        rows = [
+            (2, self._row("Rice")),
+            (3, self._row("Pasta", price="abc")),
+            (4, self._row("Bread", price="123456789")),
+            (5, self._row("Milk", category="x" * 51)),
+            (6, ValueError("Invalid JSON")),
+            (7, self._row("Butter", inventory={"quantity": None})),
+        ]
+        results = list(self.service_class.import_products(rows, batch_size=2))
+
+        self.assertEqual(sum(result["created"] for result in results), 1)
+        errors = {
+            error["row"]: error["errors"]
+            for result in results
+            for error in result["errors"]
+        }
+        self.assertEqual(sorted(errors), [3, 4, 5, 6, 7])
+        self.assertIn("price", errors[3])
+        self.assertIn("price", errors[4])
+        self.assertIn("name", errors[5]["category"])
+        self.assertIn("non_field_errors", errors[6])
+        self.assertIn("quantity", errors[7]["inventory"])
+        self.assertEqual(list(Product.objects.values_list("name", flat=True)), ["Rice"])
+
+
+class TestProductExportService(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            name="Rice",
+            price="10.00",
+            category=ProductCategory.objects.create(name="Food"),
+            inventory=ProductInventory.objects.create(quantity=5, sold=2),
+        )
+        cls.product.set_discount(25)
+
+    def test_export_service_rows_match_import_format(self):
+        (row,) = ProductExportService.iter_rows()
+
+        self.assertEqual(row["id"], self.product.id)
+        self.assertEqual(row["category"], {"name": "Food"})
+        self.assertEqual(row["inventory"], {"quantity": 5, "sold": 2})
+        self.assertEqual(row["discount"]["percentage"], 25)
+
+        Product.objects.all().delete()
+        (result,) = ProductImportService.import_products([(1, row)])
+        self.assertEqual(result["created"], 1)
+        self.assertEqual(str(Product.objects.get().discount_price), "7.50")
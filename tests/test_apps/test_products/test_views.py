@@ -1,14 +1,40 @@
+import json
+import os
+import runpy
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from src.apps.products.filters import (
+    PRODUCT_ORDERINGS,
+    ProductFilter,
+    build_prefix_search_query,
+)
 from src.apps.products.models import (
     Product,
     ProductCategory,
     ProductReview,
     ProductInventory,
 )
+from src.apps.products.services import (
+    CatalogCacheService,
+    InventoryService,
+    ProductService,
+    ReviewService,
+)
+from src.core.cache import ResponseCache
+from src.core.db.router import ReplicaRouter
+from src.core.formatters import JSONFormatter
 
 User = get_user_model()
 
@@ -27,6 +53,7 @@ class TestProductCategoryViews(APITestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.client.force_login(user=self.user)
 
     def test_user_can_retrieve_product_category(self):
@@ -113,6 +140,7 @@ class TestProductViews(APITestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.client.force_login(user=self.user)
 
     def test_user_can_retrieve_product(self):
@@ -231,6 +259,7 @@ class TestProductReviewViews(APITestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.client.force_login(user=self.user)
 
     def test_user_can_retrieve_product_review(self):
@@ -284,3 +313,809 @@ class TestProductReviewViews(APITestCase):
         response = self.client.delete(self.product_review_detail_url)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
         self.assertTrue(ProductReview.objects.exists())
+
+    def test_deleting_product_review_updates_product_rating_aggregates(self):
+        review = ReviewService.create_review(
+            user=self.other_user,
+            data={"product_id": self.product.id, "description": "Ok", "rating": 3.0},
+        )
+        self.client.force_login(user=self.other_user)
+        response = self.client.delete(
+            reverse("products:review-detail", kwargs={"pk": review.id})
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.review_count, 0)
+        self.assertIsNone(self.product.avg_rating)
+
+
+class TestProductQueryBudget(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="testuser")
+        cls.product_category = ProductCategory.objects.create(name="Food")
+        for index in range(10):
+            product = Product.objects.create(
+                name=f"Product {index}",
+                price="2.99",
+                category=cls.product_category,
+                inventory=ProductInventory.objects.create(quantity=10, sold=0),
+            )
+            ProductReview.objects.create(
+                user=cls.user, product=product, description="Test", rating=4.0
+            )
+
+        cls.product_list_url = reverse("products:product-list")
+        cls.product_review_list_url = reverse("products:review-list")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_product_list_costs_constant_number_of_queries(self):
+        # COUNT(*) for pagination + one SELECT joining inventory and category.
+        with self.assertNumQueries(2):
+            response = self.client.get(self.product_list_url)
+        self.assertEqual(response.data["count"], 10)
+
+    def test_product_detail_costs_single_query(self):
+        product = Product.objects.first()
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse("products:product-detail", kwargs={"pk": product.id})
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_product_review_list_costs_constant_number_of_queries(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(self.product_review_list_url)
+        self.assertEqual(response.data["count"], 10)
+
+
+class TestRequestInstrumentation(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = ProductCategory.objects.create(name="Food")
+        Product.objects.create(
+            name="Rice",
+            price="2.99",
+            category=category,
+            inventory=ProductInventory.objects.create(quantity=10, sold=0),
+        )
+        cls.product_list_url = reverse("products:product-list")
+        cls.staff = User.objects.create(username="staff", is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(SERVER_TIMING_HEADER=True)
+    def test_response_reports_query_count_and_timings(self):
+        self.client.force_authenticate(user=self.staff)
+        with self.assertLogs("src.core.middleware", level="INFO") as logs:
+            response = self.client.get(self.product_list_url)
+
+        self.assertRegex(
+            response["Server-Timing"],
+            r'^db;dur=[\d.]+;desc="2 queries", view;dur=[\d.]+, total;dur=[\d.]+$',
+        )
+        (record,) = logs.records
+        self.assertEqual(record.getMessage(), "request")
+        self.assertEqual(record.route, "api/products/")
+        self.assertEqual(record.status, 200)
+        self.assertEqual(record.queries, 2)
+        json.loads(JSONFormatter().format(record))
+
+    def test_timings_are_only_sent_to_staff_when_enabled(self):
+        self.client.force_authenticate(user=self.staff)
+        self.assertNotIn("Server-Timing", self.client.get(self.product_list_url))
+
+        with self.settings(SERVER_TIMING_HEADER=True):
+            self.client.force_authenticate(user=None)
+            response = self.client.get(self.product_list_url)
+            self.assertNotIn("Server-Timing", response)
+            with self.settings(DEBUG=True):
+                response = self.client.get(self.product_list_url)
+                self.assertIn("Server-Timing", response)
+
+    @override_settings(DUPLICATE_QUERY_THRESHOLD=1)
+    def test_repeated_statements_are_logged(self):
+        with self.assertLogs("src.core.middleware", level="WARNING") as logs:
+            self.client.get(self.product_list_url)
+
+        (record,) = logs.records
+        self.assertEqual(record.getMessage(), "duplicate queries")
+        self.assertEqual(len(record.duplicates), 2)
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=0, SLOW_REQUEST_SAMPLE_RATE=1.0)
+    def test_slow_requests_are_logged_with_their_statements(self):
+        with self.assertLogs("src.core.middleware", level="WARNING") as logs:
+            self.client.get(self.product_list_url)
+
+        (record,) = logs.records
+        self.assertEqual(record.getMessage(), "slow request")
+        self.assertEqual(len(record.statements), 2)
+        self.assertTrue(
+            any("products_product" in item["sql"] for item in record.statements)
+        )
+
+    @override_settings(REQUEST_INSTRUMENTATION=False)
+    def test_instrumentation_can_be_disabled(self):
+        response = self.client.get(self.product_list_url)
+        self.assertNotIn("Server-Timing", response)
+
+
+# the replica alias points at the primary, reads routed to it are recorded
+@override_settings(DATABASE_REPLICAS=["default"])
+class TestReplicaRouting(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="testuser")
+        category = ProductCategory.objects.create(name="Food")
+        cls.product = Product.objects.create(
+            name="Rice",
+            price="2.99",
+            category=category,
+            inventory=ProductInventory.objects.create(quantity=10, sold=0),
+        )
+        cls.product_list_url = reverse("products:product-list")
+        cls.product_review_list_url = reverse("products:review-list")
+
+    def setUp(self):
+        cache.clear()
+        self.reads = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def record_read(router, model, **hints):
+            db = db_for_read(router, model, **hints)
+            self.reads.append(db)
+            return db
+
+        patcher = mock.patch.object(ReplicaRouter, "db_for_read", record_read)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_safe_requests_read_from_replica(self):
+        response = self.client.get(self.product_review_list_url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("default", self.reads)
+
+    def test_user_reads_from_primary_after_write(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(
+            self.product_review_list_url,
+            {"product_id": self.product.id, "description": "Tasty", "rating": 5},
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.reads.clear()
+
+        response = self.client.get(self.product_review_list_url)
+
+        self.assertEqual(response.data["count"], 1)
+        self.assertTrue(self.reads)
+        self.assertNotIn("default", self.reads)
+
+    def test_other_users_keep_reading_from_replica_after_write(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.post(
+            self.product_review_list_url,
+            {"product_id": self.product.id, "description": "Tasty", "rating": 5},
+        )
+        self.client.force_authenticate(user=None)
+        self.reads.clear()
+
+        self.client.get(self.product_review_list_url)
+
+        self.assertIn("default", self.reads)
+
+    def test_recently_invalidated_responses_are_built_from_primary(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            CatalogCacheService.invalidate_catalog()
+
+        response = self.client.get(self.product_list_url)
+
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertTrue(self.reads)
+        self.assertNotIn("default", self.reads)
+
+
+class TestProductCursorPagination(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product_category = ProductCategory.objects.create(name="Food")
+        for index in range(25):
+            Product.objects.create(
+                name=f"Product {index}",
+                price="2.99",
+                category=cls.product_category,
+                inventory=ProductInventory.objects.create(quantity=10, sold=0),
+            )
+        cls.product_list_url = reverse("products:product-list")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_product_list_keeps_limit_offset_envelope_by_default(self):
+        response = self.client.get(self.product_list_url, {"offset": 20})
+        self.assertEqual(response.data["count"], 25)
+        self.assertEqual(len(response.data["results"]), 5)
+
+    def test_product_list_walks_all_pages_with_cursor(self):
+        url = self.product_list_url + "?pagination=cursor"
+        names = []
+        while url:
+            # single SELECT per page, no COUNT(*)
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertNotIn("count", response.data)
+            names += [product["name"] for product in response.data["results"]]
+            url = response.data["next"]
+
+        self.assertEqual(
+            names,
+            list(
+                Product.objects.order_by("-created", "-id").values_list(
+                    "name", flat=True
+                )
+            ),
+        )
+
+    def test_product_list_cursor_page_size_follows_limit(self):
+        response = self.client.get(
+            self.product_list_url, {"pagination": "cursor", "limit": 20}
+        )
+        self.assertEqual(len(response.data["results"]), 20)
+        response = self.client.get(response.data["next"])
+        self.assertEqual(len(response.data["results"]), 5)
+        self.assertIsNotNone(response.data["previous"])
+
+    def test_product_list_rejects_cursor_with_other_ordering(self):
+        for params in ({"ordering": "bestselling"}, {"search": "product"}):
+            with self.subTest(params=params):
+                response = self.client.get(
+                    self.product_list_url, {"pagination": "cursor", **params}
+                )
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn("pagination", response.data)
+
+    def test_product_list_allows_cursor_with_newest_ordering(self):
+        response = self.client.get(
+            self.product_list_url, {"pagination": "cursor", "ordering": "newest"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 10)
+
+
+class TestProductResponseCache(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="testuser")
+        cls.staff = User.objects.create(username="staff", is_staff=True)
+        cls.product_category = ProductCategory.objects.create(name="Food")
+        cls.product = Product.objects.create(
+            name="Rice",
+            price="2.99",
+            category=cls.product_category,
+            inventory=ProductInventory.objects.create(quantity=100, sold=0),
+        )
+        cls.other_product = Product.objects.create(
+            name="Pasta",
+            price="3.99",
+            category=cls.product_category,
+            inventory=ProductInventory.objects.create(quantity=100, sold=0),
+        )
+        cls.product_list_url = reverse("products:product-list")
+        cls.product_detail_url = reverse(
+            "products:product-detail", kwargs={"pk": cls.product.id}
+        )
+        cls.other_product_detail_url = reverse(
+            "products:product-detail", kwargs={"pk": cls.other_product.id}
+        )
+        cls.product_category_list_url = reverse("products:category-list")
+        cls.product_update_data = {
+            "name": "Brown rice",
+            "price": 4.99,
+            "discount": {},
+            "weight": 1.00,
+            "inventory": {"quantity": 50},
+            "category": {"name": "Food"},
+            "short_description": "Test short description",
+            "long_description": "Test long description",
+        }
+
+    def setUp(self):
+        cache.clear()
+
+    def test_repeated_anonymous_request_is_served_from_cache(self):
+        first_response = self.client.get(self.product_list_url)
+        with self.assertNumQueries(0):
+            second_response = self.client.get(self.product_list_url)
+
+        self.assertEqual(first_response["X-Cache"], "MISS")
+        self.assertEqual(second_response["X-Cache"], "HIT")
+        self.assertEqual(second_response.data, first_response.data)
+        self.assertEqual(
+            ResponseCache.get_stats("ProductListCreateAPIView"),
+            {"hits": 1, "misses": 1},
+        )
+
+    def test_cache_key_ignores_query_parameter_order(self):
+        self.client.get(self.product_list_url + "?limit=1&offset=1")
+        response = self.client.get(self.product_list_url + "?offset=1&limit=1")
+        self.assertEqual(response["X-Cache"], "HIT")
+
+    def test_cache_is_not_shared_between_roles(self):
+        self.client.get(self.product_list_url)
+        self.client.force_login(user=self.user)
+        self.assertEqual(self.client.get(self.product_list_url)["X-Cache"], "HIT")
+        self.client.force_login(user=self.staff)
+        self.assertEqual(self.client.get(self.product_list_url)["X-Cache"], "MISS")
+
+    def test_product_update_invalidates_only_affected_product(self):
+        self.client.get(self.product_list_url)
+        self.client.get(self.product_detail_url)
+        self.client.get(self.other_product_detail_url)
+
+        ProductService.update_product(
+            instance=self.product, data=dict(self.product_update_data)
+        )
+
+        list_response = self.client.get(self.product_list_url)
+        detail_response = self.client.get(self.product_detail_url)
+        self.assertEqual(list_response["X-Cache"], "MISS")
+        self.assertEqual(detail_response["X-Cache"], "MISS")
+        self.assertEqual(detail_response.data["name"], "Brown rice")
+        self.assertEqual(
+            self.client.get(self.other_product_detail_url)["X-Cache"], "HIT"
+        )
+
+    def test_inventory_change_invalidates_product(self):
+        self.client.get(self.product_detail_url)
+        InventoryService.reserve(quantities={self.product.inventory_id: 10})
+
+        response = self.client.get(self.product_detail_url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["inventory"]["quantity"], 90)
+
+    def test_stock_change_keeps_product_list_cached(self):
+        self.client.get(self.product_list_url)
+        self.client.get(self.product_detail_url)
+        InventoryService.reserve(quantities={self.product.inventory_id: 10})
+        InventoryService.release(quantities={self.product.inventory_id: 5})
+        InventoryService.record_sale(quantities={self.product.inventory_id: 5})
+
+        self.assertEqual(self.client.get(self.product_list_url)["X-Cache"], "HIT")
+        self.assertEqual(self.client.get(self.product_detail_url)["X-Cache"], "MISS")
+
+    def test_going_in_or_out_of_stock_invalidates_product_list(self):
+        self.client.get(self.product_list_url)
+        InventoryService.reserve(quantities={self.product.inventory_id: 100})
+        response = self.client.get(self.product_list_url)
+        self.assertEqual(response["X-Cache"], "MISS")
+
+        InventoryService.release(quantities={self.product.inventory_id: 1})
+        response = self.client.get(self.product_list_url)
+        self.assertEqual(response["X-Cache"], "MISS")
+
+    def test_settings_refuse_responses_in_a_local_memory_cache(self):
+        environ = {"POSTGRES_REPLICA_HOSTS": "", "REDIS_URL": "", "DEBUG": "False"}
+        path = os.path.join(settings.BASE_DIR, "src", "settings", "__init__.py")
+        with mock.patch.dict(os.environ, environ):
+            with self.assertRaisesMessage(ImproperlyConfigured, "Cached responses"):
+                runpy.run_path(path)
+            with mock.patch.dict(os.environ, {"DEBUG": "True"}):
+                runpy.run_path(path)
+
+    def test_review_write_invalidates_product(self):
+        self.client.get(self.product_detail_url)
+        ReviewService.create_review(
+            user=self.user,
+            data={"product_id": self.product.id, "description": "Ok", "rating": 4.0},
+        )
+
+        response = self.client.get(self.product_detail_url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["review_count"], 1)
+
+    def test_category_creation_invalidates_category_list(self):
+        self.client.get(self.product_category_list_url)
+        self.client.force_login(user=self.staff)
+        self.client.post(self.product_category_list_url, {"name": "Drinks"})
+        self.client.logout()
+
+        response = self.client.get(self.product_category_list_url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["count"], 2)
+
+    def test_invalidation_is_repeated_after_commit(self):
+        self.client.get(self.product_detail_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            InventoryService.release(quantities={self.product.inventory_id: 10})
+            # cached by a concurrent request before the commit
+            self.client.get(self.product_detail_url)
+
+        response = self.client.get(self.product_detail_url)
+        self.assertEqual(response["X-Cache"], "MISS")
+
+
+class TestProductSearch(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product_category = ProductCategory.objects.create(name="Food")
+        cls.rice = cls._create_product(
+            name="Brown rice",
+            short_description="Wholegrain",
+            long_description="Unpolished grains",
+        )
+        cls.pudding = cls._create_product(
+            name="Pudding",
+            short_description="Creamy dessert",
+            long_description="Made with rice and milk",
+        )
+        cls.pasta = cls._create_product(
+            name="Pasta",
+            short_description="Durum wheat",
+            long_description="Italian pasta",
+        )
+        cls.product_list_url = reverse("products:product-list")
+
+    @classmethod
+    def _create_product(cls, **data):
+        return Product.objects.create(
+            price="2.99",
+            category=cls.product_category,
+            inventory=ProductInventory.objects.create(quantity=10, sold=0),
+            **data,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def _search(self, value):
+        response = self.client.get(self.product_list_url, {"search": value})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["results"]
+
+    def test_search_ranks_name_matches_above_description_matches(self):
+        results = self._search("rice")
+        self.assertEqual(
+            [product["name"] for product in results], ["Brown rice", "Pudding"]
+        )
+        self.assertGreater(results[0]["search_rank"], results[1]["search_rank"])
+
+    def test_search_matches_word_prefixes(self):
+        results = self._search("bro ri")
+        self.assertEqual([product["name"] for product in results], ["Brown rice"])
+
+    def test_search_highlights_matched_words(self):
+        results = self._search("milk")
+        self.assertEqual(len(results), 1)
+        self.assertIn("<b>milk</b>", results[0]["search_headline"])
+
+    def test_search_vector_follows_product_updates(self):
+        self.pasta.long_description = "Italian pasta with rice flour"
+        self.pasta.save()
+        self.assertEqual(len(self._search("flour")), 1)
+
+    def test_search_ignores_text_without_words(self):
+        self.assertEqual(len(self._search("&!:*")), 3)
+
+    def test_results_without_search_have_no_rank(self):
+        results = self.client.get(self.product_list_url).data["results"]
+        self.assertIsNone(results[0]["search_rank"])
+        self.assertIsNone(results[0]["search_headline"])
+
+
+class TestProductOrdering(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product_category = ProductCategory.objects.create(name="Food")
+        cls.rice = cls._create_product("Rice", sales_7d=1, sales_30d=30)
+        cls.pasta = cls._create_product(
+            "Pasta", sales_7d=5, sales_30d=10, avg_rating=4.0, top_rated_score=4.0
+        )
+        cls.bread = cls._create_product(
+            "Bread", sales_7d=2, sales_30d=20, avg_rating=5.0, top_rated_score=5.0
+        )
+        cls.milk = cls._create_product("Milk", avg_rating=5.0)
+        cls.product_list_url = reverse("products:product-list")
+
+    @classmethod
+    def _create_product(cls, name, **data):
+        return Product.objects.create(
+            name=name,
+            price="2.99",
+            category=cls.product_category,
+            inventory=ProductInventory.objects.create(quantity=10, sold=0),
+            **data,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def _names(self, **params):
+        response = self.client.get(self.product_list_url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [product["name"] for product in response.data["results"]]
+
+    def test_products_can_be_ordered_by_sales_windows(self):
+        self.assertEqual(
+            self._names(ordering="bestselling"), ["Rice", "Bread", "Pasta", "Milk"]
+        )
+        self.assertEqual(
+            self._names(ordering="bestselling_week"),
+            ["Pasta", "Bread", "Rice", "Milk"],
+        )
+
+    def test_top_rated_ordering_puts_products_below_review_threshold_last(self):
+        self.assertEqual(
+            self._names(ordering="top_rated"), ["Bread", "Pasta", "Milk", "Rice"]
+        )
+
+    def test_unknown_ordering_is_rejected(self):
+        response = self.client.get(self.product_list_url, {"ordering": "price"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_average_rating_filter_uses_stored_rating(self):
+        self.assertEqual(sorted(self._names(average_rating__gt=4.5)), ["Bread", "Milk"])
+
+
+class TestProductCatalogFilters(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product_category = ProductCategory.objects.create(name="Food")
+        cls.rice = cls._create_product("Rice", price="2.99", discount_price="1.99")
+        cls.pasta = cls._create_product("Pasta", price="3.99")
+        cls.bread = cls._create_product("Bread", price="4.99", discount_price="4.99")
+        cls.milk = cls._create_product("Milk", price="1.99", quantity=0)
+        cls.product_list_url = reverse("products:product-list")
+
+    @classmethod
+    def _create_product(cls, name, price, discount_price=None, quantity=10):
+        return Product.objects.create(
+            name=name,
+            price=price,
+            discount_price=discount_price,
+            category=cls.product_category,
+            inventory=ProductInventory.objects.create(quantity=quantity, sold=0),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def _names(self, **params):
+        response = self.client.get(self.product_list_url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(product["name"] for product in response.data["results"])
+
+    def test_products_out_of_stock_are_not_listed(self):
+        self.assertEqual(self._names(), ["Bread", "Pasta", "Rice"])
+
+    def test_discounted_filter_only_matches_actual_discounts(self):
+        self.assertEqual(self._names(discounted=True), ["Rice"])
+        self.assertEqual(self._names(discounted=False), ["Bread", "Pasta"])
+
+    def test_effective_price_filter_uses_discount_price(self):
+        self.assertEqual(
+            self._names(effective_price=3, effective_price_lookup="lt"), ["Rice"]
+        )
+
+
+class TestProductQueryPlans(APITestCase):
+    """
+    The catalog queries read off the indexes added for them. The plans are
+    asserted on an analyzed catalog of a realistic size and distribution,
+    where a sequential scan is the planner's own alternative.
+    """
+
+    product_count = 20000
+    words = (
+        "rice pasta bread milk cheese butter apple banana orange tomato "
+        "potato onion garlic pepper salt sugar flour coffee tea juice "
+        "water beans lentils oats corn chicken beef pork fish"
+    ).split()
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = ProductCategory.objects.bulk_create(
+            ProductCategory(name=f"Category {index}") for index in range(20)
+        )
+        inventories = ProductInventory.objects.bulk_create(
+            ProductInventory(quantity=0 if index % 10 == 0 else index % 90 + 1)
+            for index in range(cls.product_count)
+        )
+        products = []
+        for index, inventory in enumerate(inventories):
+            first = cls.words[index % len(cls.words)]
+            second = cls.words[index * 7 % len(cls.words)]
+            product = Product(
+                name=f"{first.capitalize()} {second} {index}",
+                short_description=f"Fresh {second} by Farm{index % 500}",
+                long_description=(
+                    f"Our {first} goes well with {second}"
+                    + (" and honey." if index % 250 == 0 else ".")
+                ),
+                price=Decimal(index % 4000 + 99) / 100,
+                discount_price=(
+                    Decimal(index % 4000 + 49) / 100 if index % 7 == 0 else None
+                ),
+                category=categories[index % len(categories)],
+                inventory=inventory,
+                sales_7d=index * 13 % 50,
+                sales_30d=index * 17 % 200,
+                top_rated_score=(index % 50) / 10 if index % 4 == 0 else None,
+            )
+            product.update_price_fields()
+            products.append(product)
+        Product.objects.bulk_create(products)
+        with connection.cursor() as cursor:
+            # spread the creation times, bulk_create gives every row the same
+            cursor.execute(
+                "UPDATE products_product SET created = created - "
+                "make_interval(mins => abs(hashtext(name)) % 500000)"
+            )
+            for model in (ProductCategory, ProductInventory, Product):
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+    def test_search_uses_gin_index(self):
+        queryset = Product.objects.filter(
+            search_vector=build_prefix_search_query("honey")
+        )
+        self.assertIn("product_search_vector_idx", queryset.explain())
+
+    def test_orderings_read_off_an_index(self):
+        for ordering, index in (
+            ("bestselling", "product_sales_30d_idx"),
+            ("top_rated", "product_top_rated_idx"),
+        ):
+            queryset = Product.objects.order_by(*PRODUCT_ORDERINGS[ordering])[:10]
+            self.assertIn(index, queryset.explain())
+
+    def test_catalog_filters_read_off_partial_indexes(self):
+        for params in (
+            {},
+            {"category": ["Category 1"]},
+            {"category": ["Category 1"], "price": "3", "price_lookup": "lt"},
+            {"price": "39", "price_lookup": "gt"},
+            {"discounted": "true"},
+            {"effective_price": "3", "effective_price_lookup": "lt"},
+        ):
+            queryset = ProductFilter(
+                params, queryset=Product.objects.filter(in_stock=True)
+            ).qs.order_by("-created", "-id")[:10]
+            plan = queryset.explain()
+            self.assertNotRegex(plan, r"Seq Scan on products_product\b")
+            self.assertIn("product_stock_", plan)
+
+
+class TestProductImportExportViews(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="testuser")
+        cls.staff = User.objects.create(username="staff", is_staff=True)
+        cls.product = Product.objects.create(
+            name="Rice",
+            price="2.99",
+            discount_price="2.49",
+            category=ProductCategory.objects.create(name="Food"),
+            inventory=ProductInventory.objects.create(quantity=100, sold=0),
+        )
+        cls.product_import_url = reverse("products:product-import")
+        cls.product_export_url = reverse("products:product-export")
+
+    def _upload(self, name, content, **data):
+        upload = SimpleUploadedFile(name, content.encode("utf-8"))
+        return self.client.post(
+            self.product_import_url, {"file": upload, **data}, format="multipart"
+        )
+
+    def test_staff_can_import_products_from_csv(self):
+        self.client.force_login(user=self.staff)
+        response = self._upload(
+            "feed.csv",
+            "name,price,category.name,inventory.quantity,discount.percentage\n"
+            "Pasta,3.99,Food,10,\n"
+            "Bread,abc,Bakery,5,\n"
+            'Milk,"1,99",Dairy,5,\n'
+            "Butter,4.00,Dairy,0,50\n",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual([error["row"] for error in response.data["errors"]], [3, 4])
+        self.assertEqual(
+            Product.objects.get(name="Butter").discount_price, Decimal("2.00")
+        )
+        self.assertFalse(ProductCategory.objects.filter(name="Bakery").exists())
+
+    def test_staff_can_import_products_from_json_lines(self):
+        self.client.force_login(user=self.staff)
+        response = self._upload(
+            "feed.txt",
+            '{"name": "Pasta", "price": 3.99, "category": {"name": "Food"}, '
+            '"inventory": {"quantity": 10}}\n'
+            "\n"
+            "not json\n",
+            file_format="jsonl",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(response.data["errors"][0]["row"], 3)
+
+    def test_user_cannot_import_or_export_products(self):
+        self.client.force_login(user=self.user)
+        response = self._upload("feed.csv", "name\n")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get(self.product_export_url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_staff_can_export_products_as_csv(self):
+        self.client.force_login(user=self.staff)
+        response = self.client.get(self.product_export_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv")
+
+        lines = b"".join(response.streaming_content).decode("utf-8").splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith("id,name,price,discount_price"))
+        self.assertIn("Rice", lines[1])
+
+    def test_exported_json_lines_can_be_imported_back(self):
+        self.client.force_login(user=self.staff)
+        response = self.client.get(self.product_export_url, {"file_format": "jsonl"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        content = b"".join(response.streaming_content).decode("utf-8")
+        self.assertEqual(json.loads(content)["category"], {"name": "Food"})
+
+        Product.objects.all().delete()
+        response = self._upload("products.jsonl", content)
+        self.assertEqual(response.data, {"created": 1, "errors": []})
+        self.assertEqual(Product.objects.get().discount_price, Decimal("2.49"))
+
+    def test_export_rejects_unknown_format(self):
+        self.client.force_login(user=self.staff)
+        response = self.client.get(self.product_export_url, {"file_format": "xml"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestProductListFastSerialization(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="testuser")
+        category = ProductCategory.objects.create(name="Food")
+        for name, discount_price in (("Rice", "2.49"), ("Brown rice", None)):
+            Product.objects.create(
+                name=name,
+                price="2.99",
+                discount_price=discount_price,
+                short_description="Long grain",
+                category=category,
+                inventory=ProductInventory.objects.create(quantity=10, sold=0),
+            )
+        cls.product_list_url = reverse("products:product-list")
+
+    def setUp(self):
+        self.client.force_login(user=self.user)
+
+    def _get_both(self, params):
+        responses = []
+        for fast in (False, True):
+            cache.clear()
+            with override_settings(FAST_SERIALIZATION=fast):
+                responses.append(self.client.get(self.product_list_url, params))
+        return responses
+
+    def test_list_content_is_equal(self):
+        for params in ({}, {"search": "rice"}, {"pagination": "cursor", "limit": 1}):
+            with self.subTest(params=params):
+                drf, fast = self._get_both(params)
+                self.assertEqual(drf.status_code, status.HTTP_200_OK)
+                self.assertEqual(fast.content, drf.content)
+
+    @override_settings(FAST_SERIALIZATION=True)
+    def test_list_does_not_build_instances(self):
+        cache.clear()
+        with mock.patch.object(Product, "from_db") as from_db:
+            response = self.client.get(self.product_list_url)
+        self.assertEqual(len(response.data["results"]), 2)
+        from_db.assert_not_called()
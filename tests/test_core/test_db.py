@@ -0,0 +1,231 @@
+import os
+import runpy
+import threading
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError, connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from src.core.db.base import DatabaseWrapper
+from src.core.db.pool import ConnectionPool, PoolTimeout, close_pools, get_pool
+from src.core.db.router import (
+    ReplicaRouter,
+    is_pinned_to_primary,
+    pin_to_primary,
+    routing_context,
+    use_replica,
+)
+
+User = get_user_model()
+
+
+class FakeConnection:
+    closed = 0
+
+    class info:
+        transaction_status = 0
+
+    def close(self):
+        self.closed = 1
+
+
+class TestConnectionPool(SimpleTestCase):
+    def setUp(self):
+        self.pool = ConnectionPool(max_size=2, timeout=0.05)
+
+    def test_returned_connection_is_reused(self):
+        conn = self.pool.getconn(FakeConnection)
+        self.pool.putconn(conn)
+
+        self.assertIs(self.pool.getconn(FakeConnection), conn)
+        stats = self.pool.stats()
+        self.assertEqual(stats["size"], 1)
+        self.assertEqual(stats["in_use"], 1)
+        self.assertEqual(stats["checkouts"], 2)
+
+    def test_full_pool_times_out(self):
+        self.pool.getconn(FakeConnection)
+        self.pool.getconn(FakeConnection)
+
+        with self.assertRaises(PoolTimeout):
+            self.pool.getconn(FakeConnection)
+        stats = self.pool.stats()
+        self.assertEqual(stats["size"], 2)
+        self.assertEqual(stats["timeouts"], 1)
+
+    def test_waiting_thread_gets_returned_connection(self):
+        self.pool.timeout = 5
+        conn = self.pool.getconn(FakeConnection)
+        self.pool.getconn(FakeConnection)
+        threading.Timer(0.05, self.pool.putconn, args=(conn,)).start()
+
+        self.assertIs(self.pool.getconn(FakeConnection), conn)
+        stats = self.pool.stats()
+        self.assertEqual(stats["waits"], 1)
+        self.assertGreater(stats["max_wait_time_ms"], 0)
+
+    def test_closed_connection_is_discarded(self):
+        conn = self.pool.getconn(FakeConnection)
+        conn.close()
+        self.pool.putconn(conn)
+
+        self.assertIsNot(self.pool.getconn(FakeConnection), conn)
+        self.assertEqual(self.pool.stats()["size"], 1)
+
+    def test_idle_connection_failing_check_is_replaced(self):
+        conn = self.pool.getconn(FakeConnection)
+        self.pool.putconn(conn)
+
+        new_conn = self.pool.getconn(FakeConnection, check=lambda conn: False)
+        self.assertIsNot(new_conn, conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(self.pool.stats()["size"], 1)
+
+    def test_failed_connect_frees_slot(self):
+        def connect():
+            raise OperationalError
+
+        with self.assertRaises(OperationalError):
+            self.pool.getconn(connect)
+        self.assertEqual(self.pool.stats()["size"], 0)
+
+
+class TestDatabaseWrapper(TestCase):
+    def _create_wrapper(self, **settings):
+        wrapper = DatabaseWrapper(
+            {**connection.settings_dict, **settings}, alias=connection.alias
+        )
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def _terminate(self, wrapper):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_terminate_backend(%s)",
+                [wrapper.connection.get_backend_pid()],
+            )
+
+    def _query(self, wrapper):
+        with wrapper.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            return cursor.fetchone()[0]
+
+    def test_dropped_connection_is_reopened_by_health_check(self):
+        wrapper = self._create_wrapper(CONN_MAX_AGE=60, CONN_HEALTH_CHECKS=True)
+        self._query(wrapper)
+        dropped = wrapper.connection
+        wrapper.close_if_unusable_or_obsolete()
+        self._terminate(wrapper)
+
+        self.assertEqual(self._query(wrapper), 1)
+        self.assertIsNot(wrapper.connection, dropped)
+
+    def test_dropped_connection_fails_without_health_check(self):
+        wrapper = self._create_wrapper(CONN_MAX_AGE=60, CONN_HEALTH_CHECKS=False)
+        self._query(wrapper)
+        wrapper.close_if_unusable_or_obsolete()
+        self._terminate(wrapper)
+
+        with self.assertRaises(OperationalError):
+            self._query(wrapper)
+
+    def test_pooled_connection_is_returned_and_reused(self):
+        self.addCleanup(close_pools)
+        wrapper = self._create_wrapper(POOL={"MAX_SIZE": 1, "TIMEOUT": 1})
+        self._query(wrapper)
+        pooled = wrapper.connection
+        wrapper.close()
+
+        other = self._create_wrapper(POOL={"MAX_SIZE": 1, "TIMEOUT": 1})
+        self._query(other)
+        self.assertIs(other.connection, pooled)
+        self.assertEqual(get_pool(connection.alias, 1, 1).stats()["checkouts"], 2)
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class TestReplicaRouter(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="testuser")
+
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+
+    def test_reads_use_primary_outside_of_routing_context(self):
+        self.assertIsNone(use_replica())
+        self.assertIsNone(self.router.db_for_read(User))
+
+    def test_reads_use_chosen_replica(self):
+        with routing_context():
+            self.assertIsNone(self.router.db_for_read(User))
+            self.assertEqual(use_replica(), "replica")
+            self.assertEqual(self.router.db_for_read(User), "replica")
+
+    def test_reads_use_primary_after_write(self):
+        with routing_context() as state:
+            use_replica()
+            self.assertEqual(self.router.db_for_write(User), "default")
+            self.assertTrue(state.wrote)
+            self.assertIsNone(self.router.db_for_read(User))
+            self.assertIsNone(use_replica())
+
+    def test_reads_use_primary_in_transaction(self):
+        with routing_context():
+            use_replica()
+            with transaction.atomic():
+                self.assertIsNone(self.router.db_for_read(User))
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate("replica", "products"))
+        self.assertTrue(self.router.allow_migrate("default", "products"))
+
+    @override_settings(REPLICA_STICKY_SECONDS=60)
+    def test_user_is_pinned_to_primary(self):
+        self.assertFalse(is_pinned_to_primary(self.user))
+        pin_to_primary(self.user)
+        self.assertTrue(is_pinned_to_primary(self.user))
+
+    def test_settings_refuse_pins_in_a_local_memory_cache(self):
+        environ = {
+            "POSTGRES_REPLICA_HOSTS": "replica-host",
+            "REDIS_URL": "",
+            "DEBUG": "False",
+        }
+        path = os.path.join(settings.BASE_DIR, "src", "settings", "__init__.py")
+        with mock.patch.dict(os.environ, environ):
+            with self.assertRaisesMessage(ImproperlyConfigured, "Read replicas"):
+                runpy.run_path(path)
+            with mock.patch.dict(os.environ, {"DEBUG": "True"}):
+                runpy.run_path(path)
+
+
+class TestDatabaseStatsView(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="testuser")
+        cls.superuser = User.objects.create(
+            username="admin", is_staff=True, is_superuser=True
+        )
+        cls.stats_url = reverse("db-stats")
+
+    def test_admin_retrieves_connection_stats(self):
+        self.client.force_authenticate(user=self.superuser)
+        response = self.client.get(self.stats_url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["default"]["conn_max_age"], 60)
+        self.assertIsNone(response.data["default"]["pool"])
+
+    def test_user_cannot_retrieve_connection_stats(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.stats_url)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,176 @@
+import datetime
+import unittest
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from src.apps.accounts.models import UserAddress, UserProfile
+from src.apps.orders.models import Cart, CartItem, Coupon, Order, OrderItem
+from src.apps.orders.serializers import (
+    CartItemOutputSerializer,
+    CartOutputSerializer,
+    OrderItemOutputSerializer,
+    OrderOutputSerializer,
+)
+from src.apps.orders.storage import DatabaseCartStorage
+from src.apps.orders.views import OrderQuerySetOptimizationMixin
+from src.apps.payments.models import PaymentDetails
+from src.apps.products.models import Product, ProductCategory, ProductInventory
+from src.apps.products.serializers import ProductListOutputSerializer
+from src.core.renderers import MessagePackRenderer, ORJSONRenderer, msgpack
+from src.core.serializers import SerializerNotCompilable, compile_serializer
+
+User = get_user_model()
+
+
+class OrderItemWithOrderOutputSerializer(serializers.ModelSerializer):
+    order = OrderOutputSerializer(read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ("id", "order")
+        read_only_fields = fields
+
+
+class TestCompiledSerializer(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="testuser")
+        category = ProductCategory.objects.create(name="Food")
+        cls.discounted = Product.objects.create(
+            name="Rice",
+            price="2.99",
+            discount_price="2.49",
+            category=category,
+            inventory=ProductInventory.objects.create(quantity=100, sold=3),
+        )
+        cls.uncategorized = Product.objects.create(
+            name="Żółw „łagodny”",
+            price="10.00",
+            inventory=ProductInventory.objects.create(quantity=0),
+        )
+        UserProfile.objects.create(
+            user=cls.user, phone_number="+48123456789", birthday="1990-01-01"
+        )
+        cart = Cart.objects.create(user=cls.user)
+        Cart.objects.create(user=cls.user)
+        order = Order.objects.create(
+            user=cls.user,
+            address=UserAddress.objects.create(
+                country="PL", city="Warsaw", postalcode="00-001"
+            ),
+            coupon=Coupon.objects.create(code="FIVE", amount=5, min_order_total=10),
+            payment=PaymentDetails.objects.create(
+                stripe_charge_id="ch_1", user=cls.user, amount=20.47
+            ),
+            payment_accepted=True,
+        )
+        # placed at checkout, with the totals stored
+        Order.objects.create(
+            user=cls.user, before_coupon_amount="12.50", total_amount="7.50"
+        )
+        for product, quantity in ((cls.discounted, 3), (cls.uncategorized, 1)):
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+            OrderItem.objects.create(order=order, product=product, quantity=quantity)
+
+    def assertSameOutput(self, serializer_class, queryset, model=None):
+        compiled = compile_serializer(serializer_class, model)
+        expected = serializer_class(queryset.order_by("id"), many=True).data
+        rows = compiled.values(queryset).order_by("id")
+        data = compiled.serialize(rows)
+        self.assertEqual(data, expected)
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(expected))
+
+    def test_product_list_output_is_equal(self):
+        self.assertSameOutput(
+            ProductListOutputSerializer,
+            Product.objects.select_related("inventory", "category"),
+        )
+
+    def test_cart_item_output_is_equal(self):
+        self.assertSameOutput(
+            CartItemOutputSerializer, CartItem.objects.select_related("product")
+        )
+
+    def test_order_item_output_is_equal(self):
+        self.assertSameOutput(
+            OrderItemOutputSerializer,
+            OrderItem.objects.select_related("product"),
+            model=OrderItem,
+        )
+
+    def test_order_output_is_equal(self):
+        self.assertSameOutput(
+            OrderOutputSerializer,
+            OrderQuerySetOptimizationMixin().optimize_queryset(Order.objects.all()),
+        )
+
+    def test_cart_output_is_equal(self):
+        self.assertSameOutput(
+            CartOutputSerializer, DatabaseCartStorage().list_carts(self.user)
+        )
+
+    def test_nested_lists_are_read_in_one_query_per_list(self):
+        compiled = compile_serializer(OrderOutputSerializer)
+        with self.assertNumQueries(2):
+            data = compiled.serialize(compiled.values(Order.objects.order_by("id")))
+        self.assertEqual(sorted(len(order["order_items"]) for order in data), [0, 2])
+
+    def test_rows_are_read_in_one_query(self):
+        compiled = compile_serializer(ProductListOutputSerializer)
+        with self.assertNumQueries(1):
+            data = compiled.serialize(compiled.values(Product.objects.all()))
+        self.assertEqual(len(data), 2)
+
+    def test_lists_in_nested_serializers_are_not_compilable(self):
+        with self.assertRaises(SerializerNotCompilable):
+            compile_serializer(OrderItemWithOrderOutputSerializer)
+
+
+class TestRenderers(SimpleTestCase):
+    data = {
+        "name": "Żółw \u2028",
+        "price": Decimal("2.49"),
+        "created": datetime.datetime(
+            2022, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc
+        ),
+        "items": [{"quantity": 3, "rank": 0.1}, None, True],
+        1: "one",
+    }
+
+    def test_orjson_output_is_equal_to_json_output(self):
+        self.assertEqual(
+            ORJSONRenderer().render(self.data), JSONRenderer().render(self.data)
+        )
+
+    def test_orjson_output_is_equal_for_floats_in_exponent_notation(self):
+        for value in (1e-05, -1.5e-07, 1e16, 2.5e22, Decimal("0.00001")):
+            with self.subTest(value=value):
+                data = {"rank": value, "items": [0.5, value]}
+                self.assertEqual(
+                    ORJSONRenderer().render(data), JSONRenderer().render(data)
+                )
+
+    def test_orjson_rejects_nan_like_json(self):
+        for renderer in (ORJSONRenderer(), JSONRenderer()):
+            with self.assertRaises(ValueError):
+                renderer.render({"rank": float("nan")})
+
+    def test_orjson_falls_back_for_big_integers(self):
+        data = {"count": 2**70}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_orjson_falls_back_for_indented_output(self):
+        context = {"indent": 4}
+        self.assertEqual(
+            ORJSONRenderer().render(self.data, renderer_context=context),
+            JSONRenderer().render(self.data, renderer_context=context),
+        )
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test_msgpack_output_matches_json_types(self):
+        content = MessagePackRenderer().render({"price": Decimal("2.49"), "id": 1})
+        self.assertEqual(msgpack.unpackb(content), {"price": 2.49, "id": 1})